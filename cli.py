@@ -0,0 +1,170 @@
+import sys
+import argparse
+
+def _exportar(argumentos):
+    import export_spreadsheets
+    configuracao = {
+        'servidor': argumentos.servidor, 'banco': argumentos.banco,
+        'usuario': argumentos.usuario, 'senha': argumentos.senha,
+        'estabelecimentos': argumentos.estabelecimentos,
+        'todos_contatos': argumentos.todos_contatos,
+    }
+    configuracao = {chave: valor for chave, valor in configuracao.items() if valor is not None}
+    if argumentos.estatisticas:
+        import query_stats
+        query_stats.CAPTURAR_ESTATISTICAS = True
+    if argumentos.cache:
+        import result_cache
+        result_cache.USAR_CACHE = True
+    if argumentos.indices_temporarios:
+        import index_advisor
+        index_advisor.CRIAR_INDICES_TEMPORARIOS = True
+    if argumentos.baixo_impacto:
+        import low_impact_extraction
+        low_impact_extraction.MODO_BAIXO_IMPACTO = True
+        low_impact_extraction.LINHAS_POR_SEGUNDO = argumentos.linhas_por_segundo
+        low_impact_extraction.LEITURAS_POR_SEGUNDO = argumentos.leituras_por_segundo
+    return export_spreadsheets.run(modo_async=argumentos.modo_async, retomar=argumentos.retomar, **configuracao)
+
+def _dividir(argumentos):
+    import split_by_date
+    split_by_date.run(argumentos.completo, argumentos.empacotar)
+    return True
+
+def _contas(argumentos):
+    import part_packing
+    import dataframe_engines
+    import duckdb_split
+    part_packing.EMPACOTAR_PARTICOES = argumentos.empacotar
+    dataframe_engines.MOTOR = argumentos.motor
+    duckdb_split.USAR_DUCKDB = argumentos.duckdb
+    if argumentos.tipo == 'pagar':
+        import split_contas_pagar
+        split_contas_pagar.dividir_contas_pagar(argumentos.estabelecimento, argumentos.mes, argumentos.em_disco)
+    else:
+        import split_contas_receber
+        split_contas_receber.dividir_contas_receber(argumentos.estabelecimento, argumentos.mes, argumentos.em_disco)
+    return True
+
+def _validar(argumentos):
+    import os
+    import validation_engine
+    os.makedirs(argumentos.saida, exist_ok=True)
+    validador = validation_engine.validar_arquivo_em_lotes(
+        argumentos.arquivo, argumentos.entidade, argumentos.saida, argumentos.tamanho_lote)
+    print(f"{sum(validador.contagens.values())} erros encontrados")
+    return True
+
+def _lote(argumentos):
+    import tenant_batch
+    tenants = tenant_batch.carregar_tenants(argumentos.config)
+    if argumentos.retomar:
+        for tenant in tenants:
+            tenant['retomar'] = True
+    resultados = tenant_batch.executar_lote(tenants, argumentos.processos)
+    return all(resultado['sucesso'] for resultado in resultados)
+
+def _subconjunto(argumentos):
+    import subset_extractor
+    subset_extractor.extrair_subconjunto(argumentos.estabelecimentos, argumentos.saida, argumentos.formato)
+    return True
+
+def _reconciliar(argumentos):
+    import verify_source_reconciliation
+    divergencias = [verify_source_reconciliation.reconciliar(entidade, argumentos.saida, argumentos.estabelecimentos)
+                    for entidade in argumentos.entidades]
+    return not any(divergencias)
+
+def _cache(argumentos):
+    import result_cache
+    if argumentos.limpar:
+        print(f"{result_cache.limpar()} resultados removidos do cache")
+    return True
+
+def _indices(argumentos):
+    import index_advisor
+    for indice in index_advisor.sugerir_indices(index_advisor.consultas_exportacao().values()):
+        print(indice['ddl'] + ';')
+    return True
+
+def _mes(valor):
+    return valor if valor == 'sem_data' else int(valor)
+
+def montar_parser():
+    parser = argparse.ArgumentParser(description="Exportação e divisão de planilhas para migração")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    exportar = comandos.add_parser('exportar', help="consulta o banco, exporta e divide as três entidades")
+    exportar.add_argument('--async', dest='modo_async', action='store_true', help="consultas simultâneas e gravação em processos")
+    exportar.add_argument('--resume', dest='retomar', action='store_true', help="continua a última execução interrompida")
+    exportar.add_argument('--indices-temporarios', action='store_true', help="cria os índices sugeridos antes da extração e os remove no fim (só em cópias restauradas)")
+    exportar.add_argument('--estatisticas', action='store_true', help="guarda estatísticas de IO/tempo e o plano de cada consulta no relatório")
+    exportar.add_argument('--cache', action='store_true', help="reaproveita resultados de consultas cujas tabelas não mudaram desde a última execução")
+    exportar.add_argument('--baixo-impacto', action='store_true', help="lê as três consultas de um mesmo snapshot, em lotes pela chave com pausas (banco em produção)")
+    exportar.add_argument('--linhas-por-segundo', type=int, help="orçamento de linhas lidas por segundo no modo de baixo impacto")
+    exportar.add_argument('--leituras-por-segundo', type=int, help="orçamento de leituras lógicas por segundo no modo de baixo impacto")
+    exportar.add_argument('--servidor')
+    exportar.add_argument('--banco')
+    exportar.add_argument('--usuario')
+    exportar.add_argument('--senha')
+    exportar.add_argument('--estabelecimentos', type=int, nargs='+')
+    exportar.add_argument('--todos-contatos', action='store_const', const=True, help="exporta todas as pessoas, não só as que têm contas nos estabelecimentos")
+    exportar.set_defaults(funcao=_exportar)
+
+    dividir = comandos.add_parser('dividir', help="divide os arquivos já exportados em exported_data")
+    modo = dividir.add_mutually_exclusive_group()
+    modo.add_argument('--completo', action='store_const', const='sempre', help="grava os *_completo antes de dividir")
+    modo.add_argument('--sem-completo', dest='completo', action='store_const', const='sob_demanda', help="não grava os *_completo")
+    dividir.add_argument('--empacotar', action='store_true', help="junta partições pequenas vizinhas no mesmo arquivo")
+    dividir.set_defaults(funcao=_dividir)
+
+    contas = comandos.add_parser('contas', help="divide contas a pagar/receber por estabelecimento e mês")
+    contas.add_argument('tipo', choices=['pagar', 'receber'])
+    contas.add_argument('estabelecimento', type=int, nargs='?')
+    contas.add_argument('mes', type=_mes, nargs='?', help="1-12 ou sem_data")
+    contas.add_argument('--empacotar', action='store_true', help="junta meses pequenos vizinhos no mesmo arquivo")
+    contas.add_argument('--em-disco', action='store_const', const=True, help="lê em lotes e distribui as partições em disco (automático acima do orçamento de memória)")
+    contas.add_argument('--motor', choices=['pandas', 'vetorizado', 'polars'], default='pandas', help="motor da formatação do template")
+    contas.add_argument('--duckdb', action='store_true', help="particiona e divide em SQL no DuckDB (grava CSV/parquet diretamente)")
+    contas.set_defaults(funcao=_contas)
+
+    validar = comandos.add_parser('validar', help="valida um arquivo em lotes e grava os relatórios de erro")
+    validar.add_argument('entidade', choices=['contas_pagar', 'contas_receber', 'contatos'])
+    validar.add_argument('arquivo')
+    validar.add_argument('--tamanho-lote', type=int, default=50000)
+    validar.add_argument('--saida', default='exported_data_split')
+    validar.set_defaults(funcao=_validar)
+
+    lote = comandos.add_parser('lote', help="exporta vários clientes a partir de um JSON de configuração")
+    lote.add_argument('config')
+    lote.add_argument('--processos', type=int, default=4)
+    lote.add_argument('--resume', dest='retomar', action='store_true', help="continua as execuções interrompidas dos clientes")
+    lote.set_defaults(funcao=_lote)
+
+    indices = comandos.add_parser('indices', help="sugere índices de cobertura para as consultas da exportação")
+    indices.set_defaults(funcao=_indices)
+
+    reconciliar = comandos.add_parser('reconciliar', help="confere as partes geradas com agregados consultados no banco de origem")
+    reconciliar.add_argument('entidades', nargs='*', choices=['contas_pagar', 'contas_receber'], default=['contas_pagar', 'contas_receber'])
+    reconciliar.add_argument('--saida', default='exported_data_split')
+    reconciliar.add_argument('--estabelecimentos', type=int, nargs='+')
+    reconciliar.set_defaults(funcao=_reconciliar)
+
+    cache = comandos.add_parser('cache', help="gerencia o cache de resultados das consultas")
+    cache.add_argument('--limpar', action='store_true', help="remove todos os resultados guardados")
+    cache.set_defaults(funcao=_cache)
+
+    subconjunto = comandos.add_parser('subconjunto', help="extrai todas as tabelas, fechadas pelas FKs, a partir dos estabelecimentos")
+    subconjunto.add_argument('estabelecimentos', type=int, nargs='*')
+    subconjunto.add_argument('--saida')
+    subconjunto.add_argument('--formato', choices=['csv', 'csv.gz', 'parquet', 'xlsx'])
+    subconjunto.set_defaults(funcao=_subconjunto)
+
+    return parser
+
+def main(argv=None):
+    argumentos = montar_parser().parse_args(argv)
+    return 0 if argumentos.funcao(argumentos) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import os
+import mmap
+import errno
+import lazy_imports
+
+np = lazy_imports.sob_demanda('numpy')
+
+# Tamanho dos blocos lidos do disco; a memória usada fica limitada a
+# um bloco mais o último registro incompleto do bloco anterior
+TAMANHO_BLOCO = 4 * 1024 * 1024
+
+# Janela da varredura vetorizada sobre arquivos mapeados em memória
+TAMANHO_JANELA_MMAP = 64 * 1024 * 1024
+
+BOM_UTF8 = b'\xef\xbb\xbf'
+
+ASPAS = ord('"')
+QUEBRA_LINHA = ord('\n')
+
+def fins_de_registro(dados, dentro_aspas_inicial=0):
+    """
+    Retorna as posições (exclusivas) onde terminam os registros CSV em `dados`.
+    Uma quebra de linha só encerra o registro quando o número de aspas antes
+    dela é par, o que trata corretamente campos com quebras de linha e aspas
+    escapadas (""). `dentro_aspas_inicial` indica se `dados` começa dentro de
+    um campo entre aspas (usado na varredura por janelas).
+    """
+    return _varrer(dados, dentro_aspas_inicial)[0]
+
+def _varrer(dados, dentro_aspas_inicial):
+    """Fins de registro em `dados` e o estado das aspas ao final"""
+    bytes_ = np.frombuffer(dados, dtype=np.uint8)
+    if len(bytes_) == 0:
+        return np.array([], dtype=np.int64), dentro_aspas_inicial
+    dentro_aspas = np.bitwise_xor.accumulate(bytes_ == ASPAS, dtype=np.uint8) ^ dentro_aspas_inicial
+    fins = np.flatnonzero((bytes_ == QUEBRA_LINHA) & (dentro_aspas == 0)) + 1
+    return fins, int(dentro_aspas[-1])
+
+def ler_cabecalho(arquivo):
+    """Lê o BOM (se houver) e o registro de cabeçalho do início do arquivo"""
+    inicio = arquivo.read(len(BOM_UTF8))
+    bom = BOM_UTF8 if inicio == BOM_UTF8 else b''
+    dados = b'' if bom else inicio
+
+    while True:
+        fins = fins_de_registro(dados)
+        if len(fins) > 0:
+            return bom, dados[:fins[0]], dados[fins[0]:]
+        bloco = arquivo.read(TAMANHO_BLOCO)
+        if not bloco:
+            return bom, dados, b''
+        dados += bloco
+
+class _EscritorPartes:
+    """Abre partes numeradas, repetindo BOM e cabeçalho no início de cada uma"""
+
+    def __init__(self, diretorio_saida, nome_base, prefixo):
+        self.diretorio_saida = diretorio_saida
+        self.nome_base = nome_base
+        self.prefixo = prefixo
+        self.partes = []
+        self.arquivo = None
+        self.tamanho = 0
+        self.linhas = 0
+
+    def nova_parte(self):
+        self.fechar()
+        caminho = os.path.join(self.diretorio_saida, f"{self.nome_base}_parte_{len(self.partes) + 1}.csv")
+        self.arquivo = open(caminho, 'wb')
+        self.arquivo.write(self.prefixo)
+        self.tamanho = len(self.prefixo)
+        self.linhas = 0
+        self.partes.append({'caminho': caminho, 'bytes': 0, 'linhas': 0})
+
+    def escrever(self, dados, linhas):
+        self.arquivo.write(dados)
+        self.tamanho += len(dados)
+        self.linhas += linhas
+
+    def vazia(self):
+        return self.linhas == 0
+
+    def fechar(self):
+        if self.arquivo is not None:
+            self.arquivo.close()
+            self.partes[-1].update(bytes=self.tamanho, linhas=self.linhas)
+            self.arquivo = None
+
+def dividir_csv_por_bytes(caminho, limite_bytes, diretorio_saida=None, nome_base=None):
+    """
+    Divide um CSV em partes de até `limite_bytes` cortando sempre em fim de
+    registro, sem montar DataFrames: o arquivo é lido uma única vez em blocos
+    e cada parte recebe o BOM e o cabeçalho do original.
+
+    Um registro maior que o limite fica sozinho em uma parte.
+    Retorna a lista de partes com caminho, tamanho em bytes e número de linhas.
+    """
+    diretorio_saida = diretorio_saida or os.path.dirname(caminho)
+    nome_base = nome_base or os.path.splitext(os.path.basename(caminho))[0]
+
+    with open(caminho, 'rb') as arquivo:
+        bom, cabecalho, resto = ler_cabecalho(arquivo)
+        escritor = _EscritorPartes(diretorio_saida, nome_base, bom + cabecalho)
+        escritor.nova_parte()
+
+        fim_arquivo = False
+        while not fim_arquivo:
+            bloco = arquivo.read(TAMANHO_BLOCO)
+            fim_arquivo = not bloco
+            dados = resto + bloco
+            fins = fins_de_registro(dados)
+            if fim_arquivo and dados and (len(fins) == 0 or fins[-1] < len(dados)):
+                # Último registro sem quebra de linha final
+                fins = np.append(fins, len(dados))
+
+            inicio = 0
+            indice = 0
+            while indice < len(fins):
+                espaco = limite_bytes - escritor.tamanho
+                # Último fim de registro que ainda cabe na parte atual
+                ultimo = np.searchsorted(fins, inicio + espaco, side='right') - 1
+                if ultimo < indice:
+                    if escritor.vazia():
+                        ultimo = indice
+                    else:
+                        escritor.nova_parte()
+                        continue
+                escritor.escrever(dados[inicio:fins[ultimo]], int(ultimo - indice + 1))
+                inicio = fins[ultimo]
+                indice = ultimo + 1
+
+            resto = dados[inicio:]
+
+        escritor.fechar()
+
+    partes = escritor.partes
+    if partes and partes[-1]['linhas'] == 0 and len(partes) > 1:
+        os.remove(partes[-1]['caminho'])
+        partes.pop()
+    return partes
+
+def indexar_registros(mapa, inicio=0):
+    """
+    Indexa os deslocamentos de fim de registro de um arquivo mapeado em memória,
+    a partir de `inicio`, varrendo janelas de TAMANHO_JANELA_MMAP sem copiar os dados.
+    """
+    fins = []
+    dentro_aspas = 0
+    visao = memoryview(mapa)
+    try:
+        for deslocamento in range(inicio, len(mapa), TAMANHO_JANELA_MMAP):
+            janela = visao[deslocamento:deslocamento + TAMANHO_JANELA_MMAP]
+            fins_janela, dentro_aspas = _varrer(janela, dentro_aspas)
+            fins.append(fins_janela + deslocamento)
+            janela.release()
+    finally:
+        visao.release()
+
+    fins = np.concatenate(fins) if fins else np.array([], dtype=np.int64)
+    if len(mapa) > inicio and (len(fins) == 0 or fins[-1] < len(mapa)):
+        # Último registro sem quebra de linha final
+        fins = np.append(fins, len(mapa))
+    return fins
+
+# Erros com que copy_file_range e sendfile recusam a cópia (sistemas de arquivos diferentes,
+# overlayfs, chamada bloqueada no contêiner); com eles a cópia passa para o método seguinte
+ERROS_SEM_SUPORTE = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+def _copiar_lendo(origem, destino, inicio, tamanho):
+    os.lseek(origem, inicio, os.SEEK_SET)
+    return os.write(destino, os.read(origem, min(tamanho, TAMANHO_BLOCO)))
+
+def _metodos_copia():
+    metodos = []
+    if hasattr(os, 'copy_file_range'):
+        metodos.append(lambda origem, destino, inicio, tamanho: os.copy_file_range(origem, destino, tamanho, inicio))
+    if hasattr(os, 'sendfile'):
+        metodos.append(lambda origem, destino, inicio, tamanho: os.sendfile(destino, origem, inicio, tamanho))
+    metodos.append(_copiar_lendo)
+    return metodos
+
+def copiar_intervalo(origem, destino, inicio, tamanho):
+    """
+    Copia bytes entre descritores sem passar pelo espaço do usuário quando o
+    sistema oferece copy_file_range ou sendfile. Se a chamada existe mas é recusada
+    (ERROS_SEM_SUPORTE), continua do ponto em que parou com sendfile e, por fim,
+    com leitura e escrita em blocos.
+    """
+    metodos = _metodos_copia()
+    while tamanho > 0:
+        try:
+            copiados = metodos[0](origem, destino, inicio, tamanho)
+        except OSError as e:
+            if e.errno not in ERROS_SEM_SUPORTE or len(metodos) == 1:
+                raise
+            metodos.pop(0)
+            continue
+        if copiados == 0:
+            raise IOError(f"Cópia interrompida no byte {inicio}")
+        inicio += copiados
+        tamanho -= copiados
+
+def dividir_csv_mmap(caminho, limite_bytes, diretorio_saida=None, nome_base=None):
+    """
+    Divide um CSV em partes de até `limite_bytes` por fatiamento de bytes:
+    o arquivo é mapeado em memória, os fins de registro são indexados uma vez
+    e cada parte é copiada do original pelo kernel, precedida do BOM e do
+    cabeçalho. Indicado quando o CSV já está no formato final e não precisa
+    de nenhuma transformação.
+    """
+    diretorio_saida = diretorio_saida or os.path.dirname(caminho)
+    nome_base = nome_base or os.path.splitext(os.path.basename(caminho))[0]
+    partes = []
+
+    with open(caminho, 'rb') as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            return partes
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            bom = BOM_UTF8 if mapa[:len(BOM_UTF8)] == BOM_UTF8 else b''
+            fins = indexar_registros(mapa, len(bom))
+            if len(fins) == 0:
+                return partes
+            fim_cabecalho = int(fins[0])
+            prefixo = bom + mapa[len(bom):fim_cabecalho]
+            fins = fins[1:]
+
+        # Planejamento dos cortes: cada parte vai até o último registro que cabe no limite
+        capacidade = limite_bytes - len(prefixo)
+        inicio = fim_cabecalho
+        indice = 0
+        while indice < len(fins):
+            ultimo = np.searchsorted(fins, inicio + capacidade, side='right') - 1
+            ultimo = max(ultimo, indice)
+            fim = int(fins[ultimo])
+
+            caminho_parte = os.path.join(diretorio_saida, f"{nome_base}_parte_{len(partes) + 1}.csv")
+            with open(caminho_parte, 'wb') as destino:
+                destino.write(prefixo)
+                destino.flush()
+                copiar_intervalo(arquivo.fileno(), destino.fileno(), inicio, fim - inicio)
+            partes.append({'caminho': caminho_parte, 'bytes': len(prefixo) + fim - inicio, 'linhas': int(ultimo - indice + 1)})
+
+            inicio = fim
+            indice = ultimo + 1
+
+    return partes
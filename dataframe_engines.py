@@ -0,0 +1,136 @@
+import lazy_imports
+import financial_schema
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Motor usado na preparação das contas (formatação do template, filtro e mês de vencimento):
+#   pandas      - referência: formatação valor a valor (formatar_coluna dos divisores)
+#   vetorizado  - as mesmas regras aplicadas a colunas inteiras com pandas
+#   polars      - como o vetorizado, com a leitura das datas e os textos no polars (várias threads)
+MOTOR = 'pandas'
+
+COLUNAS_NUMERICAS = ['Valor documento', 'Saldo', 'Taxas', 'Estabelecimento_id']
+
+COLUNAS_DATA = ['Data Emissao', 'Data vencimento', 'Data Liquidacao']
+
+# Formatos lidos de uma vez (o exportador grava dd/mm/aaaa); os demais valores são lidos
+# um a um com a mesma chamada da referência, que com dayfirst=True troca dia e mês até em ISO
+FORMATOS_DATA = ['%d/%m/%Y', '%d/%m/%Y %H:%M:%S']
+
+class MotorVetorizado:
+    """
+    Aplica as regras de formatação do template coluna a coluna, sem apply linha
+    a linha. Resultado equivalente ao da referência (verify_engine_equivalence.py).
+    """
+    nome = 'vetorizado'
+
+    def datas(self, serie):
+        """Converte a coluna para datetime (NaT quando inválida), como pd.to_datetime(valor, dayfirst=True)"""
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            return serie
+        convertidas = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+        texto = serie.astype('string')
+        for formato in FORMATOS_DATA:
+            faltantes = convertidas.isna() & texto.notna()
+            if not faltantes.any():
+                break
+            convertidas[faltantes] = pd.to_datetime(texto[faltantes], format=formato, errors='coerce')
+        return self._completar_datas(serie, convertidas)
+
+    def _completar_datas(self, serie, convertidas):
+        # Valores em outros formatos (ou já datetime dentro de colunas object) seguem a regra da referência
+        restantes = convertidas.isna() & serie.notna() & (serie.astype('string') != '')
+        for posicao in restantes[restantes].index:
+            convertidas[posicao] = pd.to_datetime(serie[posicao], dayfirst=True, errors='coerce')
+        return convertidas
+
+    def minusculas(self, serie):
+        return serie.astype('string').str.lower()
+
+    def formatar_template(self, df, colunas_template):
+        formatado = pd.DataFrame(index=df.index)
+        for coluna in colunas_template:
+            if coluna not in df.columns:
+                formatado[coluna] = 0 if coluna in COLUNAS_NUMERICAS else ''
+                continue
+
+            serie = df[coluna]
+            vazio = serie.isna() | (serie.astype('string') == '').fillna(False)
+            if coluna in COLUNAS_NUMERICAS:
+                formatado[coluna] = pd.to_numeric(serie.where(~vazio), errors='coerce').fillna(0)
+            elif coluna in COLUNAS_DATA:
+                formatado[coluna] = self.datas(serie.where(~vazio)).dt.strftime('%d/%m/%Y').fillna('')
+            else:
+                valores = serie.astype(object).where(~vazio, '')
+                if coluna == 'Situacao':
+                    valores = valores.mask((self.minusculas(valores) == 'liquidado').fillna(False), 'paga')
+                formatado[coluna] = valores
+        return formatado
+
+    def meses_vencimento(self, serie):
+        """Mês (1-12) da data de vencimento já formatada, ou 'sem_data'"""
+        meses = self.datas(serie.where(serie != '')).dt.month
+        return meses.astype(object).where(meses.notna(), 'sem_data').map(lambda mes: mes if mes == 'sem_data' else int(mes))
+
+    def preparar_contas(self, df, colunas_template, estabelecimentos):
+        """Formato do template, tipos do esquema, filtro de estabelecimentos e coluna auxiliar 'mes'"""
+        df = financial_schema.aplicar_esquema(self.formatar_template(df, colunas_template))
+        df = df[df['Estabelecimento_id'].isin(estabelecimentos)].copy()
+        df['mes'] = self.meses_vencimento(df['Data vencimento'])
+        return df
+
+class MotorPolars(MotorVetorizado):
+    """Motor vetorizado com a leitura de datas e as operações de texto no polars (requer polars)"""
+    nome = 'polars'
+
+    def __init__(self):
+        try:
+            import polars
+        except ImportError:
+            raise ImportError("O motor polars requer o pacote polars (pip install polars)")
+        self.pl = polars
+        # Com pyarrow, os textos do pandas já são colunas Arrow e passam ao polars (e voltam) sem
+        # cópia por objetos Python; sem ele, os textos vão como lista Python (o polars não converte
+        # arrays de objetos que começam com nulo)
+        try:
+            import pyarrow
+            self.arrow = True
+        except ImportError:
+            self.arrow = False
+
+    def _serie_texto(self, serie):
+        texto = serie.astype('string')
+        if self.arrow:
+            return self.pl.from_pandas(texto)
+        return self.pl.Series(serie.name, texto.to_numpy(dtype=object, na_value=None).tolist(), dtype=self.pl.Utf8)
+
+    def datas(self, serie):
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            return serie
+        pl = self.pl
+        quadro = pl.DataFrame({'texto': self._serie_texto(serie)})
+        datas = quadro.select(pl.coalesce([
+            pl.col('texto').str.strptime(pl.Datetime('ns'), formato, strict=False) for formato in FORMATOS_DATA
+        ]).alias('data'))['data']
+        convertidas = pd.Series(datas.to_numpy(), index=serie.index).astype('datetime64[ns]')
+        return self._completar_datas(serie, convertidas)
+
+    def minusculas(self, serie):
+        minusculas = self._serie_texto(serie).str.to_lowercase()
+        if self.arrow:
+            return minusculas.to_pandas().astype('string').set_axis(serie.index)
+        return pd.Series(minusculas.to_numpy(), index=serie.index, dtype='string')
+
+MOTORES = {
+    'vetorizado': MotorVetorizado,
+    'polars': MotorPolars,
+}
+
+def obter_motor(nome=None):
+    """Instância do motor pedido (ou de MOTOR); None para a referência pandas"""
+    nome = nome or MOTOR
+    if nome == 'pandas':
+        return None
+    if nome not in MOTORES:
+        raise ValueError(f"Motor desconhecido: {nome} (disponíveis: pandas, {', '.join(MOTORES)})")
+    return MOTORES[nome]()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import sys
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+np = lazy_imports.sob_demanda('numpy')
+
+# Normalização e validação de CPF/CNPJ de uma coluna inteira em operações de matriz:
+# cada documento vira uma linha de códigos de caractere, os dígitos são compactados à
+# esquerda, alinhados à direita em 11 (CPF) ou 14 (CNPJ) posições, o que repõe os zeros
+# à esquerda perdidos em colunas numéricas, e os dígitos verificadores são conferidos
+# por produto com os pesos do módulo 11.
+DIGITOS_CPF = 11
+DIGITOS_CNPJ = 14
+
+PESOS_CPF = (list(range(10, 1, -1)), list(range(11, 1, -1)))
+PESOS_CNPJ = ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def _como_texto(serie):
+    """Valores como texto; documentos lidos como número perdem o '.0' do float"""
+    serie = pd.Series(serie)
+    if pd.api.types.is_numeric_dtype(serie):
+        serie = serie.astype('Int64').astype(object)
+    textos = serie.where(serie.notna(), '').astype(str).to_numpy(dtype=str)
+    if len(textos) and pd.api.types.infer_dtype(serie, skipna=True) not in ('string', 'empty'):
+        textos = np.where(np.char.endswith(textos, '.0'), np.char.rstrip(np.char.rstrip(textos, '0'), '.'), textos)
+    return textos
+
+def _digitos(textos):
+    """Matriz de dígitos (int8) de cada texto, onde há dígito, a posição de cada um entre os dígitos da linha e a quantidade"""
+    largura = max(1, textos.dtype.itemsize // 4)
+    codigos = np.ascontiguousarray(textos, dtype=f'U{largura}').view(np.uint32).reshape(len(textos), largura)
+    eh_digito = (codigos >= 48) & (codigos <= 57)
+    valores = (codigos - 48).astype(np.int8)
+    posicao = np.cumsum(eh_digito, axis=1, dtype=np.int16) - 1
+    return valores, eh_digito, posicao, posicao[:, -1] + 1
+
+def _alinhar(valores, eh_digito, posicao, quantidade, largura):
+    """Dígitos alinhados à direita em `largura` colunas (zeros à esquerda); linhas maiores ficam zeradas"""
+    total = len(quantidade)
+    alinhados = np.zeros((total, largura), dtype=np.int8)
+    mascara = eh_digito & (quantidade <= largura)[:, None]
+    destino = (largura - quantidade)[:, None] + posicao + (np.arange(total) * largura)[:, None]
+    alinhados.reshape(-1)[destino[mascara]] = valores[mascara]
+    return alinhados
+
+def _digito_verificador(digitos, pesos, cpf):
+    resto = (digitos[:, :len(pesos)] @ np.array(pesos, dtype=np.float32)).astype(np.int32) % 11
+    if cpf:
+        return (resto * 10 % 11) % 10
+    return np.where(resto < 2, 0, 11 - resto)
+
+def _valido(alinhados, pesos, cpf):
+    largura = alinhados.shape[1]
+    repetido = (alinhados == alinhados[:, :1]).all(axis=1)
+    decimais = alinhados.astype(np.float32)
+    return (~repetido
+            & (_digito_verificador(decimais, pesos[0], cpf) == alinhados[:, largura - 2])
+            & (_digito_verificador(decimais, pesos[1], cpf) == alinhados[:, largura - 1]))
+
+def _como_strings(digitos):
+    """Linhas de dígitos como strings"""
+    return np.ascontiguousarray(digitos.astype(np.uint32) + 48).view(f'U{digitos.shape[1]}').ravel()
+
+def _so_digitos(valores, eh_digito, posicao):
+    """Só os dígitos de cada linha, sem alinhar (strings do tamanho de cada linha)"""
+    compactados = np.zeros(valores.shape, dtype=np.uint32)
+    destino = posicao + (np.arange(len(valores)) * valores.shape[1])[:, None]
+    compactados.reshape(-1)[destino[eh_digito]] = valores[eh_digito] + 48
+    return compactados.view(f'U{valores.shape[1]}').ravel()
+
+def analisar(serie, juridica=None):
+    """
+    Normaliza e valida uma coluna de CPF/CNPJ. `juridica` (máscara opcional, ex.: Tipo
+    pessoa == 'Jurídica') força o alinhamento em 14 dígitos. Sem ela, até 11 dígitos é
+    CPF, salvo quando faltam dígitos e só o alinhamento como CNPJ confere os verificadores.
+    Retorna um dict de arrays: 'documento' (só dígitos, com os zeros à esquerda
+    repostos), 'tipo' ('cpf', 'cnpj' ou ''), 'valido' e 'preenchido'.
+    """
+    textos = _como_texto(serie)
+    if len(textos) == 0:
+        vazio = np.array([], dtype=str)
+        return {'documento': vazio, 'tipo': vazio, 'valido': np.array([], dtype=bool), 'preenchido': np.array([], dtype=bool)}
+    valores, eh_digito, posicao, quantidade = _digitos(textos)
+    como_cpf = _alinhar(valores, eh_digito, posicao, quantidade, DIGITOS_CPF)
+    como_cnpj = _alinhar(valores, eh_digito, posicao, quantidade, DIGITOS_CNPJ)
+    cpf_valido = _valido(como_cpf, PESOS_CPF, True) & (quantidade <= DIGITOS_CPF)
+    cnpj_valido = _valido(como_cnpj, PESOS_CNPJ, False) & (quantidade <= DIGITOS_CNPJ)
+
+    preenchido = quantidade > 0
+    juridica = np.zeros(len(textos), dtype=bool) if juridica is None else np.asarray(juridica, dtype=bool)
+    cnpj = preenchido & (juridica | (quantidade > DIGITOS_CPF) | (~cpf_valido & cnpj_valido & (quantidade < DIGITOS_CPF)))
+    cabe = quantidade <= DIGITOS_CNPJ
+
+    documento = np.where(cnpj, _como_strings(como_cnpj), _como_strings(como_cpf)).astype(object)
+    documento[~preenchido] = ''
+    # Acima de 14 dígitos não há como alinhar: fica só a limpeza, e o documento é inválido
+    if not cabe.all():
+        documento[~cabe] = _so_digitos(valores[~cabe], eh_digito[~cabe], posicao[~cabe])
+    return {
+        'documento': documento,
+        'tipo': np.where(preenchido & cabe, np.where(cnpj, 'cnpj', 'cpf'), ''),
+        'valido': np.where(cnpj, cnpj_valido, cpf_valido) & preenchido,
+        'preenchido': preenchido,
+    }
+
+def normalizar(serie, juridica=None):
+    """Coluna de documentos só com dígitos e zeros à esquerda repostos ('' quando vazio)"""
+    return pd.Series(analisar(serie, juridica)['documento'], index=getattr(serie, 'index', None), dtype=object)
+
+def mascara_juridica(df, coluna_tipo='Tipo pessoa'):
+    if coluna_tipo not in df.columns:
+        return None
+    return (df[coluna_tipo].astype(str) == 'Jurídica').to_numpy()
+
+def chaves_indice(analise):
+    """Documentos que entram no índice de duplicados: válidos (zeros de preenchimento e inválidos ficam fora)"""
+    return np.where(analise['valido'], analise['documento'], '')
+
+def marcar_repetidos(documentos, vistos):
+    """
+    Marca os documentos já presentes em `vistos` (set atualizado com os novos), por hash:
+    uma passada sobre a coluna, sem comparar pares. Vazios nunca são marcados.
+    """
+    marcados = np.zeros(len(documentos), dtype=bool)
+    for posicao, documento in enumerate(documentos.tolist()):
+        if not documento:
+            continue
+        if documento in vistos:
+            marcados[posicao] = True
+        else:
+            vistos.add(documento)
+    return marcados
+
+def indice_duplicados(df, coluna='CNPJ / CPF', coluna_id='ID'):
+    """Grupos de contatos com o mesmo documento válido: {documento: [IDs (ou índices)]}, só os repetidos"""
+    documentos = pd.Series(chaves_indice(analisar(df[coluna], mascara_juridica(df))), index=df.index)
+    documentos = documentos[documentos != '']
+    repetidos = documentos[documentos.duplicated(keep=False)]
+    ids = df.loc[repetidos.index, coluna_id] if coluna_id in df.columns else repetidos.index.to_series()
+    return {documento: grupo.tolist() for documento, grupo in ids.groupby(repetidos.to_numpy(), sort=False)}
+
+if __name__ == "__main__":
+    # Uso: python document_engine.py <contatos.csv|contatos.xlsx>
+    if len(sys.argv) < 2:
+        print("Uso: python document_engine.py <contatos.csv|contatos.xlsx>")
+        sys.exit(1)
+    caminho = sys.argv[1]
+    df = pd.read_csv(caminho, dtype={'CNPJ / CPF': str}) if caminho.endswith(('.csv', '.csv.gz')) else \
+        pd.read_excel(caminho, dtype={'CNPJ / CPF': str})
+    analise = analisar(df['CNPJ / CPF'], mascara_juridica(df))
+    print(f"{len(df)} contatos: {int(analise['preenchido'].sum())} com documento, "
+          f"{int((analise['preenchido'] & ~analise['valido']).sum())} inválidos")
+    grupos = indice_duplicados(df)
+    for documento, ids in sorted(grupos.items(), key=lambda item: -len(item[1]))[:20]:
+        print(f"{documento}: {len(ids)} contatos (IDs {', '.join(map(str, ids[:10]))}{'...' if len(ids) > 10 else ''})")
+    print(f"{len(grupos)} documentos repetidos em {sum(len(ids) for ids in grupos.values())} contatos")
@@ -0,0 +1,109 @@
+import os
+import shutil
+import financial_schema
+import output_writers
+import run_journal
+
+# Divide as contas por (estabelecimento, mês) e em partes por número de linhas dentro
+# do DuckDB embutido. CSV e parquet são gravados pelo próprio DuckDB, um COPY ordenado por
+# arquivo de saída (o COPY ... PARTITION_BY pode gravar vários arquivos por partição e não
+# mantém a ordem do ORDER BY); xlsx continua sendo gerado em Python a partir do resultado já particionado.
+USAR_DUCKDB = False
+
+# Formatos gravados diretamente pelo DuckDB e as opções do COPY de cada um
+OPCOES_COPY = {
+    'csv': "FORMAT CSV, HEADER true",
+    'csv.gz': "FORMAT CSV, HEADER true, COMPRESSION gzip",
+    'parquet': "FORMAT PARQUET",
+}
+
+BOM_UTF8 = b'\xef\xbb\xbf'
+
+def _conectar():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("A divisão pelo DuckDB requer o pacote duckdb (pip install duckdb)")
+    return duckdb.connect()
+
+def _consulta_particoes(colunas, prefixo, linhas_por_arquivo):
+    """
+    Numera as linhas de cada (estabelecimento, mês) na ordem original e monta o
+    nome do arquivo de cada linha, com a mesma regra de nomes dos divisores.
+    """
+    selecionadas = ', '.join(f'"{coluna}"' for coluna in colunas)
+    base = f"'{prefixo}_est_' || CAST(\"Estabelecimento_id\" AS VARCHAR) || '_' || nome_mes"
+    return f"""
+        WITH numeradas AS (
+            SELECT *,
+                row_number() OVER (PARTITION BY "Estabelecimento_id", nome_mes ORDER BY _ordem) - 1 AS _linha,
+                count(*) OVER (PARTITION BY "Estabelecimento_id", nome_mes) AS _total
+            FROM contas
+        )
+        SELECT {selecionadas}, _ordem,
+            CASE WHEN _total > {linhas_por_arquivo}
+                THEN {base} || '_parte_' || lpad(CAST(_linha // {linhas_por_arquivo} + 1 AS VARCHAR), 3, '0')
+                ELSE {base}
+            END AS arquivo
+        FROM numeradas
+        ORDER BY "Estabelecimento_id", nome_mes, _ordem
+    """
+
+def _literal(texto):
+    return "'" + texto.replace("'", "''") + "'"
+
+def _gravar_particoes(conexao, colunas, diretorio_saida, formato):
+    """Um COPY por arquivo de saída, nas linhas da ordem original; cada COPY sem partição grava um único arquivo"""
+    selecionadas = ', '.join(f'"{coluna}"' for coluna in colunas)
+    criados = []
+    for (nome,) in conexao.execute("SELECT DISTINCT arquivo FROM partes ORDER BY arquivo").fetchall():
+        destino = os.path.join(diretorio_saida, output_writers.nome_arquivo(nome, formato))
+        temporario = destino + '.duckdb.tmp'
+        conexao.execute(
+            f"COPY (SELECT {selecionadas} FROM partes WHERE arquivo = {_literal(nome)} ORDER BY _ordem) "
+            f"TO {_literal(temporario)} ({OPCOES_COPY[formato]})")
+        if not os.path.isfile(temporario):
+            raise RuntimeError(f"O DuckDB não gravou um único arquivo para {nome} ({temporario})")
+        if formato == 'csv':
+            # As partes CSV do projeto têm BOM (utf-8-sig), como as gravadas pelo pandas
+            with open(destino + '.tmp', 'wb') as saida, open(temporario, 'rb') as entrada:
+                saida.write(BOM_UTF8)
+                shutil.copyfileobj(entrada, saida)
+            os.remove(temporario)
+            os.replace(destino + '.tmp', destino)
+        else:
+            os.replace(temporario, destino)
+        run_journal.registrar_parte(destino, os.path.getsize(destino))
+        criados.append(destino)
+    return criados
+
+def dividir_particoes(df, mes_para_nome, prefixo, linhas_por_arquivo, formato_partes, diretorio_saida):
+    """
+    Divide df (já filtrado, com a coluna auxiliar 'mes') em arquivos por estabelecimento,
+    mês e partes de até linhas_por_arquivo linhas. Retorna os caminhos gravados.
+    """
+    colunas = [coluna for coluna in df.columns if coluna != 'mes']
+    contas = financial_schema.materializar(df[colunas])
+    contas['nome_mes'] = df['mes'].map(lambda mes: mes_para_nome.get(mes, 'mes_desconhecido'))
+    contas['_ordem'] = range(len(contas))
+
+    conexao = _conectar()
+    try:
+        conexao.register('contas', contas)
+        conexao.execute(f"CREATE TEMP TABLE partes AS {_consulta_particoes(colunas, prefixo, linhas_por_arquivo)}")
+
+        if formato_partes in OPCOES_COPY:
+            return _gravar_particoes(conexao, colunas, diretorio_saida, formato_partes)
+
+        # xlsx (e outros formatos sem escritor no DuckDB): o DuckDB particiona, o Python grava
+        particionado = conexao.execute(
+            'SELECT * EXCLUDE (_ordem) FROM partes ORDER BY "Estabelecimento_id", arquivo, _ordem').df()
+    finally:
+        conexao.close()
+
+    criados = []
+    for nome, parte in particionado.groupby('arquivo', sort=False):
+        caminho = os.path.join(diretorio_saida, output_writers.nome_arquivo(nome, formato_partes))
+        output_writers.gravar(parte.drop(columns=['arquivo']).reset_index(drop=True), caminho, formato_partes)
+        criados.append(caminho)
+    return criados
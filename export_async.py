@@ -0,0 +1,205 @@
+import os
+import sys
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+import export_spreadsheets
+import split_by_date
+import run_journal
+import run_report
+import result_cache
+
+# Consultas executadas ao mesmo tempo, cada uma em sua própria conexão (pyodbc libera o GIL durante a espera)
+MAX_CONSULTAS_SIMULTANEAS = 3
+
+# Resultados de consulta aguardando gravação; com a fila cheia as consultas esperam
+TAMANHO_FILA = 1
+
+# Processos que gravam os arquivos e executam a divisão (trabalho de CPU)
+MAX_PROCESSOS_GRAVACAO = 2
+
+# Resultados de consulta que existem ao mesmo tempo no processo principal, da consulta
+# até o fim da gravação: uma consulta só começa quando há vaga (None = TAMANHO_FILA + MAX_PROCESSOS_GRAVACAO)
+MAX_RESULTADOS_EM_MEMORIA = None
+
+# Configurações de módulo usadas na gravação e na divisão. Os processos de gravação
+# (forkserver/spawn) reimportam os módulos com os valores padrão: estas são copiadas do
+# processo principal para eles na criação do pool, com o banco, os estabelecimentos e o jornal
+CONFIGURACOES_GRAVACAO = {
+    'export_spreadsheets': ['OUTPUT_DIR'],
+    'split_by_date': ['MODO_COMPLETO', 'MAX_FILE_SIZE', 'LIMITE_SUBDIVISAO', 'INPUT_DIR', 'SPLIT_OUTPUT_DIR'],
+    'split_contas_pagar': ['MAX_FILE_SIZE', 'INPUT_DIR', 'OUTPUT_DIR'],
+    'split_contas_receber': ['MAX_FILE_SIZE', 'INPUT_DIR', 'OUTPUT_DIR'],
+    'split_contatos': ['MAX_FILE_SIZE', 'INPUT_DIR', 'OUTPUT_DIR'],
+    'part_packing': ['EMPACOTAR_PARTICOES'],
+    'dataframe_engines': ['MOTOR'],
+    'duckdb_split': ['USAR_DUCKDB'],
+    'spill_partitioner': ['ORCAMENTO_MEMORIA'],
+    'output_writers': ['FORMATOS_SAIDA'],
+}
+
+# Arquivo onde os processos de gravação escrevem stdout/stderr (None = saída herdada). O
+# forkserver guarda a saída de quando foi criado, que no executor de vários clientes é o log
+# do primeiro cliente do processo: cada cliente informa aqui o seu log
+LOG_GRAVACAO = None
+
+def configuracao_gravacao():
+    """Retrato das configurações do processo principal que os processos de gravação precisam"""
+    return {
+        'diretorio': os.getcwd(),
+        'log': os.path.abspath(LOG_GRAVACAO) if LOG_GRAVACAO else None,
+        'banco': {
+            'servidor': export_spreadsheets.SERVER, 'banco': export_spreadsheets.DATABASE,
+            'usuario': export_spreadsheets.USERNAME, 'senha': export_spreadsheets.PASSWORD,
+            'estabelecimentos': list(export_spreadsheets.ESTABELECIMENTOS_ALVO),
+            'todos_contatos': export_spreadsheets.TODOS_CONTATOS,
+        },
+        'modulos': {modulo: {nome: getattr(importlib.import_module(modulo), nome) for nome in nomes}
+                    for modulo, nomes in CONFIGURACOES_GRAVACAO.items()},
+        'jornal': run_journal.estado_auxiliar(),
+    }
+
+def _iniciar_processo_gravacao(configuracao):
+    """Inicializador dos processos de gravação: aplica o retrato de configuracao_gravacao"""
+    # O forkserver é criado uma vez por processo, no diretório de trabalho daquele momento
+    os.chdir(configuracao['diretorio'])
+    if configuracao['log']:
+        log = open(configuracao['log'], 'a', encoding='utf-8')
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        log.close()
+    export_spreadsheets.configurar_banco(**configuracao['banco'])
+    for modulo, valores in configuracao['modulos'].items():
+        for nome, valor in valores.items():
+            setattr(importlib.import_module(modulo), nome, valor)
+    run_journal.iniciar_auxiliar(configuracao['jornal'])
+
+def _gravar_e_dividir(df, tipo_arquivo, chaves_particao):
+    """
+    Executado no processo de gravação: grava o arquivo exportado e o divide. Retorna
+    a entidade e as partes gravadas, que o processo principal registra no jornal; em
+    caso de erro as partes gravadas até ali seguem no atributo partes_gravadas da exceção.
+    """
+    try:
+        export_spreadsheets.gravar_exportacao(df, tipo_arquivo, chaves_particao)
+        export_spreadsheets.dividir_exportacao(tipo_arquivo)
+        split_by_date.aguardar_completos()
+    except BaseException as e:
+        e.partes_gravadas = run_journal.coletar_partes()
+        raise
+    return tipo_arquivo, run_journal.coletar_partes()
+
+async def _consultar(exportacao, fila, executor_consultas, resultados):
+    """Consulta a entidade ao obter uma vaga em `resultados`, liberada por _gravar no fim da gravação"""
+    loop = asyncio.get_running_loop()
+    await resultados.acquire()
+    print(f"Consultando {exportacao['titulo']}...")
+    try:
+        df = await loop.run_in_executor(executor_consultas, export_spreadsheets.consultar_exportacao, exportacao)
+    except BaseException:
+        resultados.release()
+        raise
+    print(f"{exportacao['titulo']}: {len(df)} registros recebidos")
+    await fila.put((exportacao, df))
+
+async def _gravar(fila, total, executor_processos, resultados):
+    """
+    Consome a fila: formata cada resultado em uma thread e despacha a gravação
+    para o pool de processos, com até MAX_PROCESSOS_GRAVACAO gravações em andamento.
+    Cada resultado ocupa uma vaga de `resultados` da consulta até o fim da gravação,
+    o que limita a memória de pico a MAX_RESULTADOS_EM_MEMORIA DataFrames no processo
+    principal (inclusive os das consultas esperando lugar na fila), mais a cópia
+    recebida por cada processo de gravação em andamento e, durante a formatação de um
+    resultado, a cópia formatada dele.
+    """
+    loop = asyncio.get_running_loop()
+    vagas = asyncio.Semaphore(MAX_PROCESSOS_GRAVACAO)
+    gravacoes = []
+
+    async def despachar(exportacao, df, chaves_particao):
+        try:
+            try:
+                tipo_arquivo, partes = await loop.run_in_executor(
+                    executor_processos, _gravar_e_dividir,
+                    df, exportacao['tipo_arquivo'], chaves_particao)
+            except BaseException as e:
+                run_journal.incorporar_partes(getattr(e, 'partes_gravadas', None))
+                raise
+            # O jornal só é escrito por este processo: as partes vêm dos processos de gravação
+            run_journal.incorporar_partes(partes)
+            run_journal.concluir_estagio(tipo_arquivo, 'divisao')
+            print(f"{exportacao['titulo']} exportado e dividido")
+            return tipo_arquivo
+        finally:
+            vagas.release()
+            resultados.release()
+
+    for _ in range(total):
+        exportacao, df = await fila.get()
+        df, chaves_particao = await loop.run_in_executor(
+            None, export_spreadsheets.preparar_exportacao, df, exportacao['colunas'], exportacao['tipo_arquivo'])
+        await vagas.acquire()
+        gravacoes.append(asyncio.ensure_future(despachar(exportacao, df, chaves_particao)))
+        fila.task_done()
+
+    return await asyncio.gather(*gravacoes)
+
+async def exportar_async(retomar=False):
+    """
+    Exportação com consultas simultâneas. Com retomar=True as entidades já divididas
+    são puladas e as consultas já concluídas vêm dos snapshots da execução interrompida.
+    """
+    loop = asyncio.get_running_loop()
+    print(f"Iniciando exportação assíncrona de dados às {datetime.now().strftime('%H:%M:%S')}")
+    export_spreadsheets.garantir_diretorios()
+
+    has_txcobr = await loop.run_in_executor(None, export_spreadsheets.verificar_conexao)
+    if has_txcobr is None:
+        return False
+
+    run_journal.iniciar(retomar)
+    run_report.iniciar(banco=export_spreadsheets.DATABASE, estabelecimentos=export_spreadsheets.ESTABELECIMENTOS_ALVO)
+    result_cache.iniciar_execucao()
+    exportacoes = []
+    for exportacao in export_spreadsheets.montar_exportacoes(has_txcobr):
+        if run_journal.estagio_concluido(exportacao['tipo_arquivo'], 'divisao'):
+            print(f"{exportacao['titulo']} já exportado e dividido na execução anterior")
+        else:
+            exportacoes.append(exportacao)
+    fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+    resultados = asyncio.Semaphore(MAX_RESULTADOS_EM_MEMORIA or TAMANHO_FILA + MAX_PROCESSOS_GRAVACAO)
+
+    # forkserver/spawn: os processos não herdam as threads de consulta nem as conexões abertas
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+    with export_spreadsheets.indices_da_exportacao(exportacoes), \
+            ThreadPoolExecutor(max_workers=MAX_CONSULTAS_SIMULTANEAS) as executor_consultas, \
+            ProcessPoolExecutor(max_workers=MAX_PROCESSOS_GRAVACAO, mp_context=contexto,
+                                initializer=_iniciar_processo_gravacao,
+                                initargs=(configuracao_gravacao(),)) as executor_processos:
+        # No modo de baixo impacto as consultas abaixo só carregam os snapshots gravados aqui
+        await loop.run_in_executor(None, export_spreadsheets.extrair_baixo_impacto, exportacoes)
+        consultas = [_consultar(exportacao, fila, executor_consultas, resultados) for exportacao in exportacoes]
+        await asyncio.gather(_gravar(fila, len(exportacoes), executor_processos, resultados), *consultas)
+
+    split_by_date.adicional_split_large_files()
+    run_journal.finalizar()
+    print(f"Todos os dados exportados e divididos com sucesso às {datetime.now().strftime('%H:%M:%S')}")
+    return True
+
+def executar(retomar=False):
+    try:
+        return asyncio.run(exportar_async(retomar))
+    except Exception as e:
+        print(f"Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        run_report.salvar()
+
+if __name__ == "__main__":
+    executar(retomar='--resume' in sys.argv)
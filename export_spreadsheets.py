@@ -1,12 +1,27 @@
-import pandas as pd
-import pyodbc
 import os
+import sys
+import contextlib
 from datetime import datetime
+import lazy_imports
 import split_by_date
+import financial_schema
+import partition_index
+import output_writers
+import run_journal
+import run_report
+import query_stats
+import result_cache
+
+pd = lazy_imports.sob_demanda('pandas')
+pyodbc = lazy_imports.sob_demanda('pyodbc')
 
 # Configurações globais
 ESTABELECIMENTOS_ALVO = [2, 5]
 
+# Contatos exportados: só as pessoas com contas a pagar/receber nos estabelecimentos alvo
+# (as mesmas parcelas das exportações financeiras) ou, com True, todo o cadastro de PESSOA
+TODOS_CONTATOS = False
+
 # Definição das colunas para garantir que todas sejam exportadas
 colunas_contatos = [
     "ID", "Código", "Nome", "Fantasia", "Endereço", "Número", "Complemento",
@@ -38,17 +53,68 @@ USERNAME = 'SA'
 PASSWORD = 'YourStrongPassword123'
 
 OUTPUT_DIR = 'exported_data'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(split_by_date.SPLIT_OUTPUT_DIR, exist_ok=True)
 
-conn_string = f'DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD};TrustServerCertificate=yes'
+def montar_conn_string():
+    return f'DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD};TrustServerCertificate=yes'
+
+conn_string = montar_conn_string()
+
+# Valores do módulo, restaurados a cada configurar_banco para nada vazar entre clientes
+_PADROES_BANCO = {
+    'servidor': SERVER, 'banco': DATABASE, 'usuario': USERNAME, 'senha': PASSWORD,
+    'estabelecimentos': list(ESTABELECIMENTOS_ALVO), 'todos_contatos': TODOS_CONTATOS,
+}
+
+def configurar_banco(servidor=None, banco=None, usuario=None, senha=None, estabelecimentos=None, todos_contatos=None):
+    """
+    Aponta a exportação para outro banco e/ou outros estabelecimentos. O que não for
+    informado volta ao padrão do módulo, não ao valor da chamada anterior: o executor
+    de vários clientes reaproveita o mesmo processo entre clientes.
+    """
+    global SERVER, DATABASE, USERNAME, PASSWORD, ESTABELECIMENTOS_ALVO, TODOS_CONTATOS, conn_string
+    import split_contas_pagar
+    import split_contas_receber
+
+    SERVER = servidor or _PADROES_BANCO['servidor']
+    DATABASE = banco or _PADROES_BANCO['banco']
+    USERNAME = usuario or _PADROES_BANCO['usuario']
+    PASSWORD = senha or _PADROES_BANCO['senha']
+    conn_string = montar_conn_string()
+    if estabelecimentos is None:
+        estabelecimentos = _PADROES_BANCO['estabelecimentos']
+    ESTABELECIMENTOS_ALVO = list(estabelecimentos)
+    split_contas_pagar.ESTABELECIMENTOS_ALVO = list(estabelecimentos)
+    split_contas_receber.ESTABELECIMENTOS_ALVO = list(estabelecimentos)
+    TODOS_CONTATOS = _PADROES_BANCO['todos_contatos'] if todos_contatos is None else todos_contatos
+
+def garantir_diretorios():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(split_by_date.SPLIT_OUTPUT_DIR, exist_ok=True)
 
 def get_connection():
     return pyodbc.connect(conn_string)
 
-def query_to_df(query):
-    with get_connection() as conn:
+def _executar_consulta(conn, query, tipado):
+    if query_stats.CAPTURAR_ESTATISTICAS:
+        df = query_stats.executar_com_estatisticas(conn, query, coerce_float=not tipado)
+        return financial_schema.aplicar_esquema(df) if tipado else df
+    if not tipado:
         return pd.read_sql(query, conn)
+    # Mantém os decimal(22,6) como Decimal para a conversão exata em ponto fixo
+    df = pd.read_sql(query, conn, coerce_float=False)
+    return financial_schema.aplicar_esquema(df)
+
+def query_to_df(query, tipado=False):
+    """
+    Executa a consulta; com tipado=True aplica o esquema financeiro compacto.
+    Com query_stats.CAPTURAR_ESTATISTICAS as estatísticas e o plano vão para o relatório;
+    com result_cache.USAR_CACHE o resultado vem do cache se as tabelas não mudaram.
+    """
+    with get_connection() as conn:
+        if result_cache.USAR_CACHE:
+            return result_cache.consultar(conn, f"{SERVER}/{DATABASE}", query, tipado,
+                                          lambda: _executar_consulta(conn, query, tipado))
+        return _executar_consulta(conn, query, tipado)
 
 def column_exists(table_name, column_name):
     with get_connection() as conn:
@@ -62,14 +128,14 @@ def get_table_columns(table_name):
         cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{table_name}'")
         return [row[0] for row in cursor.fetchall()]
 
-def create_empty_excel_with_columns(filename, columns):
-    df = pd.DataFrame(columns=columns)
-    excel_path = f'{OUTPUT_DIR}/{filename}'
-    df.to_excel(excel_path, index=False)
+def create_empty_excel_with_columns(tipo_arquivo, columns):
+    filename = output_writers.arquivo_exportacao(tipo_arquivo)
+    output_writers.gravar(pd.DataFrame(columns=columns), f'{OUTPUT_DIR}/{filename}',
+                          output_writers.formato_saida(tipo_arquivo, 'exportacao'))
     print(f"Criado arquivo {filename} vazio com {len(columns)} colunas")
 
-def exportar_e_dividir(df, nome_arquivo, colunas_esperadas, tipo_arquivo):
-    """Exporta um DataFrame para Excel e o divide em arquivos de até 2MB"""
+def preparar_exportacao(df, colunas_esperadas, tipo_arquivo):
+    """Ajusta colunas, ordem e formatos do DataFrame consultado antes da gravação"""
     for coluna in colunas_esperadas:
         if coluna not in df.columns:
             if coluna == 'Contribuinte':
@@ -79,6 +145,11 @@ def exportar_e_dividir(df, nome_arquivo, colunas_esperadas, tipo_arquivo):
     
     df = df[colunas_esperadas]
     
+    # Contas saem ordenadas por (estabelecimento, mês de vencimento, emissão) para o índice de partições
+    chaves_particao = None
+    if tipo_arquivo in ['contas_pagar', 'contas_receber']:
+        df, chaves_particao = partition_index.ordenar_por_particao(df)
+    
     colunas_data = [col for col in df.columns if 'data' in col.lower() or 'emissao' in col.lower() or 'nascimento' in col.lower() or 'vencimento' in col.lower() or 'liquidacao' in col.lower()]
     for col in colunas_data:
         if col in df.columns:
@@ -93,10 +164,23 @@ def exportar_e_dividir(df, nome_arquivo, colunas_esperadas, tipo_arquivo):
         if 'Tipo pessoa' in df.columns:
             df.loc[df['Tipo pessoa'] == 'Jurídica', 'Contribuinte'] = 1
     
+    return df, chaves_particao
+
+def gravar_exportacao(df, tipo_arquivo, chaves_particao=None):
+    """
+    Grava o arquivo exportado pelo escritor do formato configurado em output_writers
+    (xlsx em streaming) e, para as contas, o índice de partições ao lado dele
+    """
+    nome_arquivo = output_writers.arquivo_exportacao(tipo_arquivo)
     excel_path = f'{OUTPUT_DIR}/{nome_arquivo}'
-    df.to_excel(excel_path, index=False)
+    output_writers.gravar(df, excel_path, output_writers.formato_saida(tipo_arquivo, 'exportacao'))
     print(f"Exportados {len(df)} registros para {nome_arquivo}")
     
+    if chaves_particao is not None:
+        indice = partition_index.salvar_indice(excel_path, chaves_particao)
+        print(f"Índice de partições salvo: {partition_index.caminho_indice(excel_path)} ({len(indice['particoes'])} partições)")
+
+def dividir_exportacao(tipo_arquivo):
     if tipo_arquivo == 'contatos':
         split_by_date.process_contacts()
     elif tipo_arquivo == 'contas_pagar':
@@ -104,28 +188,16 @@ def exportar_e_dividir(df, nome_arquivo, colunas_esperadas, tipo_arquivo):
     elif tipo_arquivo == 'contas_receber':
         split_by_date.process_accounts_receivable()
 
-try:
-    print(f"Iniciando exportação de dados às {datetime.now().strftime('%H:%M:%S')}")
-    try:
-        has_txcobr = column_exists('DOC_FINANCEIRO_PARCELA', 'VL_DFINP_TXCOBR')
-        print(f"Coluna VL_DFINP_TXCOBR existe: {has_txcobr}")
-        connected_to_db = True
-    except Exception as e:
-        print(f"Erro na conexão com o banco de dados: {str(e)}")
-        print("Criando arquivos Excel vazios com as colunas especificadas...")
-        connected_to_db = False
-    
-    if not connected_to_db:
-        create_empty_excel_with_columns('contatos.xlsx', colunas_contatos)
-        create_empty_excel_with_columns('contas_a_pagar.xlsx', colunas_contas_pagar)
-        create_empty_excel_with_columns('contas_a_receber.xlsx', colunas_contas_receber)
-        print("Criação de arquivos vazios concluída")
-        exit(0)
-    
-    print("\nExportando Contas a Pagar...")
-    estabelecimentos_lista = ','.join(map(str, ESTABELECIMENTOS_ALVO))
+def exportar_e_dividir(df, nome_arquivo, colunas_esperadas, tipo_arquivo):
+    """Exporta um DataFrame para Excel e o divide em arquivos de até 2MB"""
+    df, chaves_particao = preparar_exportacao(df, colunas_esperadas, tipo_arquivo)
+    gravar_exportacao(df, tipo_arquivo, chaves_particao)
+    dividir_exportacao(tipo_arquivo)
+
+def consulta_contas_pagar(estabelecimentos=None):
+    estabelecimentos_lista = ','.join(map(str, estabelecimentos or ESTABELECIMENTOS_ALVO))
     
-    contas_pagar_query = f"""
+    return f"""
     SELECT 
         dfp.DOC_FINANCEIRO_PARCELA_ID AS ID, 
         p.NM_PESS_IDENT AS Fornecedor,
@@ -165,19 +237,15 @@ try:
         df.NO_DFIN_TIPO = 2  -- Type 2 = Accounts Payable (Contas a Pagar)
         AND df.ESTABELECIMENTO_ID IN ({estabelecimentos_lista})
     """
-    
-    contas_pagar_df = query_to_df(contas_pagar_query)
-    exportar_e_dividir(contas_pagar_df, 'contas_a_pagar.xlsx', colunas_contas_pagar, 'contas_pagar')
-    
-    print("\nExportando Contas a Receber...")
+
+def consulta_contas_receber(has_txcobr, estabelecimentos=None):
     taxas_column = "0 AS Taxas"
     if has_txcobr:
         taxas_column = "dfp.VL_DFINP_TXCOBR AS Taxas" 
         
-    estabelecimentos_lista = ','.join(map(str, ESTABELECIMENTOS_ALVO))
+    estabelecimentos_lista = ','.join(map(str, estabelecimentos or ESTABELECIMENTOS_ALVO))
 
-    
-    contas_receber_query = f"""
+    return f"""
 SELECT 
     dfp.DOC_FINANCEIRO_PARCELA_ID AS Id, 
     p.NM_PESS_IDENT AS Cliente,
@@ -215,15 +283,26 @@ WHERE
     df.NO_DFIN_TIPO = 1  -- Type 1 = Accounts Receivable (Contas a Receber)
     AND df.ESTABELECIMENTO_ID IN ({estabelecimentos_lista})
 """
-    
-    contas_receber_df = query_to_df(contas_receber_query)
-    print(f"Filtrados apenas registros dos estabelecimentos {ESTABELECIMENTOS_ALVO}")
-    if "Estabelecimento_id" not in colunas_contas_receber:
-        colunas_contas_receber.append("Estabelecimento_id")
-    exportar_e_dividir(contas_receber_df, 'contas_a_receber.xlsx', colunas_contas_receber, 'contas_receber')
-    print("\nExportando Contatos...")
-    
-    contatos_query = """
+
+def consulta_contatos(todos=None, estabelecimentos=None):
+    """
+    PESSOA com município/UF e telefone padrão. Sem `todos`, só as pessoas
+    referenciadas por parcelas de contas a pagar/receber dos estabelecimentos
+    (semi-join com EXISTS: cada pessoa sai uma vez, sem multiplicar pelas parcelas).
+    """
+    todos = TODOS_CONTATOS if todos is None else todos
+    estabelecimentos_lista = ','.join(map(str, estabelecimentos or ESTABELECIMENTOS_ALVO))
+    filtro = "" if todos else f"""
+    WHERE EXISTS (
+        SELECT 1
+        FROM DOC_FINANCEIRO df
+        JOIN DOC_FINANCEIRO_PARCELA dfp ON dfp.DOC_FINANCEIRO_ID = df.DOC_FINANCEIRO_ID
+        WHERE df.PESSOA_ID = p.PESSOA_ID
+            AND df.NO_DFIN_TIPO IN (1, 2)  -- Contas a receber e a pagar
+            AND df.ESTABELECIMENTO_ID IN ({estabelecimentos_lista})
+    )"""
+
+    return f"""
     SELECT 
         p.PESSOA_ID AS ID, 
         p.NO_PESS_IDENT AS Código,
@@ -289,17 +368,140 @@ WHERE
     LEFT JOIN 
         MUNICIPIO m ON p.MUNICIPIO_ID = m.MUNICIPIO_ID
     LEFT JOIN 
-        UF u ON m.UF_ID = u.UF_ID
+        UF u ON m.UF_ID = u.UF_ID{filtro}
     """
-    
-    contatos_df = query_to_df(contatos_query)
-    exportar_e_dividir(contatos_df, 'contatos.xlsx', colunas_contatos, 'contatos')
-    
-    split_by_date.adicional_split_large_files()
-    
-    print(f"Todos os dados exportados e divididos com sucesso às {datetime.now().strftime('%H:%M:%S')}")
-    
-except Exception as e:
-    print(f"Erro: {str(e)}")
-    import traceback
-    traceback.print_exc() 
\ No newline at end of file
+
+def montar_exportacoes(has_txcobr):
+    """Consultas e destinos de cada entidade, na ordem em que são exportadas"""
+    colunas_receber = list(colunas_contas_receber)
+    if "Estabelecimento_id" not in colunas_receber:
+        colunas_receber.append("Estabelecimento_id")
+    return [
+        {'tipo_arquivo': 'contas_pagar', 'titulo': 'Contas a Pagar', 'nome_arquivo': output_writers.arquivo_exportacao('contas_pagar'),
+         'colunas': colunas_contas_pagar, 'consulta': consulta_contas_pagar(), 'chave': 'ID', 'tipado': True},
+        {'tipo_arquivo': 'contas_receber', 'titulo': 'Contas a Receber', 'nome_arquivo': output_writers.arquivo_exportacao('contas_receber'),
+         'colunas': colunas_receber, 'consulta': consulta_contas_receber(has_txcobr), 'chave': 'Id', 'tipado': True},
+        {'tipo_arquivo': 'contatos', 'titulo': 'Contatos', 'nome_arquivo': output_writers.arquivo_exportacao('contatos'),
+         'colunas': colunas_contatos, 'consulta': consulta_contatos(), 'chave': 'ID', 'tipado': False},
+    ]
+
+def verificar_conexao():
+    """Testa a conexão; retorna se a coluna de taxas existe ou None se o banco estiver indisponível"""
+    try:
+        has_txcobr = column_exists('DOC_FINANCEIRO_PARCELA', 'VL_DFINP_TXCOBR')
+        print(f"Coluna VL_DFINP_TXCOBR existe: {has_txcobr}")
+        return has_txcobr
+    except Exception as e:
+        print(f"Erro na conexão com o banco de dados: {str(e)}")
+        print("Criando arquivos Excel vazios com as colunas especificadas...")
+        create_empty_excel_with_columns('contatos', colunas_contatos)
+        create_empty_excel_with_columns('contas_pagar', colunas_contas_pagar)
+        create_empty_excel_with_columns('contas_receber', colunas_contas_receber)
+        print("Criação de arquivos vazios concluída")
+        return None
+
+def indices_da_exportacao(exportacoes):
+    """Índices temporários sugeridos pelo index_advisor em volta da extração, quando ativados"""
+    import index_advisor
+    if not index_advisor.CRIAR_INDICES_TEMPORARIOS:
+        return contextlib.nullcontext()
+    return index_advisor.indices_temporarios({exportacao['tipo_arquivo']: exportacao['consulta'] for exportacao in exportacoes})
+
+def extrair_baixo_impacto(exportacoes):
+    """Com o modo de baixo impacto, lê as consultas pendentes de um mesmo snapshot, em lotes controlados"""
+    import low_impact_extraction
+    if low_impact_extraction.MODO_BAIXO_IMPACTO:
+        low_impact_extraction.extrair_consistente(
+            [exportacao for exportacao in exportacoes if not run_journal.estagio_concluido(exportacao['tipo_arquivo'], 'gravacao')])
+
+def consultar_exportacao(exportacao):
+    """Resultado da consulta da entidade: do snapshot da execução interrompida ou do banco"""
+    tipo_arquivo = exportacao['tipo_arquivo']
+    if run_journal.estagio_concluido(tipo_arquivo, 'consulta'):
+        print(f"Usando resultado da consulta salvo na execução anterior ({exportacao['titulo']})")
+        return run_journal.carregar_snapshot(tipo_arquivo)
+    df = query_to_df(exportacao['consulta'], tipado=exportacao['tipado'])
+    run_journal.salvar_snapshot(tipo_arquivo, df)
+    return df
+
+def exportar(retomar=False):
+    """
+    Exporta as três entidades em sequência e divide os arquivos gerados; retorna se concluiu.
+    Cada estágio concluído fica no jornal da execução; com retomar=True uma execução
+    interrompida continua do último estágio (e da última parte) gravado.
+    """
+    try:
+        print(f"Iniciando exportação de dados às {datetime.now().strftime('%H:%M:%S')}")
+        garantir_diretorios()
+        has_txcobr = verificar_conexao()
+        if has_txcobr is None:
+            return False
+        
+        run_journal.iniciar(retomar)
+        run_report.iniciar(banco=DATABASE, estabelecimentos=ESTABELECIMENTOS_ALVO)
+        result_cache.iniciar_execucao()
+        exportacoes = montar_exportacoes(has_txcobr)
+        with indices_da_exportacao(exportacoes):
+            extrair_baixo_impacto(exportacoes)
+            for exportacao in exportacoes:
+                tipo_arquivo = exportacao['tipo_arquivo']
+                if run_journal.estagio_concluido(tipo_arquivo, 'divisao'):
+                    print(f"\n{exportacao['titulo']} já exportado e dividido na execução anterior")
+                    continue
+                
+                if run_journal.estagio_concluido(tipo_arquivo, 'gravacao'):
+                    print(f"\n{exportacao['titulo']} já exportado na execução anterior, retomando a divisão...")
+                else:
+                    print(f"\nExportando {exportacao['titulo']}...")
+                    df = consultar_exportacao(exportacao)
+                    if tipo_arquivo == 'contas_receber':
+                        print(f"Filtrados apenas registros dos estabelecimentos {ESTABELECIMENTOS_ALVO}")
+                    if tipo_arquivo == 'contatos' and not TODOS_CONTATOS:
+                        print(f"Filtrados apenas contatos com contas nos estabelecimentos {ESTABELECIMENTOS_ALVO}")
+                    df, chaves_particao = preparar_exportacao(df, exportacao['colunas'], tipo_arquivo)
+                    gravar_exportacao(df, tipo_arquivo, chaves_particao)
+                    run_journal.concluir_estagio(tipo_arquivo, 'gravacao', caminho=f"{OUTPUT_DIR}/{exportacao['nome_arquivo']}")
+                
+                dividir_exportacao(tipo_arquivo)
+                run_journal.concluir_estagio(tipo_arquivo, 'divisao')
+        
+        split_by_date.adicional_split_large_files()
+        split_by_date.aguardar_completos()
+        run_journal.finalizar()
+        
+        print(f"Todos os dados exportados e divididos com sucesso às {datetime.now().strftime('%H:%M:%S')}")
+        return True
+        
+    except Exception as e:
+        print(f"Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        run_report.salvar()
+
+def run(modo_async=False, retomar=False, **configuracao_banco):
+    """
+    Ponto de entrada da biblioteca: exporta as entidades e divide os arquivos.
+    Aceita os parâmetros de configurar_banco (servidor, banco, usuario, senha,
+    estabelecimentos, todos_contatos); retorna se a exportação foi concluída. Com retomar=True
+    continua uma execução interrompida a partir do jornal em OUTPUT_DIR/.checkpoint.
+    """
+    if configuracao_banco:
+        configurar_banco(**configuracao_banco)
+    if modo_async:
+        import export_async
+        return export_async.executar(retomar)
+    return exportar(retomar)
+
+if __name__ == "__main__":
+    query_stats.CAPTURAR_ESTATISTICAS = '--estatisticas' in sys.argv
+    result_cache.USAR_CACHE = '--cache' in sys.argv
+    if '--indices-temporarios' in sys.argv:
+        import index_advisor
+        index_advisor.CRIAR_INDICES_TEMPORARIOS = True
+    if '--baixo-impacto' in sys.argv:
+        import low_impact_extraction
+        low_impact_extraction.MODO_BAIXO_IMPACTO = True
+    run(modo_async='--async' in sys.argv, retomar='--resume' in sys.argv,
+        **({'todos_contatos': True} if '--todos-contatos' in sys.argv else {}))
@@ -0,0 +1,124 @@
+from decimal import Decimal, InvalidOperation
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+np = lazy_imports.sob_demanda('numpy')
+
+# Escala do ponto fixo: o banco guarda os valores como decimal(22,6)
+ESCALA_MONETARIA = 10 ** 6
+
+# Colunas monetárias guardadas como inteiros escalados (Int64)
+COLUNAS_MONETARIAS = ['Valor documento', 'Saldo', 'Taxas']
+
+# Colunas de identificador guardadas como Int32
+COLUNAS_ID = ['Id', 'ID', 'Estabelecimento_id']
+
+# Colunas de texto com poucos valores distintos guardadas como categóricas
+COLUNAS_CATEGORICAS = [
+    'Situacao', 'Situação', 'Categoria', 'Pago',
+    'Forma de recebimento', 'Meio de recebimento',
+    'Forma Pagamento', 'Forma de pagamento', 'Meio de pagamento',
+    'Cliente', 'Fornecedor'
+]
+
+def _decimal_para_ponto_fixo(valor):
+    """Converte um valor isolado para inteiro escalado sem passar por float"""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)) or valor is pd.NA:
+        return pd.NA
+    try:
+        decimal = valor if isinstance(valor, Decimal) else Decimal(str(valor).strip())
+    except InvalidOperation:
+        return pd.NA
+    if not decimal.is_finite():
+        return pd.NA
+    return int(decimal.scaleb(6).to_integral_value())
+
+def para_ponto_fixo(serie):
+    """
+    Converte uma coluna monetária para inteiros escalados por ESCALA_MONETARIA.
+
+    Valores Decimal (vindos do pyodbc) e texto são convertidos de forma exata;
+    colunas float são arredondadas para a sexta casa decimal.
+    """
+    if isinstance(serie.dtype, pd.Int64Dtype):
+        return serie
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+        nulos = np.isnan(valores)
+        escalados = np.rint(np.where(nulos, 0, valores) * ESCALA_MONETARIA).astype('int64')
+        return pd.Series(pd.arrays.IntegerArray(escalados, nulos), index=serie.index, name=serie.name)
+    return serie.map(_decimal_para_ponto_fixo).astype('Int64')
+
+def de_ponto_fixo(serie):
+    """Converte inteiros escalados de volta para float (usado apenas na escrita)"""
+    return serie.astype('Float64').div(ESCALA_MONETARIA).astype('float64')
+
+def eh_ponto_fixo(serie):
+    """Indica se a coluna já está no formato de ponto fixo do esquema"""
+    return isinstance(serie.dtype, pd.Int64Dtype)
+
+def aplicar_esquema(df):
+    """
+    Aplica os tipos compactos aos DataFrames financeiros: categóricas para
+    textos repetitivos, Int32 para identificadores e ponto fixo Int64 para valores.
+    Deve ser chamada logo após a leitura/consulta dos dados.
+    """
+    for coluna in COLUNAS_MONETARIAS:
+        if coluna in df.columns:
+            df[coluna] = para_ponto_fixo(df[coluna])
+
+    for coluna in COLUNAS_ID:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.Int32Dtype):
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').round().astype('Int32')
+
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+
+    return df
+
+def materializar(df):
+    """
+    Devolve uma cópia do DataFrame pronta para escrita: valores monetários
+    voltam a ser decimais e as categóricas voltam a ser texto.
+    """
+    saida = df.copy()
+    for coluna in saida.columns:
+        if coluna in COLUNAS_MONETARIAS and eh_ponto_fixo(saida[coluna]):
+            saida[coluna] = de_ponto_fixo(saida[coluna])
+        elif isinstance(saida[coluna].dtype, pd.CategoricalDtype):
+            saida[coluna] = saida[coluna].astype(object)
+    return saida
+
+def preencher_coluna(df, mascara, coluna, valores):
+    """
+    Atribui valores às linhas selecionadas respeitando o tipo da coluna:
+    adiciona novas categorias quando necessário e converte valores monetários
+    para ponto fixo.
+    """
+    serie = df[coluna]
+
+    if coluna in COLUNAS_MONETARIAS and eh_ponto_fixo(serie):
+        if isinstance(valores, pd.Series):
+            valores = para_ponto_fixo(valores)
+        else:
+            valores = _decimal_para_ponto_fixo(valores)
+    elif isinstance(serie.dtype, pd.CategoricalDtype):
+        novos = pd.unique(valores[mascara] if isinstance(valores, pd.Series) else pd.Series([valores]))
+        novos = [v for v in novos if not pd.isna(v) and v not in serie.cat.categories]
+        if novos:
+            df[coluna] = serie.cat.add_categories(novos)
+    elif pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_numeric_dtype(pd.Series(valores).dtype):
+        # Coluna lida inteiramente vazia (float) recebendo texto padrão
+        df[coluna] = serie.astype(object)
+
+    if isinstance(valores, pd.Series):
+        df.loc[mascara, coluna] = valores[mascara]
+    else:
+        df.loc[mascara, coluna] = valores
+    return df
+
+def somar_exato(serie):
+    """Soma exata de uma coluna monetária, devolvida como Decimal"""
+    total = int(para_ponto_fixo(serie).sum())
+    return Decimal(total).scaleb(-6)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import re
+import sys
+import time
+from contextlib import contextmanager
+import subset_extractor
+import run_report
+
+# Cria os índices sugeridos antes da extração e os remove no fim. Só para cópias restauradas
+# (ex.: o SQL Server do docker-compose), nunca para o banco de produção do cliente.
+CRIAR_INDICES_TEMPORARIOS = False
+
+PREFIXO_INDICE = 'IX_EXPORTACAO'
+
+# Linhas lidas por vez ao medir uma consulta (o resultado é descartado)
+LINHAS_POR_LEITURA = 10000
+
+# Executa as consultas uma vez, sem medir, antes do tempo "antes": a primeira leitura traz as
+# páginas do disco e a medição "depois" (com índices) pegaria o cache já quente
+AQUECER_ANTES_DE_MEDIR = True
+
+def _remover_comentarios(sql):
+    return re.sub(r'--[^\n]*', '', sql)
+
+def _separar_blocos(sql):
+    """
+    Separa a consulta em blocos SELECT: o principal e cada subconsulta (correlacionada,
+    EXISTS, IN). O texto de cada subconsulta é trocado no bloco pai por um marcador.
+    """
+    blocos = []
+    def extrair(texto):
+        while True:
+            inicio = re.search(r'\(\s*SELECT\b', texto, re.IGNORECASE)
+            if not inicio:
+                break
+            profundidade, posicao = 0, inicio.start()
+            for posicao in range(inicio.start(), len(texto)):
+                profundidade += {'(': 1, ')': -1}.get(texto[posicao], 0)
+                if profundidade == 0:
+                    break
+            extrair(texto[inicio.start() + 1:posicao])
+            texto = texto[:inicio.start()] + '(<subconsulta>)' + texto[posicao + 1:]
+        blocos.append(texto)
+    extrair(_remover_comentarios(sql))
+    return blocos[::-1]
+
+def analisar_consulta(sql):
+    """
+    Por bloco: apelidos -> tabelas, filtros com literais (= ou IN), junções entre colunas
+    e colunas usadas. Retorna a lista de blocos, o principal primeiro.
+    """
+    analises = []
+    for bloco in _separar_blocos(sql):
+        de = re.search(r'\bFROM\b', bloco, re.IGNORECASE)
+        condicoes = bloco[de.start():] if de else ''
+        apelidos = {}
+        for tabela, apelido in re.findall(r'\b(?:FROM|JOIN)\s+(?:\[?dbo\]?\.)?\[?(\w+)\]?\s+(?:AS\s+)?(\w+)', condicoes, re.IGNORECASE):
+            if apelido.upper() not in ('ON', 'WHERE', 'LEFT', 'RIGHT', 'INNER', 'JOIN', 'CROSS', 'OUTER'):
+                apelidos[apelido] = tabela
+        filtros = re.findall(r'\b(\w+)\.(\w+)\s*(?:=\s*(?:-?\d+|\'[^\']*\')|IN\s*\((?!<subconsulta>))', condicoes, re.IGNORECASE)
+        juncoes = re.findall(r'\b(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)', condicoes)
+        usadas = re.findall(r'\b(\w+)\.(\w+)\b', bloco)
+        analises.append({'apelidos': apelidos, 'filtros': filtros, 'juncoes': juncoes, 'usadas': usadas})
+    return analises
+
+def _sugerir_bloco(analise, apelidos_externos, esquema, sugestoes):
+    apelidos = dict(apelidos_externos, **analise['apelidos'])
+    locais = set(analise['apelidos'])
+
+    def colunas(apelido, lista):
+        return [coluna for a, coluna in lista if a == apelido and coluna in esquema[apelidos[apelido]]['colunas']]
+
+    def sugerir(apelido, chave):
+        tabela = apelidos[apelido]
+        # A chave primária (clustered) já está em todo índice não clustered
+        primaria = esquema[tabela]['chave']
+        if chave == primaria[:len(chave)]:
+            return
+        incluir = [coluna for coluna in dict.fromkeys(colunas(apelido, analise['usadas']))
+                   if coluna not in chave and coluna not in primaria]
+        atual = sugestoes.setdefault((tabela, tuple(chave)), [])
+        atual.extend(coluna for coluna in incluir if coluna not in atual)
+
+    filtros = {apelido: list(dict.fromkeys(colunas(apelido, analise['filtros']))) for apelido in locais}
+
+    # Tabela que conduz o bloco: a filtrada por literais ou, sem filtro, a primeira do FROM.
+    # Subconsultas correlacionadas são alcançadas pela junção com a consulta externa.
+    alcancadas = set(apelidos_externos)
+    correlacionada = any((a in apelidos_externos) != (b in apelidos_externos) for a, _, b, _ in analise['juncoes'])
+    conduzida = None
+    if not correlacionada:
+        conduzida = next((apelido for apelido in analise['apelidos'] if filtros[apelido]), None)
+        if conduzida is None and analise['apelidos']:
+            conduzida = next(iter(analise['apelidos']))
+    if conduzida is not None:
+        alcancadas.add(conduzida)
+        if filtros[conduzida]:
+            sugerir(conduzida, filtros[conduzida])
+
+    # A partir das tabelas alcançadas, cada junção que não cai na chave primária pede um índice
+    juncoes = [(a, x, b, y) for a, x, b, y in analise['juncoes'] if a in apelidos and b in apelidos]
+    mudou = True
+    while mudou:
+        mudou = False
+        for a, x, b, y in juncoes:
+            for origem, destino, coluna in ((a, b, y), (b, a, x)):
+                if origem in alcancadas and destino not in alcancadas and destino in locais:
+                    alcancadas.add(destino)
+                    mudou = True
+                    if esquema[apelidos[destino]]['chave'] != [coluna]:
+                        sugerir(destino, [coluna] + [f for f in filtros[destino] if f != coluna])
+    return apelidos
+
+def sugerir_indices(consultas, esquema=None):
+    """
+    Índices de cobertura para as consultas: chave com as colunas de filtro (ou a coluna de
+    junção pela qual a tabela é alcançada) e INCLUDE com as demais colunas usadas da tabela.
+    Retorna dicts com 'tabela', 'chave', 'incluir', 'nome' e 'ddl'.
+    """
+    esquema = esquema or subset_extractor.carregar_esquema()
+    sugestoes = {}
+    for sql in consultas:
+        analises = analisar_consulta(sql)
+        apelidos = _sugerir_bloco(analises[0], {}, esquema, sugestoes)
+        for analise in analises[1:]:
+            _sugerir_bloco(analise, apelidos, esquema, sugestoes)
+
+    indices = []
+    for (tabela, chave), incluir in sugestoes.items():
+        nome = f"{PREFIXO_INDICE}_{tabela}_{'_'.join(chave)}"[:128]
+        ddl = f"CREATE NONCLUSTERED INDEX [{nome}] ON [dbo].[{tabela}] ({', '.join(f'[{c}]' for c in chave)})"
+        if incluir:
+            ddl += f" INCLUDE ({', '.join(f'[{c}]' for c in incluir)})"
+        indices.append({'tabela': tabela, 'chave': list(chave), 'incluir': incluir, 'nome': nome, 'ddl': ddl})
+    return indices
+
+def consultas_exportacao(has_txcobr=True):
+    import export_spreadsheets
+    return {exportacao['tipo_arquivo']: exportacao['consulta'] for exportacao in export_spreadsheets.montar_exportacoes(has_txcobr)}
+
+def medir_consulta(conexao, sql):
+    """Segundos para executar a consulta e ler todas as linhas (descartadas)"""
+    cursor = conexao.cursor()
+    inicio = time.perf_counter()
+    cursor.execute(sql)
+    while cursor.fetchmany(LINHAS_POR_LEITURA):
+        pass
+    return time.perf_counter() - inicio
+
+def _medir(conexao, consultas):
+    return {tipo: round(medir_consulta(conexao, sql), 3) for tipo, sql in consultas.items()}
+
+@contextmanager
+def indices_temporarios(consultas):
+    """
+    Cria os índices sugeridos para `consultas` ({tipo: sql}) antes da extração e os remove
+    ao sair, mesmo com erro. Os tempos de cada consulta antes e depois dos índices (ambos
+    com o cache aquecido, ver AQUECER_ANTES_DE_MEDIR) e o tempo de criação ficam na seção
+    'indices' do relatório da execução.
+    """
+    import export_spreadsheets
+
+    indices = sugerir_indices(consultas.values())
+    criados = []
+    with export_spreadsheets.get_connection() as conexao:
+        conexao.autocommit = True
+        cursor = conexao.cursor()
+        try:
+            aquecimento = _medir(conexao, consultas) if AQUECER_ANTES_DE_MEDIR else None
+            antes = _medir(conexao, consultas)
+            inicio = time.perf_counter()
+            for indice in indices:
+                cursor.execute("SELECT COUNT(*) FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?)",
+                               indice['nome'], f"dbo.{indice['tabela']}")
+                if cursor.fetchone()[0] > 0:
+                    print(f"Índice {indice['nome']} já existe, mantido")
+                    continue
+                print(f"Criando índice temporário {indice['nome']}...")
+                cursor.execute(indice['ddl'])
+                criados.append(indice)
+            criacao = time.perf_counter() - inicio
+            depois = _medir(conexao, consultas)
+            for tipo in consultas:
+                print(f"{tipo}: {antes[tipo]:.2f}s sem índices, {depois[tipo]:.2f}s com índices")
+            run_report.registrar('indices', 'temporarios', {
+                'criados': [indice['ddl'] for indice in criados],
+                'criacao_segundos': round(criacao, 3),
+                'tempos': {tipo: {'antes': antes[tipo], 'depois': depois[tipo]} for tipo in consultas},
+                'aquecimento': aquecimento,
+            })
+            yield criados
+        finally:
+            for indice in criados:
+                print(f"Removendo índice temporário {indice['nome']}...")
+                cursor.execute(f"DROP INDEX [{indice['nome']}] ON [dbo].[{indice['tabela']}]")
+
+if __name__ == "__main__":
+    # Uso: python index_advisor.py  (imprime o DDL dos índices sugeridos para as consultas da exportação)
+    for indice in sugerir_indices(consultas_exportacao('--sem-taxas' not in sys.argv).values()):
+        print(indice['ddl'] + ';')
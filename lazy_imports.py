@@ -0,0 +1,27 @@
+import importlib
+
+class ModuloSobDemanda:
+    """
+    Representa um módulo que só é importado no primeiro acesso a um atributo.
+    Permite importar os scripts (e iniciar processos auxiliares) sem pagar o
+    custo de carregar pandas, numpy ou pyodbc antes de precisar deles.
+    """
+
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+
+    def _carregar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._carregar(), atributo)
+
+    def __repr__(self):
+        situacao = 'carregado' if self._modulo is not None else 'não carregado'
+        return f"<módulo sob demanda '{self._nome}' ({situacao})>"
+
+def sob_demanda(nome):
+    return ModuloSobDemanda(nome)
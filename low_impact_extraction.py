@@ -0,0 +1,179 @@
+import time
+import lazy_imports
+import financial_schema
+import run_journal
+import run_report
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Extração de baixo impacto para bancos em produção: as três consultas leem o mesmo
+# snapshot (uma transação SNAPSHOT, sem bloqueios compartilhados), em lotes pela chave
+# com limite de linhas/s e de leituras/s e recuo automático quando a latência do servidor sobe.
+MODO_BAIXO_IMPACTO = False
+
+# 'SNAPSHOT' (exige ALLOW_SNAPSHOT_ISOLATION ON; as três exportações ficam consistentes entre si)
+# ou 'READ COMMITTED' (com READ_COMMITTED_SNAPSHOT ON não bloqueia, mas cada lote vê o seu próprio instante)
+ISOLAMENTO = 'SNAPSHOT'
+
+LINHAS_POR_LOTE = 5000
+LINHAS_MINIMAS_POR_LOTE = 500
+
+# Orçamentos (None = sem limite): linhas lidas por segundo e leituras lógicas da sessão por segundo
+LINHAS_POR_SEGUNDO = None
+LEITURAS_POR_SEGUNDO = None
+
+# Um lote com custo por linha acima de FATOR_LATENCIA vezes o melhor custo observado indica
+# servidor sobrecarregado: a pausa dobra (até PAUSA_MAXIMA) e o lote cai pela metade
+FATOR_LATENCIA = 2.0
+PAUSA_INICIAL = 0.5
+PAUSA_MAXIMA = 30.0
+
+# Valores do módulo, restaurados por configurar() a cada cliente de um processo reaproveitado
+_PADROES = {
+    'MODO_BAIXO_IMPACTO': MODO_BAIXO_IMPACTO, 'ISOLAMENTO': ISOLAMENTO,
+    'LINHAS_POR_SEGUNDO': LINHAS_POR_SEGUNDO, 'LEITURAS_POR_SEGUNDO': LEITURAS_POR_SEGUNDO,
+}
+
+def configurar(**ajustes):
+    """Volta as configurações ao padrão do módulo e aplica os ajustes (ex.: LINHAS_POR_SEGUNDO=2000)"""
+    desconhecidos = set(ajustes) - set(_PADROES)
+    if desconhecidos:
+        raise ValueError(f"Configurações desconhecidas: {', '.join(sorted(desconhecidos))}")
+    globals().update(_PADROES, **ajustes)
+
+class ControleVazao:
+    """Decide a pausa depois de cada lote e o tamanho do próximo"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.linhas = 0
+        self.leituras = 0
+        self.melhor_custo = None
+        self.pausa_recuo = 0.0
+        self.tamanho_lote = LINHAS_POR_LOTE
+        self.recuos = 0
+        self.tempo_pausado = 0.0
+
+    def registrar_lote(self, linhas, duracao, leituras=0):
+        self.linhas += linhas
+        self.leituras += leituras
+        custo = duracao / max(1, linhas)
+        if self.melhor_custo is None or custo < self.melhor_custo:
+            self.melhor_custo = custo
+        if custo > FATOR_LATENCIA * self.melhor_custo:
+            self.pausa_recuo = min(PAUSA_MAXIMA, max(PAUSA_INICIAL, self.pausa_recuo * 2))
+            self.tamanho_lote = max(LINHAS_MINIMAS_POR_LOTE, self.tamanho_lote // 2)
+            self.recuos += 1
+        else:
+            self.pausa_recuo = self.pausa_recuo / 2 if self.pausa_recuo > PAUSA_INICIAL else 0.0
+            self.tamanho_lote = min(LINHAS_POR_LOTE, self.tamanho_lote * 2)
+
+    def pausa(self):
+        """Segundos a esperar: o maior entre o recuo por latência e o atraso para caber nos orçamentos"""
+        decorrido = time.perf_counter() - self.inicio
+        atrasos = [self.pausa_recuo]
+        if LINHAS_POR_SEGUNDO:
+            atrasos.append(self.linhas / LINHAS_POR_SEGUNDO - decorrido)
+        if LEITURAS_POR_SEGUNDO:
+            atrasos.append(self.leituras / LEITURAS_POR_SEGUNDO - decorrido)
+        return max(0.0, *atrasos)
+
+    def esperar(self):
+        pausa = self.pausa()
+        if pausa > 0:
+            time.sleep(pausa)
+            self.tempo_pausado += pausa
+
+def _leituras_sessao(cursor):
+    # Cada sessão enxerga a própria linha em sys.dm_exec_sessions sem VIEW SERVER STATE
+    cursor.execute("SELECT logical_reads FROM sys.dm_exec_sessions WHERE session_id = @@SPID")
+    return cursor.fetchone()[0]
+
+def _iniciar_transacao(conexao, cursor):
+    """
+    Confere o banco e define o isolamento antes da primeira leitura de dados. Com
+    autocommit desligado a consulta a sys.databases já abre uma transação implícita em
+    READ COMMITTED, e uma transação iniciada não passa para SNAPSHOT (erro 3951): ela é
+    encerrada com commit antes do SET, e a transação das exportações começa na próxima consulta.
+    """
+    cursor.execute("SELECT snapshot_isolation_state, is_read_committed_snapshot_on FROM sys.databases WHERE name = DB_NAME()")
+    snapshot, rcsi = cursor.fetchone()
+    conexao.commit()
+    if ISOLAMENTO == 'SNAPSHOT':
+        if snapshot != 1:
+            raise RuntimeError(
+                "O banco não permite isolamento SNAPSHOT. Habilite com ALTER DATABASE <banco> SET "
+                "ALLOW_SNAPSHOT_ISOLATION ON ou use ISOLAMENTO = 'READ COMMITTED' (sem consistência entre as exportações)")
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+    else:
+        if not rcsi:
+            print("Aviso: READ_COMMITTED_SNAPSHOT desligado; as leituras em READ COMMITTED usam bloqueios compartilhados")
+        print("Aviso: em READ COMMITTED cada lote lê o seu próprio instante; as exportações podem não ser consistentes entre si")
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+
+def consultar_em_lotes(cursor, consulta, chave, controle):
+    """Lê a consulta em lotes pela coluna `chave` (keyset), respeitando o controle de vazão"""
+    paginas = []
+    colunas = None
+    ultima = None
+    while True:
+        continuacao = "" if ultima is None else f" WHERE consulta.[{chave}] > ?"
+        sql = f"SELECT TOP ({controle.tamanho_lote}) * FROM ({consulta}) AS consulta{continuacao} ORDER BY consulta.[{chave}]"
+        leituras_antes = _leituras_sessao(cursor) if LEITURAS_POR_SEGUNDO else 0
+        inicio = time.perf_counter()
+        cursor.execute(sql, *(() if ultima is None else (ultima,)))
+        colunas = [descricao[0] for descricao in cursor.description]
+        linhas = cursor.fetchall()
+        duracao = time.perf_counter() - inicio
+        leituras = _leituras_sessao(cursor) - leituras_antes if LEITURAS_POR_SEGUNDO else 0
+        if not linhas:
+            break
+        paginas.extend(tuple(linha) for linha in linhas)
+        ultima = linhas[-1][colunas.index(chave)]
+        tamanho_pedido = controle.tamanho_lote
+        controle.registrar_lote(len(linhas), duracao, leituras)
+        if len(linhas) < tamanho_pedido:
+            break
+        controle.esperar()
+    return paginas, colunas
+
+def extrair_consistente(exportacoes):
+    """
+    Executa as consultas das exportações pendentes em uma única transação, em lotes
+    controlados, e guarda cada resultado no snapshot da execução (run_journal), de onde
+    a exportação normal os lê em seguida. Exportações já consultadas são mantidas.
+    """
+    import export_spreadsheets
+
+    pendentes = [e for e in exportacoes if not run_journal.estagio_concluido(e['tipo_arquivo'], 'consulta')]
+    if len(pendentes) < len(exportacoes) and pendentes:
+        print("Aviso: parte das consultas vem da execução interrompida; elas não leem o mesmo snapshot das demais")
+    if not pendentes:
+        return
+
+    print(f"Extração de baixo impacto ({ISOLAMENTO}, lotes de até {LINHAS_POR_LOTE} linhas) de {', '.join(e['titulo'] for e in pendentes)}")
+    with export_spreadsheets.get_connection() as conexao:
+        conexao.autocommit = False
+        cursor = conexao.cursor()
+        try:
+            _iniciar_transacao(conexao, cursor)
+            for exportacao in pendentes:
+                controle = ControleVazao()
+                linhas, colunas = consultar_em_lotes(cursor, exportacao['consulta'], exportacao['chave'], controle)
+                # coerce_float como o pd.read_sql de query_to_df: Decimal só nas consultas tipadas
+                df = pd.DataFrame.from_records(linhas, columns=colunas, coerce_float=not exportacao['tipado'])
+                if exportacao['tipado']:
+                    df = financial_schema.aplicar_esquema(df)
+                run_journal.salvar_snapshot(exportacao['tipo_arquivo'], df)
+                duracao = time.perf_counter() - controle.inicio
+                print(f"{exportacao['titulo']}: {len(df)} linhas em {duracao:.1f}s "
+                      f"({controle.recuos} recuos, {controle.tempo_pausado:.1f}s em pausa)")
+                run_report.registrar('extracao_baixo_impacto', exportacao['tipo_arquivo'], {
+                    'isolamento': ISOLAMENTO, 'linhas': len(df), 'duracao_segundos': round(duracao, 3),
+                    'leituras_logicas': controle.leituras, 'recuos': controle.recuos,
+                    'tempo_pausado_segundos': round(controle.tempo_pausado, 3),
+                })
+            conexao.commit()
+        except BaseException:
+            conexao.rollback()
+            raise
@@ -0,0 +1,207 @@
+import os
+import io
+import gzip
+import lazy_imports
+import financial_schema
+import run_journal
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Formato de saída por entidade e por artefato:
+#   exportacao - resultado da consulta em exported_data, lido pelos divisores (xlsx ou csv)
+#                (em csv o índice de partições lê cada partição por seek; em xlsx a planilha
+#                ainda é percorrida do início até a última linha pedida)
+#   completo   - arquivo único com todos os registros tratados
+#   partes     - arquivos divididos por tamanho/período
+#   relatorios - relatórios de erro do motor de validação
+# Formatos compactos (csv, csv.gz, parquet) podem ser usados onde o destino
+# aceitar; xlsx só onde a importação exige planilha.
+FORMATOS_SAIDA = {
+    'contas_pagar': {'exportacao': 'xlsx', 'completo': 'xlsx', 'partes': 'xlsx', 'relatorios': 'csv'},
+    'contas_receber': {'exportacao': 'xlsx', 'completo': 'xlsx', 'partes': 'xlsx', 'relatorios': 'xlsx'},
+    'contatos': {'exportacao': 'xlsx', 'completo': 'csv', 'partes': 'csv', 'relatorios': 'csv', 'partes_modelo': 'xlsx'},
+}
+
+# Nome (sem extensão) do arquivo exportado de cada entidade
+NOMES_EXPORTACAO = {'contas_pagar': 'contas_a_pagar', 'contas_receber': 'contas_a_receber', 'contatos': 'contatos'}
+
+FORMATO_PADRAO = 'csv'
+
+# Linhas usadas para estimar o tamanho de formatos caros de serializar (xlsx, parquet)
+LINHAS_AMOSTRA_ESTIMATIVA = 2000
+
+class SaidaCSV:
+    """CSV com BOM (utf-8-sig), gravado em lotes sobre um único arquivo aberto"""
+    extensao = 'csv'
+
+    def __init__(self, destino):
+        # destino pode ser um caminho ou um buffer binário (usado nas estimativas de tamanho)
+        self.buffer_externo = not isinstance(destino, str)
+        self.arquivo = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='') if self.buffer_externo \
+            else open(destino, 'w', encoding='utf-8-sig', newline='')
+        self.cabecalho_escrito = False
+
+    def anexar(self, df):
+        df.to_csv(self.arquivo, index=False, header=not self.cabecalho_escrito)
+        self.cabecalho_escrito = True
+
+    def fechar(self):
+        if self.buffer_externo:
+            # Não fecha o buffer do chamador
+            self.arquivo.flush()
+            self.arquivo.detach()
+        else:
+            self.arquivo.close()
+
+class SaidaCSVCompactado(SaidaCSV):
+    """CSV compactado com gzip, lido diretamente por pandas e pela maioria dos importadores"""
+    extensao = 'csv.gz'
+
+    def __init__(self, destino):
+        self.compactado = gzip.open(destino, 'wb') if isinstance(destino, str) else gzip.GzipFile(fileobj=destino, mode='wb')
+        self.arquivo = io.TextIOWrapper(self.compactado, encoding='utf-8-sig', newline='')
+        self.cabecalho_escrito = False
+
+    def fechar(self):
+        self.arquivo.close()
+
+class SaidaXlsx:
+    """
+    Planilha xlsx gravada em modo streaming (openpyxl write_only): as linhas
+    vão direto para o arquivo, sem montar a planilha inteira em memória.
+    """
+    extensao = 'xlsx'
+
+    def __init__(self, destino):
+        from openpyxl import Workbook
+
+        self.destino = destino
+        self.planilha = Workbook(write_only=True)
+        self.aba = self.planilha.create_sheet('Sheet1')
+        self.cabecalho_escrito = False
+
+    def anexar(self, df):
+        if not self.cabecalho_escrito:
+            self.aba.append([str(coluna) for coluna in df.columns])
+            self.cabecalho_escrito = True
+        valores = df.astype(object).where(df.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            self.aba.append(linha)
+
+    def fechar(self):
+        self.planilha.save(self.destino)
+
+class SaidaParquet:
+    """Parquet gravado em row groups sucessivos (requer pyarrow)"""
+    extensao = 'parquet'
+
+    def __init__(self, destino):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("O formato parquet requer o pacote pyarrow (pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.destino = destino
+        self.escritor = None
+        self.esquema = None
+
+    def anexar(self, df):
+        tabela = self.pa.Table.from_pandas(df, schema=self.esquema, preserve_index=False)
+        if self.escritor is None:
+            self.esquema = tabela.schema
+            self.escritor = self.pq.ParquetWriter(self.destino, self.esquema)
+        self.escritor.write_table(tabela)
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+
+ESCRITORES = {
+    'csv': SaidaCSV,
+    'csv.gz': SaidaCSVCompactado,
+    'xlsx': SaidaXlsx,
+    'parquet': SaidaParquet,
+}
+
+def formato_saida(entidade, artefato):
+    """Formato configurado para o artefato da entidade"""
+    return FORMATOS_SAIDA.get(entidade, {}).get(artefato, FORMATO_PADRAO)
+
+def extensao(formato):
+    return obter_escritor(formato).extensao
+
+def obter_escritor(formato):
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato de saída desconhecido: {formato} (disponíveis: {', '.join(ESCRITORES)})")
+    return ESCRITORES[formato]
+
+def nome_arquivo(nome_base, formato):
+    return f"{nome_base}.{extensao(formato)}"
+
+def arquivo_exportacao(entidade):
+    """Nome do arquivo exportado da entidade, com a extensão do formato configurado"""
+    return nome_arquivo(NOMES_EXPORTACAO[entidade], formato_saida(entidade, 'exportacao'))
+
+def ler(caminho):
+    """Lê um arquivo gravado por este módulo, pelo formato da extensão"""
+    if caminho.endswith('.xlsx'):
+        return pd.read_excel(caminho)
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_csv(caminho, encoding='utf-8-sig')
+
+def abrir(destino, formato):
+    """Abre uma saída em lotes: chame anexar(df) quantas vezes for preciso e depois fechar()"""
+    return obter_escritor(formato)(destino)
+
+def gravar(df, destino, formato):
+    """
+    Grava o DataFrame inteiro no formato pedido (valores monetários e categóricas
+    materializados). Arquivos são gravados com outro nome e renomeados no fim, e
+    ficam no jornal da execução; na retomada, partes já gravadas não são refeitas.
+    """
+    if not isinstance(destino, str):
+        saida = abrir(destino, formato)
+        try:
+            saida.anexar(financial_schema.materializar(df))
+        finally:
+            saida.fechar()
+        return None
+
+    tamanho = run_journal.parte_concluida(destino)
+    if tamanho is not None:
+        print(f"Parte já gravada em execução anterior, mantida: {destino}")
+        return tamanho
+
+    temporario = destino + '.tmp'
+    saida = abrir(temporario, formato)
+    try:
+        saida.anexar(financial_schema.materializar(df))
+    finally:
+        saida.fechar()
+    os.replace(temporario, destino)
+    tamanho = os.path.getsize(destino)
+    run_journal.registrar_parte(destino, tamanho)
+    return tamanho
+
+def tamanho_serializado(df, formato):
+    """Bytes exatos do DataFrame no formato pedido, serializado em memória"""
+    buffer = io.BytesIO()
+    saida = abrir(buffer, formato)
+    saida.anexar(financial_schema.materializar(df))
+    saida.fechar()
+    return len(buffer.getvalue())
+
+def estimar_tamanho(df, formato):
+    """
+    Tamanho estimado do DataFrame no formato pedido. CSV é medido por inteiro;
+    nos formatos compactados/caros (xlsx, parquet, csv.gz) mede-se uma amostra
+    espaçada de linhas e o resultado é extrapolado.
+    """
+    if formato == 'csv' or len(df) <= LINHAS_AMOSTRA_ESTIMATIVA:
+        return tamanho_serializado(df, formato)
+    passo = len(df) / LINHAS_AMOSTRA_ESTIMATIVA
+    amostra = df.iloc[[int(i * passo) for i in range(LINHAS_AMOSTRA_ESTIMATIVA)]]
+    return int(tamanho_serializado(amostra, formato) * len(df) / len(amostra))
@@ -0,0 +1,69 @@
+import os
+import json
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Junta partições pequenas e adjacentes (meses, semanas, dias) em partes compartilhadas
+# de até o tamanho máximo, em vez de um arquivo quase vazio por partição
+EMPACOTAR_PARTICOES = False
+
+SUFIXO_MANIFESTO = '_manifesto.json'
+
+def empacotar(grupos, capacidade):
+    """
+    Junta grupos adjacentes, na ordem recebida, em pacotes de até `capacidade`.
+    Cada grupo é um dict com 'rotulo', 'data' e 'tamanho' (bytes ou linhas, na
+    mesma unidade da capacidade); um grupo maior que a capacidade fica sozinho.
+    Gera pacotes com 'rotulos', 'faixas' (linhas de cada rótulo), 'data' e 'tamanho'.
+    Os grupos são consumidos aos poucos, então podem vir de um gerador.
+    """
+    atual = []
+    for grupo in grupos:
+        if atual and sum(g['tamanho'] for g in atual) + grupo['tamanho'] > capacidade:
+            yield _fechar_pacote(atual)
+            atual = []
+        atual.append(grupo)
+        if grupo['tamanho'] > capacidade:
+            yield _fechar_pacote(atual)
+            atual = []
+    if atual:
+        yield _fechar_pacote(atual)
+
+def _fechar_pacote(grupos):
+    faixas = []
+    inicio = 0
+    for grupo in grupos:
+        faixas.append({'rotulo': grupo['rotulo'], 'linha_inicio': inicio, 'linha_fim': inicio + len(grupo['data'])})
+        inicio += len(grupo['data'])
+    return {
+        'rotulos': [grupo['rotulo'] for grupo in grupos],
+        'faixas': faixas,
+        'data': grupos[0]['data'] if len(grupos) == 1 else pd.concat([grupo['data'] for grupo in grupos]),
+        'tamanho': sum(grupo['tamanho'] for grupo in grupos),
+    }
+
+def rotulo_pacote(rotulos):
+    return rotulos[0] if len(rotulos) == 1 else f"{rotulos[0]}_a_{rotulos[-1]}"
+
+def carregar_manifesto(diretorio, prefixo):
+    caminho = os.path.join(diretorio, prefixo + SUFIXO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {'arquivos': {}}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def salvar_manifesto(diretorio, prefixo, arquivos, atualizar=False):
+    """
+    Grava <prefixo>_manifesto.json com as partições (rótulo e intervalo de linhas)
+    contidas em cada arquivo gerado. `arquivos` mapeia nome do arquivo -> faixas;
+    com atualizar=True as entradas são acrescentadas ao manifesto existente.
+    """
+    caminho = os.path.join(diretorio, prefixo + SUFIXO_MANIFESTO)
+    if atualizar:
+        arquivos = dict(carregar_manifesto(diretorio, prefixo)['arquivos'], **arquivos)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({'arquivos': arquivos}, arquivo, ensure_ascii=False, indent=1)
+    os.replace(temporario, caminho)
+    return caminho
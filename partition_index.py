@@ -0,0 +1,177 @@
+import os
+import io
+import json
+import mmap
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Sufixo do arquivo de índice gravado ao lado de cada artefato exportado
+SUFIXO_INDICE = '.indice.json'
+
+SEM_DATA = 'sem_data'
+
+def caminho_indice(caminho_artefato):
+    return caminho_artefato + SUFIXO_INDICE
+
+def _primeira_coluna(df, alternativas):
+    for coluna in alternativas:
+        if coluna in df.columns:
+            return coluna
+    return None
+
+def ordenar_por_particao(df):
+    """
+    Ordena o DataFrame por (Estabelecimento_id, mês de vencimento, data de emissão)
+    para que cada partição ocupe um intervalo contínuo de linhas no artefato.
+    Retorna o DataFrame ordenado e as chaves de partição alinhadas a ele.
+    """
+    coluna_emissao = _primeira_coluna(df, ['Data emissao', 'Data Emissao'])
+    vencimento = pd.to_datetime(df['Data vencimento'], errors='coerce', dayfirst=True)
+    chaves = pd.DataFrame({
+        'estabelecimento_id': pd.to_numeric(df['Estabelecimento_id'], errors='coerce'),
+        'mes': vencimento.dt.strftime('%Y-%m').fillna(SEM_DATA),
+        'emissao': pd.to_datetime(df[coluna_emissao], errors='coerce', dayfirst=True) if coluna_emissao else pd.NaT,
+    }, index=df.index)
+
+    ordem = chaves.sort_values(['estabelecimento_id', 'mes', 'emissao'], kind='stable', na_position='last').index
+    return df.loc[ordem].reset_index(drop=True), chaves.loc[ordem].reset_index(drop=True)
+
+def gerar_indice(chaves):
+    """
+    Agrupa linhas consecutivas com a mesma (estabelecimento, mês) em intervalos
+    [linha_inicio, linha_fim) contados a partir da primeira linha de dados.
+    """
+    if len(chaves) == 0:
+        return []
+
+    chave = chaves[['estabelecimento_id', 'mes']].astype(str)
+    mudou = (chave != chave.shift()).any(axis=1)
+    grupo = mudou.cumsum()
+    linhas = pd.Series(range(len(chaves)), index=chaves.index)
+
+    agregado = pd.DataFrame({
+        'estabelecimento_id': chaves['estabelecimento_id'],
+        'mes': chaves['mes'],
+        'linha': linhas,
+        'emissao': chaves['emissao'],
+    }).groupby(grupo, sort=False).agg(
+        estabelecimento_id=('estabelecimento_id', 'first'),
+        mes=('mes', 'first'),
+        linha_inicio=('linha', 'min'),
+        linha_fim=('linha', 'max'),
+        emissao_min=('emissao', 'min'),
+        emissao_max=('emissao', 'max'),
+    )
+
+    particoes = []
+    for registro in agregado.itertuples(index=False):
+        particoes.append({
+            'estabelecimento_id': None if pd.isna(registro.estabelecimento_id) else int(registro.estabelecimento_id),
+            'mes': registro.mes,
+            'linha_inicio': int(registro.linha_inicio),
+            'linha_fim': int(registro.linha_fim) + 1,
+            'emissao_min': None if pd.isna(registro.emissao_min) else registro.emissao_min.strftime('%Y-%m-%d'),
+            'emissao_max': None if pd.isna(registro.emissao_max) else registro.emissao_max.strftime('%Y-%m-%d'),
+        })
+    return particoes
+
+def _adicionar_deslocamentos(caminho_csv, particoes):
+    """Acrescenta deslocamentos em bytes às partições de um artefato CSV"""
+    import csv_chunker
+
+    with open(caminho_csv, 'rb') as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        bom = len(csv_chunker.BOM_UTF8) if mapa[:len(csv_chunker.BOM_UTF8)] == csv_chunker.BOM_UTF8 else 0
+        fins = csv_chunker.indexar_registros(mapa, bom)
+
+    # fins[0] é o fim do cabeçalho; a linha de dados i termina em fins[i + 1]
+    for particao in particoes:
+        particao['byte_inicio'] = int(fins[particao['linha_inicio']])
+        particao['byte_fim'] = int(fins[particao['linha_fim']])
+    return int(fins[0])
+
+def salvar_indice(caminho_artefato, chaves):
+    """Grava o índice de partições ao lado do artefato exportado"""
+    particoes = gerar_indice(chaves)
+    indice = {
+        'artefato': os.path.basename(caminho_artefato),
+        'tamanho': os.path.getsize(caminho_artefato),
+        'modificado_em': os.path.getmtime(caminho_artefato),
+        'total_linhas': len(chaves),
+        'particoes': particoes,
+    }
+    if caminho_artefato.endswith('.csv'):
+        indice['byte_fim_cabecalho'] = _adicionar_deslocamentos(caminho_artefato, particoes)
+
+    temporario = caminho_indice(caminho_artefato) + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(indice, arquivo, ensure_ascii=False)
+    os.replace(temporario, caminho_indice(caminho_artefato))
+    return indice
+
+def carregar_indice(caminho_artefato):
+    """Lê o índice do artefato; retorna None se não existir ou estiver desatualizado"""
+    caminho = caminho_indice(caminho_artefato)
+    if not os.path.exists(caminho) or not os.path.exists(caminho_artefato):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        indice = json.load(arquivo)
+    if indice.get('tamanho') != os.path.getsize(caminho_artefato) or \
+            indice.get('modificado_em') != os.path.getmtime(caminho_artefato):
+        return None
+    return indice
+
+def _mes_corresponde(mes_particao, mes):
+    if mes is None:
+        return True
+    if isinstance(mes, int):
+        return mes_particao != SEM_DATA and int(mes_particao[5:7]) == mes
+    return mes_particao == mes
+
+def selecionar_particoes(indice, estabelecimento_id=None, mes=None):
+    """
+    Partições do índice que atendem ao filtro. `mes` pode ser 'AAAA-MM',
+    'sem_data' ou o número do mês (1-12, todos os anos, como nos divisores).
+    """
+    return [
+        particao for particao in indice['particoes']
+        if (estabelecimento_id is None or particao['estabelecimento_id'] == estabelecimento_id)
+        and _mes_corresponde(particao['mes'], mes)
+    ]
+
+def ler_particao(caminho_artefato, estabelecimento_id=None, mes=None):
+    """
+    Lê apenas as linhas das partições pedidas usando o índice do artefato.
+    Em CSV faz seek direto nos bytes de cada partição. O xlsx não tem deslocamentos:
+    todas as partições saem de uma única leitura da planilha, que para na última linha
+    pedida, mas o openpyxl percorre (e o pandas guarda) todas as linhas até lá; o custo
+    cresce com a posição e a dispersão das partições no arquivo, por isso exportações
+    grandes devem usar 'exportacao': 'csv' em output_writers.FORMATOS_SAIDA.
+    Retorna None quando não há índice válido (o chamador deve ler o arquivo inteiro).
+    """
+    indice = carregar_indice(caminho_artefato)
+    if indice is None:
+        return None
+
+    particoes = selecionar_particoes(indice, estabelecimento_id, mes)
+    eh_csv = caminho_artefato.endswith('.csv')
+    if not particoes:
+        return pd.read_csv(caminho_artefato, nrows=0) if eh_csv else pd.read_excel(caminho_artefato, nrows=0)
+
+    partes = []
+    if eh_csv:
+        with open(caminho_artefato, 'rb') as arquivo:
+            cabecalho = arquivo.read(indice['byte_fim_cabecalho'])
+            for particao in particoes:
+                arquivo.seek(particao['byte_inicio'])
+                dados = arquivo.read(particao['byte_fim'] - particao['byte_inicio'])
+                partes.append(pd.read_csv(io.BytesIO(cabecalho + dados), encoding='utf-8-sig'))
+    else:
+        # Uma leitura só, do início da primeira partição pedida ao fim da última (em ordem de
+        # arquivo); as partições são recortadas do bloco em memória
+        inicio = particoes[0]['linha_inicio']
+        bloco = pd.read_excel(caminho_artefato, skiprows=range(1, inicio + 1),
+                              nrows=particoes[-1]['linha_fim'] - inicio)
+        partes = [bloco.iloc[particao['linha_inicio'] - inicio:particao['linha_fim'] - inicio] for particao in particoes]
+
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+import hashlib
+import lazy_imports
+import run_report
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Captura estatísticas de cada consulta executada por query_to_df: no SQL Server,
+# STATISTICS IO/TIME e o plano real (XML); em um substituto local (SQLite/DuckDB), o EXPLAIN.
+# Ficam na seção 'consultas' do relatório da execução, pela impressão digital da consulta.
+CAPTURAR_ESTATISTICAS = False
+
+# Planos XML gravados ao lado do relatório (um arquivo por impressão digital)
+DIRETORIO_PLANOS = os.path.join('exported_data', 'planos')
+
+# Aumento (vezes) de leituras lógicas ou de tempo considerado regressão na comparação
+LIMIAR_REGRESSAO = 1.5
+
+def normalizar(sql):
+    """SQL sem comentários, literais nem espaços extras: igual entre execuções e entre clientes"""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)  # IN (2,5) e IN (1) dão o mesmo texto
+    return re.sub(r'\s+', ' ', sql).strip().lower()
+
+def impressao_digital(sql):
+    return hashlib.sha1(normalizar(sql).encode('utf-8')).hexdigest()[:16]
+
+def _tipo_banco(conexao):
+    modulo = type(conexao).__module__.split('.')[0]
+    return {'sqlite3': 'sqlite', '_duckdb': 'duckdb', 'duckdb': 'duckdb'}.get(modulo, 'sqlserver')
+
+def _ler_estatisticas_io(mensagens):
+    """Leituras por tabela das mensagens do SET STATISTICS IO"""
+    tabelas = {}
+    for mensagem in mensagens:
+        for tabela, detalhes in re.findall(r"Table '([^']+)'\. (.*?)(?=Table '|$)", mensagem, re.DOTALL):
+            contadores = {nome.strip().lower().replace(' ', '_').replace('-', '_'): int(valor)
+                          for nome, valor in re.findall(r'([a-zA-Z \-]+?) (\d+)', detalhes)}
+            atual = tabelas.setdefault(tabela, {})
+            for nome, valor in contadores.items():
+                atual[nome] = atual.get(nome, 0) + valor
+    return tabelas
+
+def _ler_estatisticas_tempo(mensagens):
+    """CPU e tempo decorrido (ms) das mensagens do SET STATISTICS TIME, somados"""
+    tempos = {'cpu_ms': 0, 'decorrido_ms': 0, 'compilacao_cpu_ms': 0}
+    for mensagem in mensagens:
+        for cpu, decorrido in re.findall(r'SQL Server Execution Times:\s*CPU time = (\d+) ms,\s*elapsed time = (\d+) ms', mensagem):
+            tempos['cpu_ms'] += int(cpu)
+            tempos['decorrido_ms'] += int(decorrido)
+        for cpu in re.findall(r'SQL Server parse and compile time:\s*CPU time = (\d+) ms', mensagem):
+            tempos['compilacao_cpu_ms'] += int(cpu)
+    return tempos
+
+def forma_plano(plano):
+    """Sequência de operadores do plano (XML ou EXPLAIN), para detectar mudança de plano"""
+    operadores = re.findall(r'PhysicalOp="([^"]+)"', plano) if plano.lstrip().startswith('<') else \
+        [re.sub(r'\d+', '?', linha.strip()) for linha in plano.splitlines() if linha.strip()]
+    return hashlib.sha1('|'.join(operadores).encode('utf-8')).hexdigest()[:16]
+
+def _mensagens(cursor):
+    return [texto for _, texto in getattr(cursor, 'messages', None) or []]
+
+def _executar_sqlserver(conexao, sql):
+    cursor = conexao.cursor()
+    cursor.execute("SET STATISTICS IO ON; SET STATISTICS TIME ON; SET STATISTICS XML ON;")
+    try:
+        cursor.execute(sql)
+        mensagens = _mensagens(cursor)
+        colunas = [descricao[0] for descricao in cursor.description]
+        linhas = cursor.fetchall()
+        planos = []
+        # Depois do resultado vem o plano real, um conjunto de resultados de uma coluna com o XML
+        while cursor.nextset():
+            mensagens += _mensagens(cursor)
+            if cursor.description:
+                planos += [linha[0] for linha in cursor.fetchall()]
+        estatisticas = {'io': _ler_estatisticas_io(mensagens), 'tempo': _ler_estatisticas_tempo(mensagens)}
+        return colunas, linhas, estatisticas, '\n'.join(planos)
+    finally:
+        cursor.execute("SET STATISTICS XML OFF; SET STATISTICS IO OFF; SET STATISTICS TIME OFF;")
+
+def _executar_local(conexao, sql, tipo_banco):
+    cursor = conexao.cursor()
+    explicar = 'EXPLAIN QUERY PLAN ' if tipo_banco == 'sqlite' else 'EXPLAIN '
+    cursor.execute(explicar + sql)
+    plano = '\n'.join(' '.join(str(valor) for valor in linha) for linha in cursor.fetchall())
+    cursor.execute(sql)
+    colunas = [descricao[0] for descricao in cursor.description]
+    return colunas, cursor.fetchall(), {}, plano
+
+def _gravar_plano(digital, plano, tipo_banco):
+    os.makedirs(DIRETORIO_PLANOS, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_PLANOS, f"{digital}.{'sqlplan' if tipo_banco == 'sqlserver' else 'txt'}")
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(plano)
+    return caminho
+
+def executar_com_estatisticas(conexao, sql, coerce_float=True):
+    """
+    Executa a consulta na conexão e devolve o DataFrame (como pd.read_sql), registrando
+    no relatório da execução as estatísticas e o plano, pela impressão digital do SQL.
+    """
+    tipo_banco = _tipo_banco(conexao)
+    digital = impressao_digital(sql)
+    inicio = time.perf_counter()
+    if tipo_banco == 'sqlserver':
+        colunas, linhas, estatisticas, plano = _executar_sqlserver(conexao, sql)
+    else:
+        colunas, linhas, estatisticas, plano = _executar_local(conexao, sql, tipo_banco)
+    duracao = time.perf_counter() - inicio
+    df = pd.DataFrame.from_records([tuple(linha) for linha in linhas], columns=colunas, coerce_float=coerce_float)
+
+    anterior = run_report.obter('consultas').get(digital, {})
+    run_report.registrar('consultas', digital, {
+        'sql': normalizar(sql),
+        'banco': tipo_banco,
+        'execucoes': anterior.get('execucoes', 0) + 1,
+        'duracao_segundos': round(duracao, 3),
+        'linhas': len(df),
+        **estatisticas,
+        'forma_plano': forma_plano(plano) if plano else None,
+        'plano': _gravar_plano(digital, plano, tipo_banco) if plano else None,
+    })
+    print(f"Consulta {digital}: {len(df)} linhas em {duracao:.2f}s")
+    return df
+
+def _leituras_logicas(consulta):
+    return sum(tabela.get('logical_reads', 0) for tabela in consulta.get('io', {}).values())
+
+def comparar(relatorio_base, relatorio_novo):
+    """Regressões entre dois relatórios (execuções ou clientes): plano diferente, mais leituras ou mais tempo"""
+    base, novo = relatorio_base.get('consultas', {}), relatorio_novo.get('consultas', {})
+    regressoes = []
+    for digital in sorted(set(base) & set(novo)):
+        antes, depois = base[digital], novo[digital]
+        motivos = []
+        if antes.get('forma_plano') and depois.get('forma_plano') and antes['forma_plano'] != depois['forma_plano']:
+            motivos.append("plano mudou")
+        if _leituras_logicas(depois) > LIMIAR_REGRESSAO * max(1, _leituras_logicas(antes)):
+            motivos.append(f"leituras lógicas {_leituras_logicas(antes)} -> {_leituras_logicas(depois)}")
+        if depois['duracao_segundos'] > LIMIAR_REGRESSAO * max(0.001, antes['duracao_segundos']):
+            motivos.append(f"tempo {antes['duracao_segundos']}s -> {depois['duracao_segundos']}s")
+        if motivos:
+            regressoes.append({'consulta': digital, 'sql': depois['sql'][:80], 'motivos': motivos})
+    return regressoes
+
+if __name__ == "__main__":
+    # Uso: python query_stats.py <relatorio_base.json> <relatorio_novo.json>
+    if len(sys.argv) < 3:
+        print("Uso: python query_stats.py <relatorio_base.json> <relatorio_novo.json>")
+        sys.exit(1)
+    regressoes = comparar(run_report.carregar(sys.argv[1]), run_report.carregar(sys.argv[2]))
+    for regressao in regressoes:
+        print(f"{regressao['consulta']} ({regressao['sql']}...): {'; '.join(regressao['motivos'])}")
+    print(f"{len(regressoes)} consultas com regressão")
+    sys.exit(1 if regressoes else 0)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+import lazy_imports
+import run_report
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Cache local dos resultados de query_to_df, para repetir a exportação (ajustando a divisão)
+# sem repetir as consultas. A chave é o SQL normalizado mais um token de mudança das tabelas
+# de origem: com as tabelas iguais, o resultado vem do disco sem consultar o banco.
+USAR_CACHE = False
+
+DIRETORIO_CACHE = os.path.join('exported_data', '.cache')
+ARQUIVO_INDICE = 'indice.json'
+
+# Tamanho máximo do cache; acima dele saem os resultados usados há mais tempo (LRU)
+TAMANHO_MAXIMO_MB = 2048
+
+# Token de mudança de cada tabela da consulta:
+#   'checksum' - COUNT_BIG(*) e CHECKSUM_AGG(BINARY_CHECKSUM(*)): percebe alterações, lê a tabela inteira
+#   'contagem' - COUNT_BIG(*) e MAX da chave primária: só percebe inclusões e exclusões, lê só o índice
+TOKEN_MUDANCA = 'checksum'
+
+_trava = threading.Lock()
+
+# Token de cada tabela já lido na execução ({(banco, TOKEN_MUDANCA, tabela): token}): as consultas da exportação
+# compartilham tabelas e cada uma é lida uma vez por execução (iniciar_execucao zera)
+_tokens = {}
+_trava_tokens = threading.Lock()
+
+def iniciar_execucao():
+    """Descarta os tokens da execução anterior; as tabelas são lidas de novo na primeira consulta"""
+    with _trava_tokens:
+        _tokens.clear()
+
+def normalizar(sql):
+    """SQL sem comentários nem espaços extras; os literais (estabelecimentos, tipos) continuam na chave"""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+def tabelas_da_consulta(sql):
+    import index_advisor
+    return sorted({tabela for bloco in index_advisor.analisar_consulta(sql) for tabela in bloco['apelidos'].values()})
+
+def _consulta_token(tabela, esquema):
+    if TOKEN_MUDANCA == 'checksum':
+        return f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM [dbo].[{tabela}]"
+    chave = esquema.get(tabela, {}).get('chave')
+    maximo = f"MAX([{chave[0]}])" if chave else "NULL"
+    return f"SELECT COUNT_BIG(*), {maximo} FROM [dbo].[{tabela}]"
+
+def token_mudanca(conexao, sql, banco=None):
+    """
+    Estado das tabelas de origem da consulta ({tabela: [linhas, checksum ou maior chave]}).
+    Cada tabela é lida uma vez por execução; as consultas seguintes reaproveitam o token.
+    """
+    import subset_extractor
+    esquema = subset_extractor.carregar_esquema() if TOKEN_MUDANCA == 'contagem' else {}
+    cursor = conexao.cursor()
+    token = {}
+    # A trava fica durante a leitura: consultas simultâneas esperam o token em vez de ler a tabela de novo
+    with _trava_tokens:
+        for tabela in tabelas_da_consulta(sql):
+            if (banco, TOKEN_MUDANCA, tabela) not in _tokens:
+                cursor.execute(_consulta_token(tabela, esquema))
+                _tokens[(banco, TOKEN_MUDANCA, tabela)] = [str(valor) for valor in cursor.fetchone()]
+            token[tabela] = _tokens[(banco, TOKEN_MUDANCA, tabela)]
+    return token
+
+def chave(banco, sql, tipado, token):
+    """Identifica o resultado: banco, SQL normalizado, tipagem e o token de mudança das tabelas"""
+    conteudo = json.dumps([banco, normalizar(sql), bool(tipado), TOKEN_MUDANCA, token], sort_keys=True)
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+def _formato():
+    try:
+        import pyarrow
+        return 'parquet'
+    except ImportError:
+        return 'pkl'
+
+def _caminho_indice():
+    return os.path.join(DIRETORIO_CACHE, ARQUIVO_INDICE)
+
+def _ler_indice():
+    try:
+        with open(_caminho_indice(), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _gravar_indice(indice):
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    temporario = _caminho_indice() + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(indice, arquivo, indent=1)
+    os.replace(temporario, _caminho_indice())
+
+def carregar(chave_resultado):
+    """DataFrame guardado para a chave ou None; um acerto renova o uso da entrada"""
+    with _trava:
+        indice = _ler_indice()
+        entrada = indice.get(chave_resultado)
+        if entrada is None:
+            return None
+        caminho = os.path.join(DIRETORIO_CACHE, entrada['arquivo'])
+        if not os.path.exists(caminho):
+            del indice[chave_resultado]
+            _gravar_indice(indice)
+            return None
+        entrada['usado_em'] = time.time()
+        _gravar_indice(indice)
+    return pd.read_parquet(caminho) if caminho.endswith('.parquet') else pd.read_pickle(caminho)
+
+def _remover_excedente(indice, manter):
+    """Remove as entradas usadas há mais tempo (menos `manter`) até o cache caber em TAMANHO_MAXIMO_MB"""
+    limite = TAMANHO_MAXIMO_MB * 1024 * 1024
+    total = sum(entrada['tamanho'] for entrada in indice.values())
+    for chave_antiga, entrada in sorted(indice.items(), key=lambda item: item[1]['usado_em']):
+        if total <= limite:
+            break
+        if chave_antiga == manter:
+            continue
+        try:
+            os.remove(os.path.join(DIRETORIO_CACHE, entrada['arquivo']))
+        except FileNotFoundError:
+            pass
+        total -= entrada['tamanho']
+        del indice[chave_antiga]
+
+def guardar(chave_resultado, df, sql=None):
+    formato = _formato()
+    arquivo = f'{chave_resultado}.{formato}'
+    caminho = os.path.join(DIRETORIO_CACHE, arquivo)
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    temporario = caminho + '.tmp'
+    if formato == 'parquet':
+        df.to_parquet(temporario, index=False)
+    else:
+        df.to_pickle(temporario)
+    os.replace(temporario, caminho)
+    with _trava:
+        indice = _ler_indice()
+        indice[chave_resultado] = {
+            'arquivo': arquivo, 'tamanho': os.path.getsize(caminho), 'linhas': len(df),
+            'consulta': normalizar(sql)[:120] if sql else None,
+            'criado_em': time.time(), 'usado_em': time.time(),
+        }
+        _remover_excedente(indice, chave_resultado)
+        _gravar_indice(indice)
+
+def consultar(conexao, banco, sql, tipado, executar):
+    """
+    Resultado da consulta pelo cache quando as tabelas de origem não mudaram; senão
+    `executar()` consulta o banco e o resultado é guardado para a próxima execução.
+    """
+    inicio = time.perf_counter()
+    token = token_mudanca(conexao, sql, banco)
+    chave_resultado = chave(banco, sql, tipado, token)
+    df = carregar(chave_resultado)
+    if df is not None:
+        print(f"Resultado da consulta vindo do cache ({len(df)} linhas, tabelas sem alteração)")
+        run_report.registrar('cache', chave_resultado[:16], {'acerto': True, 'linhas': len(df),
+                                                              'duracao_segundos': round(time.perf_counter() - inicio, 3)})
+        return df
+    df = executar()
+    guardar(chave_resultado, df, sql)
+    run_report.registrar('cache', chave_resultado[:16], {'acerto': False, 'linhas': len(df),
+                                                          'duracao_segundos': round(time.perf_counter() - inicio, 3)})
+    return df
+
+def limpar():
+    with _trava:
+        indice = _ler_indice()
+        for entrada in indice.values():
+            try:
+                os.remove(os.path.join(DIRETORIO_CACHE, entrada['arquivo']))
+            except FileNotFoundError:
+                pass
+        _gravar_indice({})
+    return len(indice)
+
+if __name__ == "__main__":
+    # Uso: python result_cache.py [--limpar]
+    if '--limpar' in sys.argv:
+        print(f"{limpar()} resultados removidos do cache")
+        sys.exit(0)
+    indice = _ler_indice()
+    for entrada in sorted(indice.values(), key=lambda entrada: entrada['usado_em'], reverse=True):
+        print(f"{entrada['arquivo']}: {entrada['linhas']} linhas, {entrada['tamanho'] / 1024 / 1024:.1f} MB - {entrada['consulta']}")
+    print(f"{len(indice)} resultados, {sum(entrada['tamanho'] for entrada in indice.values()) / 1024 / 1024:.1f} MB")
@@ -0,0 +1,237 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Diretório dos pontos de retomada, dentro do OUTPUT_DIR da exportação
+# (None = <export_spreadsheets.OUTPUT_DIR>/.checkpoint, resolvido ao abrir o jornal)
+DIRETORIO_CHECKPOINT = None
+NOME_DIRETORIO_CHECKPOINT = '.checkpoint'
+
+ARQUIVO_JORNAL = 'execucao.json'
+
+# Partes gravadas, uma linha JSON por parte acrescentada ao fim do arquivo: registrar uma
+# parte não reescreve o jornal (que guarda só os estágios e cresceria com cada parte)
+ARQUIVO_PARTES = 'partes.jsonl'
+
+# Estágios de cada entidade, na ordem em que são concluídos:
+#   consulta  - resultado da consulta salvo em snapshot
+#   gravacao  - arquivo exportado (e índice de partições) gravado em exported_data
+#   divisao   - partes geradas em exported_data_split
+
+# Jornal da execução em andamento (None = execução sem pontos de retomada)
+_jornal = None
+_pid_jornal = None
+_diretorio = None
+_trava = threading.Lock()
+
+# Processos auxiliares (gravação da exportação assíncrona): conferem as partes do jornal
+# recebido e acumulam as novas, que o processo principal registra ao fim de cada tarefa
+_auxiliar = False
+_partes_novas = []
+
+def diretorio_checkpoint():
+    if DIRETORIO_CHECKPOINT is not None:
+        return DIRETORIO_CHECKPOINT
+    import export_spreadsheets
+    return os.path.join(export_spreadsheets.OUTPUT_DIR, NOME_DIRETORIO_CHECKPOINT)
+
+def _caminho_jornal():
+    return os.path.join(_diretorio, ARQUIVO_JORNAL)
+
+def _caminho_partes():
+    return os.path.join(_diretorio, ARQUIVO_PARTES)
+
+def _gravar_jornal():
+    # Chamada com _trava adquirida: a exportação assíncrona registra estágios de várias threads
+    temporario = _caminho_jornal() + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({chave: valor for chave, valor in _jornal.items() if chave != 'partes'}, arquivo, ensure_ascii=False, indent=1)
+    os.replace(temporario, _caminho_jornal())
+
+def _anexar_partes(registros):
+    # Chamada com _trava adquirida
+    with open(_caminho_partes(), 'a', encoding='utf-8') as arquivo:
+        for registro in registros:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+def _ler_partes():
+    partes = {}
+    if not os.path.exists(_caminho_partes()):
+        return partes
+    with open(_caminho_partes(), encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                # Última linha cortada por uma interrupção no meio da escrita: a parte é gravada de novo
+                continue
+            partes[registro['caminho']] = registro
+    return partes
+
+def _ativo():
+    # Só o processo que abriu o jornal o atualiza (processos auxiliares herdam a variável no fork)
+    return _jornal is not None and _pid_jornal == os.getpid()
+
+def iniciar(retomar=False):
+    """
+    Abre o jornal da execução. Com retomar=True continua do último ponto gravado
+    por uma execução interrompida; sem ele descarta pontos de retomada antigos.
+    """
+    global _jornal, _pid_jornal, _diretorio
+    _diretorio = diretorio_checkpoint()
+    caminho = _caminho_jornal()
+    if retomar and os.path.exists(caminho):
+        with open(caminho, encoding='utf-8') as arquivo:
+            _jornal = json.load(arquivo)
+        _jornal['partes'] = {**_jornal.get('partes', {}), **_ler_partes()}
+        concluidos = [f"{tipo}:{estagio}" for tipo, estagios in _jornal['estagios'].items() for estagio in estagios]
+        print(f"Retomando execução iniciada em {_jornal['iniciada_em']} ({len(concluidos)} estágios e {len(_jornal['partes'])} partes já concluídos)")
+    else:
+        if retomar:
+            print("Nenhuma execução interrompida encontrada, iniciando do começo")
+        shutil.rmtree(_diretorio, ignore_errors=True)
+        _jornal = {'execucao': uuid.uuid4().hex, 'iniciada_em': datetime.now().isoformat(timespec='seconds'),
+                   'estagios': {}, 'partes': {}}
+    _pid_jornal = os.getpid()
+    os.makedirs(_diretorio, exist_ok=True)
+    _gravar_jornal()
+
+def finalizar():
+    """Execução concluída: remove o jornal e os snapshots"""
+    global _jornal, _pid_jornal
+    if not _ativo():
+        return
+    shutil.rmtree(_diretorio, ignore_errors=True)
+    _jornal = None
+    _pid_jornal = None
+
+def _soma(caminho):
+    soma = hashlib.sha1()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            soma.update(bloco)
+    return soma.hexdigest()
+
+def _registro_arquivo(caminho, tamanho=None):
+    """Identificação de um arquivo gravado nesta execução: tamanho, SHA-1 e o id da execução"""
+    return {'caminho': caminho, 'tamanho': os.path.getsize(caminho) if tamanho is None else tamanho,
+            'sha1': _soma(caminho), 'execucao': _jornal['execucao']}
+
+def _arquivo_intacto(registro):
+    """
+    O arquivo registrado continua o mesmo: gravado por esta execução (jornais de versões
+    antigas, sem id nem soma, não valem), com o mesmo tamanho e o mesmo conteúdo
+    """
+    return registro is not None and registro.get('execucao') == _jornal.get('execucao') and \
+        'sha1' in registro and os.path.exists(registro['caminho']) and \
+        os.path.getsize(registro['caminho']) == registro['tamanho'] and _soma(registro['caminho']) == registro['sha1']
+
+def estagio_concluido(tipo, estagio):
+    """Indica se o estágio da entidade foi concluído e o seu arquivo continua intacto"""
+    if not _ativo():
+        return False
+    registro = _jornal['estagios'].get(tipo, {}).get(estagio)
+    if registro is None:
+        return False
+    return 'caminho' not in registro or _arquivo_intacto(registro)
+
+def concluir_estagio(tipo, estagio, caminho=None, **dados):
+    """Registra o estágio como concluído; com caminho, guarda tamanho e soma para conferir na retomada"""
+    if not _ativo():
+        return
+    registro = dict(dados, concluido_em=datetime.now().isoformat(timespec='seconds'))
+    if caminho is not None:
+        registro.update(_registro_arquivo(caminho))
+    with _trava:
+        _jornal['estagios'].setdefault(tipo, {})[estagio] = registro
+        _gravar_jornal()
+
+def parte_concluida(caminho):
+    """Tamanho da parte se ela já foi gravada nesta execução e continua intacta; senão None"""
+    if not _ativo():
+        return None
+    registro = _jornal['partes'].get(caminho)
+    return registro['tamanho'] if _arquivo_intacto(registro) else None
+
+def registrar_parte(caminho, tamanho):
+    if not _ativo():
+        return
+    with _trava:
+        _jornal['partes'][caminho] = _registro_arquivo(caminho, tamanho)
+        if _auxiliar:
+            _partes_novas.append(_jornal['partes'][caminho])
+        else:
+            _anexar_partes([_jornal['partes'][caminho]])
+
+def estado_auxiliar():
+    """Partes do jornal aberto, para iniciar_auxiliar nos processos de gravação (None sem jornal)"""
+    if not _ativo():
+        return None
+    with _trava:
+        return {'execucao': _jornal['execucao'], 'partes': dict(_jornal['partes'])}
+
+def iniciar_auxiliar(estado):
+    """
+    Em um processo auxiliar: confere as partes já gravadas pelo `estado` do jornal do
+    processo principal e acumula as gravadas aqui, sem escrever o arquivo do jornal
+    """
+    global _jornal, _pid_jornal, _auxiliar
+    _partes_novas.clear()
+    if estado is None:
+        _jornal, _pid_jornal, _auxiliar = None, None, False
+        return
+    _jornal = {'execucao': estado['execucao'], 'estagios': {}, 'partes': dict(estado['partes'])}
+    _pid_jornal = os.getpid()
+    _auxiliar = True
+
+def coletar_partes():
+    """Partes registradas neste processo auxiliar desde a última coleta"""
+    with _trava:
+        partes = list(_partes_novas)
+        _partes_novas.clear()
+    return partes
+
+def incorporar_partes(registros):
+    """Registra no jornal as partes gravadas por um processo auxiliar"""
+    if not _ativo() or not registros:
+        return
+    with _trava:
+        for registro in registros:
+            _jornal['partes'][registro['caminho']] = registro
+        _anexar_partes(registros)
+
+def _formato_snapshot():
+    try:
+        import pyarrow
+        return 'parquet'
+    except ImportError:
+        return 'pkl'
+
+def salvar_snapshot(tipo, df):
+    """
+    Guarda o resultado da consulta (com os tipos do esquema) para a retomada não
+    repetir a consulta. Usa parquet quando pyarrow está instalado, senão pickle.
+    """
+    if not _ativo():
+        return None
+    formato = _formato_snapshot()
+    caminho = os.path.join(_diretorio, f'{tipo}.{formato}')
+    temporario = caminho + '.tmp'
+    if formato == 'parquet':
+        df.to_parquet(temporario, index=False)
+    else:
+        df.to_pickle(temporario)
+    os.replace(temporario, caminho)
+    concluir_estagio(tipo, 'consulta', caminho=caminho, linhas=len(df))
+    return caminho
+
+def carregar_snapshot(tipo):
+    caminho = _jornal['estagios'][tipo]['consulta']['caminho']
+    return pd.read_parquet(caminho) if caminho.endswith('.parquet') else pd.read_pickle(caminho)
@@ -0,0 +1,47 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+# Relatório da execução (tempos, índices, estatísticas das consultas), gravado junto dos arquivos exportados
+ARQUIVO_RELATORIO = os.path.join('exported_data', 'relatorio_execucao.json')
+
+# Relatório da execução em andamento (None = nada é registrado)
+_relatorio = None
+_trava = threading.Lock()
+
+def iniciar(**dados):
+    """Começa um relatório novo; `dados` identificam a execução (banco, estabelecimentos...)"""
+    global _relatorio
+    with _trava:
+        _relatorio = {'iniciada_em': datetime.now().isoformat(timespec='seconds'), **dados}
+
+def registrar(secao, chave, dados):
+    """Guarda `dados` em relatorio[secao][chave]; chamadas de várias threads são seguras"""
+    with _trava:
+        if _relatorio is not None:
+            _relatorio.setdefault(secao, {})[chave] = dados
+
+def obter(secao):
+    with _trava:
+        return dict((_relatorio or {}).get(secao, {}))
+
+def salvar(caminho=None):
+    """Grava o relatório (substituindo o da execução anterior) e o encerra; retorna o caminho ou None"""
+    global _relatorio
+    caminho = caminho or ARQUIVO_RELATORIO
+    with _trava:
+        if _relatorio is None:
+            return None
+        _relatorio['concluida_em'] = datetime.now().isoformat(timespec='seconds')
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(_relatorio, arquivo, ensure_ascii=False, indent=1, default=str)
+        os.replace(temporario, caminho)
+        _relatorio = None
+    return caminho
+
+def carregar(caminho=None):
+    with open(caminho or ARQUIVO_RELATORIO, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
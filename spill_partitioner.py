@@ -0,0 +1,119 @@
+import os
+import pickle
+import shutil
+import tempfile
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Memória que a divisão pode usar; arquivos maiores são distribuídos em disco por partição
+ORCAMENTO_MEMORIA = 512 * 1024 * 1024
+
+# Quantas vezes o DataFrame ocupa em memória o tamanho do arquivo de origem
+FATOR_EXPANSAO = {'.xlsx': 12, '.csv': 3}
+
+# Cópias feitas durante a preparação de um lote (formatação, filtro, agrupamento)
+FATOR_COPIAS_LOTE = 4
+
+LINHAS_AMOSTRA = 1000
+
+def cabe_em_memoria(caminho, orcamento=None):
+    """Estimativa, pelo tamanho do arquivo, se ele pode ser lido inteiro dentro do orçamento"""
+    orcamento = orcamento or ORCAMENTO_MEMORIA
+    fator = FATOR_EXPANSAO.get(os.path.splitext(caminho)[1], FATOR_EXPANSAO['.xlsx'])
+    return os.path.getsize(caminho) * fator <= orcamento
+
+def bytes_por_linha_em_memoria(df):
+    return df.memory_usage(index=True, deep=True).sum() / max(1, len(df))
+
+def linhas_por_lote(caminho, orcamento=None):
+    """Linhas por lote de leitura para que cada lote, com as suas cópias, caiba no orçamento"""
+    from validation_engine import ler_em_lotes
+
+    orcamento = orcamento or ORCAMENTO_MEMORIA
+    amostra = next(ler_em_lotes(caminho, LINHAS_AMOSTRA), None)
+    if amostra is None or len(amostra) == 0:
+        return LINHAS_AMOSTRA
+    return max(LINHAS_AMOSTRA, int(orcamento / (bytes_por_linha_em_memoria(amostra) * FATOR_COPIAS_LOTE)))
+
+def _ordem_chave(chave):
+    # Números antes de textos (ex.: meses 1-12 antes de 'sem_data'), sem comparar tipos diferentes
+    partes = chave if isinstance(chave, tuple) else (chave,)
+    return tuple((isinstance(parte, str), parte if isinstance(parte, str) else float(parte)) for parte in partes)
+
+class ParticionadorEmDisco:
+    """
+    Distribui lotes de linhas em arquivos de transbordo, um por chave de partição,
+    e devolve depois cada partição inteira, uma por vez. A memória usada fica
+    limitada a um lote na distribuição e à maior partição na leitura.
+    """
+
+    def __init__(self, diretorio=None):
+        self.diretorio = tempfile.mkdtemp(prefix='particoes_', dir=diretorio)
+        self.arquivos = {}
+        self.linhas = {}
+
+    def adicionar(self, df, chaves):
+        """Acrescenta as linhas do lote às partições; `chaves` é alinhada ao df (Series ou lista de Series)"""
+        for chave, grupo in df.groupby(chaves, sort=False, dropna=False):
+            if chave not in self.arquivos:
+                self.arquivos[chave] = os.path.join(self.diretorio, f'particao_{len(self.arquivos):06d}.pkl')
+                self.linhas[chave] = 0
+            # Cada lote é um pickle a mais no fim do arquivo: a ordem de chegada das linhas é mantida
+            with open(self.arquivos[chave], 'ab') as arquivo:
+                pickle.dump(grupo, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            self.linhas[chave] += len(grupo)
+
+    def chaves(self):
+        return sorted(self.arquivos, key=_ordem_chave)
+
+    def ler(self, chave, ordenar_por=None):
+        """Partição inteira, na ordem de chegada ou ordenada (estável) pela coluna informada"""
+        lotes = []
+        with open(self.arquivos[chave], 'rb') as arquivo:
+            while True:
+                try:
+                    lotes.append(pickle.load(arquivo))
+                except EOFError:
+                    break
+        df = pd.concat(lotes) if len(lotes) > 1 else lotes[0]
+        if ordenar_por is not None:
+            df = df.sort_values(by=ordenar_por, kind='stable')
+        return df
+
+    def particoes(self, ordenar_por=None):
+        """Gera (chave, DataFrame) em ordem de chave"""
+        for chave in self.chaves():
+            yield chave, self.ler(chave, ordenar_por)
+
+    def fechar(self):
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+def particionar_arquivo(caminho, preparar, chave, orcamento=None, diretorio=None):
+    """
+    Lê o arquivo em lotes dentro do orçamento de memória, aplica preparar(lote)
+    e distribui as linhas em disco por chave(lote). Retorna o particionador
+    (use com `with` para apagar os arquivos de transbordo) e o total de linhas lidas.
+    """
+    from validation_engine import ler_em_lotes
+
+    tamanho_lote = linhas_por_lote(caminho, orcamento)
+    print(f"Distribuindo {caminho} em disco por partição, em lotes de {tamanho_lote} linhas")
+    particionador = ParticionadorEmDisco(diretorio)
+    total_linhas = 0
+    try:
+        for lote in ler_em_lotes(caminho, tamanho_lote):
+            total_linhas += len(lote)
+            lote = preparar(lote)
+            if len(lote) > 0:
+                particionador.adicionar(lote, chave(lote))
+    except BaseException:
+        particionador.fechar()
+        raise
+    return particionador, total_linhas
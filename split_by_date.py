@@ -1,62 +1,60 @@
-import pandas as pd
 import os
+import sys
 import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+import lazy_imports
+import financial_schema
+import validation_engine
+import csv_chunker
+import output_writers
+import run_journal
+import part_packing
+
+pd = lazy_imports.sob_demanda('pandas')
 
 SPLIT_OUTPUT_DIR = 'exported_data_split'
-os.makedirs(SPLIT_OUTPUT_DIR, exist_ok=True)
 
 INPUT_DIR = 'exported_data'
 
 MAX_FILE_SIZE = 2000 * 1024  # 2.000KB (um pouco menor que 2MB para garantir compatibilidade)
 
+# Arquivos CSV acima deste tamanho são subdivididos por adicional_split_large_files
+LIMITE_SUBDIVISAO = 1900 * 1024
+
+# Geração dos arquivos *_completo das contas (a divisão não depende deles):
+#   sempre        - grava antes de dividir
+#   segundo_plano - grava em um processo de baixa prioridade enquanto a divisão segue
+#   sob_demanda   - não grava; use --completo para gerá-los
+MODO_COMPLETO = 'segundo_plano'
+
+_executor_completo = None
+_completos_pendentes = []
+
+# Com fork: o completo agendado, herdado pelo processo filho, e a trava que faz os filhos gravarem um por vez
+_completo_herdado = None
+_trava_completos = None
+
 def estimate_csv_size(df):
-    csv_data = df.to_csv(index=False).encode('utf-8-sig')
-    return len(csv_data)
+    return output_writers.tamanho_serializado(df, 'csv')
 
-def split_by_date_range(df, date_column, max_size):
+def estimate_size(df, formato='csv'):
+    """Tamanho estimado do DataFrame no formato em que ele será gravado"""
+    return output_writers.estimar_tamanho(df, formato)
+
+def split_by_date_range(df, date_column, max_size, formato='csv'):
     df = df.sort_values(by=date_column)
     
     if not pd.api.types.is_datetime64_dtype(df[date_column]):
         df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
     
-    hoje = pd.Timestamp.now()
-    limite_futuro = hoje + pd.DateOffset(years=10)
-    limite_passado = hoje - pd.DateOffset(years=20)
-    
-    datas_futuro = df[df[date_column] > limite_futuro]
-    if len(datas_futuro) > 0:
-        print(f"Aviso: Encontradas {len(datas_futuro)} datas além de {limite_futuro.strftime('%d-%m-%Y')}.")
-        print("Essas datas podem ser erros de digitação. Registros com erro:")
-        
-        for i, row in datas_futuro.head(5).iterrows():
-            data_atual = row[date_column]
-            print(f"  - Registro com ID {row.get('Id', i)}: Data {date_column} = {data_atual.strftime('%d-%m-%Y')}")
-        
-        report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_datas_futuras_{date_column.replace(" ", "_")}.csv')
-        datas_futuro.to_csv(report_filename, index=False, encoding='utf-8-sig')
-        print(f"  Registros com datas futuras salvos em: {report_filename}")
-    
-    datas_antigas = df[df[date_column] < limite_passado]
-    if len(datas_antigas) > 0:
-        print(f"Aviso: Encontradas {len(datas_antigas)} datas anteriores a {limite_passado.strftime('%d-%m-%Y')}.")
-        print("Essas datas podem ser erros de digitação. Registros com erro:")
-        
-        
-        for i, row in datas_antigas.head(5).iterrows():
-            data_atual = row[date_column]
-            print(f"  - Registro com ID {row.get('Id', i)}: Data {date_column} = {data_atual.strftime('%d-%m-%Y')}")
-        
-        report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_datas_antigas_{date_column.replace(" ", "_")}.csv')
-        datas_antigas.to_csv(report_filename, index=False, encoding='utf-8-sig')
-        print(f"  Registros com datas antigas salvos em: {report_filename}")
-    
     min_date = df[date_column].min()
     max_date = df[date_column].max()
     
     if pd.isnull(min_date) or pd.isnull(max_date):
         print(f"Aviso: Intervalo de datas inválido detectado. Usando divisão baseada em linhas.")
-        return split_by_rows(df, max_size)
+        return split_by_rows(df, max_size, formato)
     
     print(f"Intervalo de datas: {min_date} até {max_date}")
     
@@ -74,7 +72,7 @@ def split_by_date_range(df, date_column, max_size):
         chunk = df[(df[date_column] >= current_date) & (df[date_column] < next_date)]
         
         if len(chunk) > 0:
-            size = estimate_csv_size(chunk)
+            size = estimate_size(chunk, formato)
             chunks.append({
                 'start_date': current_date, 
                 'end_date': next_date,
@@ -100,7 +98,7 @@ def split_by_date_range(df, date_column, max_size):
             chunk = df[(df[date_column] >= current_date) & (df[date_column] < next_date)]
             
             if len(chunk) > 0:
-                size = estimate_csv_size(chunk)
+                size = estimate_size(chunk, formato)
                 chunks.append({
                     'start_date': current_date, 
                     'end_date': next_date,
@@ -124,7 +122,7 @@ def split_by_date_range(df, date_column, max_size):
                 chunk = df[(df[date_column] >= current_date) & (df[date_column] < next_date)]
                 
                 if len(chunk) > 0:
-                    size = estimate_csv_size(chunk)
+                    size = estimate_size(chunk, formato)
                     chunks.append({
                         'start_date': current_date, 
                         'end_date': next_date,
@@ -148,7 +146,7 @@ def split_by_date_range(df, date_column, max_size):
                     chunk = df[(df[date_column] >= current_date) & (df[date_column] < next_date)]
                     
                     if len(chunk) > 0:
-                        size = estimate_csv_size(chunk)
+                        size = estimate_size(chunk, formato)
                         chunks.append({
                             'start_date': current_date, 
                             'end_date': next_date,
@@ -170,7 +168,7 @@ def split_by_date_range(df, date_column, max_size):
                         chunk = df[(df[date_column] >= current_date) & (df[date_column] < next_date)]
                         
                         if len(chunk) > 0:
-                            size = estimate_csv_size(chunk)
+                            size = estimate_size(chunk, formato)
                             chunks.append({
                                 'start_date': current_date, 
                                 'end_date': next_date,
@@ -187,14 +185,14 @@ def split_by_date_range(df, date_column, max_size):
         oversized_chunks = []
         for chunk in current_chunks:
             if chunk['size'] > MAX_FILE_SIZE:
-                row_chunks = split_by_rows(chunk['data'], MAX_FILE_SIZE)
+                row_chunks = split_by_rows(chunk['data'], MAX_FILE_SIZE, formato)
                 for i, row_chunk in enumerate(row_chunks):
                     oversized_chunks.append({
                         'start_date': chunk['start_date'],
                         'end_date': chunk['end_date'],
                         'date_label': f"{chunk['date_label']} (parte {i+1})",
                         'data': row_chunk,
-                        'size': estimate_csv_size(row_chunk)
+                        'size': estimate_size(row_chunk, formato)
                     })
             else:
                 oversized_chunks.append(chunk)
@@ -203,10 +201,33 @@ def split_by_date_range(df, date_column, max_size):
     
     return current_chunks
 
-def split_by_rows(df, max_size):
+def empacotar_periodos(chunks, max_size):
+    """
+    Junta períodos pequenos e vizinhos (anos, meses, semanas ou dias) em partes de
+    até max_size. Cada parte guarda em 'faixas' as linhas de cada período contido.
+    """
+    grupos = [{'rotulo': chunk['date_label'], 'data': chunk['data'], 'tamanho': chunk['size']} for chunk in chunks]
+    pacotes = part_packing.empacotar(grupos, max_size * 0.9)
+    
+    empacotados = []
+    inicio = 0
+    for pacote in pacotes:
+        primeiro, ultimo = chunks[inicio], chunks[inicio + len(pacote['rotulos']) - 1]
+        inicio += len(pacote['rotulos'])
+        empacotados.append({
+            'start_date': primeiro['start_date'],
+            'end_date': ultimo['end_date'],
+            'date_label': part_packing.rotulo_pacote(pacote['rotulos']),
+            'data': pacote['data'],
+            'size': pacote['tamanho'],
+            'faixas': pacote['faixas'],
+        })
+    return empacotados
+
+def split_by_rows(df, max_size, formato='csv'):
     total_rows = len(df)
     
-    size_per_row = estimate_csv_size(df) / total_rows if total_rows > 0 else 0
+    size_per_row = estimate_size(df, formato) / total_rows if total_rows > 0 else 0
     
     rows_per_chunk = math.floor((max_size * 0.9) / size_per_row) if size_per_row > 0 else 1000
     rows_per_chunk = max(1, rows_per_chunk)
@@ -216,224 +237,234 @@ def split_by_rows(df, max_size):
         end_idx = min(i + rows_per_chunk, total_rows)
         chunk = df.iloc[i:end_idx]
         
-        real_size = estimate_csv_size(chunk)
+        real_size = estimate_size(chunk, formato)
         
         if real_size > max_size and len(chunk) > 1:
             mid_point = len(chunk) // 2
             first_half = chunk.iloc[:mid_point]
             second_half = chunk.iloc[mid_point:]
             
-            chunks.extend(split_by_rows(first_half, max_size))
-            chunks.extend(split_by_rows(second_half, max_size))
+            chunks.extend(split_by_rows(first_half, max_size, formato))
+            chunks.extend(split_by_rows(second_half, max_size, formato))
         else:
             chunks.append(chunk)
     
     return chunks
 
-def verificar_valores_nulos(df, colunas_importantes):
-    erros = []
-    
-    for coluna in colunas_importantes:
-        if coluna in df.columns:
-            nulos = df[df[coluna].isnull()]
-            if len(nulos) > 0:
-                erros.append({
-                    'coluna': coluna,
-                    'registros': nulos
-                })
-                print(f"Aviso: Encontrados {len(nulos)} registros com valor nulo na coluna '{coluna}'")
-    
-    return erros
+def _baixar_prioridade():
+    if hasattr(os, 'nice'):
+        os.nice(19)
 
-def verificar_inconsistencias(df, tipo_arquivo):
-    inconsistencias = {}
-    
-    if tipo_arquivo == 'contas_pagar' or tipo_arquivo == 'contas_receber':
-        data_emissao = 'Data emissao' if 'Data emissao' in df.columns else 'Data Emissao'
-        data_vencimento = 'Data vencimento' if 'Data vencimento' in df.columns else None
-        data_liquidacao = 'Data Liquidacao' if 'Data Liquidacao' in df.columns else None
-        
-        if data_emissao and data_vencimento and data_emissao in df.columns and data_vencimento in df.columns:
-            df[data_emissao] = pd.to_datetime(df[data_emissao], errors='coerce')
-            df[data_vencimento] = pd.to_datetime(df[data_vencimento], errors='coerce')
-            
-            inconsistentes = df[(~df[data_emissao].isnull()) & 
-                                 (~df[data_vencimento].isnull()) & 
-                                 (df[data_vencimento] < df[data_emissao])]
-            
-            if len(inconsistentes) > 0:
-                inconsistencias['vencimento_anterior_emissao'] = inconsistentes
-                print(f"Aviso: Encontrados {len(inconsistentes)} registros onde a data de vencimento é anterior à data de emissão")
-        
-        if data_emissao and data_liquidacao and data_emissao in df.columns and data_liquidacao in df.columns:
-            df[data_emissao] = pd.to_datetime(df[data_emissao], errors='coerce')
-            df[data_liquidacao] = pd.to_datetime(df[data_liquidacao], errors='coerce')
-            
-            inconsistentes = df[(~df[data_emissao].isnull()) & 
-                                 (~df[data_liquidacao].isnull()) & 
-                                 (df[data_liquidacao] < df[data_emissao])]
-            
-            if len(inconsistentes) > 0:
-                inconsistencias['liquidacao_anterior_emissao'] = inconsistentes
-                print(f"Aviso: Encontrados {len(inconsistentes)} registros onde a data de liquidação é anterior à data de emissão")
-        
-        if 'Valor documento' in df.columns:
-            inconsistentes = df[df['Valor documento'] <= 0]
-            if len(inconsistentes) > 0:
-                inconsistencias['valor_documento_invalido'] = inconsistentes
-                print(f"Aviso: Encontrados {len(inconsistentes)} registros com valor de documento zero ou negativo")
-    
-    elif tipo_arquivo == 'contatos':
-        if 'CNPJ/CPF' in df.columns:
-            df['doc_numeric'] = df['CNPJ/CPF'].astype(str).str.replace(r'\D', '', regex=True)
-            
-            inconsistentes = df[(df['doc_numeric'].str.len() != 11) & 
-                                 (df['doc_numeric'].str.len() != 14) &
-                                 (df['doc_numeric'].str.len() > 0)] 
-            
-            if len(inconsistentes) > 0:
-                inconsistencias['cpf_cnpj_invalido'] = inconsistentes
-                print(f"Aviso: Encontrados {len(inconsistentes)} registros com CPF/CNPJ de tamanho inválido")
-            
-            df.drop('doc_numeric', axis=1, inplace=True)
-    
-    return inconsistencias
+def _gravar_completo(df, caminho, formato):
+    # gravar usa arquivo temporário e renomeia no fim, então nunca fica um completo pela metade
+    tamanho = output_writers.gravar(df, caminho, formato)
+    return caminho, tamanho
+
+def _gravar_completo_herdado(trava):
+    """Executado no processo filho (fork): grava o completo herdado da memória do pai"""
+    _baixar_prioridade()
+    df, caminho, formato = _completo_herdado
+    with trava:
+        _gravar_completo(df, caminho, formato)
+
+def agendar_completo(df, caminho, formato, modo=None):
+    """Gera o arquivo completo conforme MODO_COMPLETO (ou o modo informado)"""
+    global _executor_completo, _completo_herdado, _trava_completos
+    modo = modo or MODO_COMPLETO
+
+    if modo == 'sob_demanda':
+        print(f"Arquivo completo não gerado (sob demanda, use --completo): {caminho}")
+        return
+    if run_journal.parte_concluida(caminho) is not None:
+        print(f"Arquivo completo já gravado em execução anterior, mantido: {caminho}")
+        return
+    if modo == 'sempre':
+        _, tamanho = _gravar_completo(df, caminho, formato)
+        print(f"Arquivo completo salvo: {caminho} ({tamanho / (1024*1024):.2f} MB)")
+        return
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Um processo por completo, criado por fork logo depois de guardar o DataFrame em
+        # _completo_herdado: o filho lê o DataFrame da memória herdada (cópia sob demanda das
+        # páginas), sem serializá-lo. A trava mantém uma gravação de completo por vez.
+        contexto = multiprocessing.get_context('fork')
+        if _trava_completos is None:
+            _trava_completos = contexto.Lock()
+        _completo_herdado = (df, caminho, formato)
+        try:
+            processo = contexto.Process(target=_gravar_completo_herdado, args=(_trava_completos,))
+            processo.start()
+        finally:
+            _completo_herdado = None
+        _completos_pendentes.append((processo, caminho))
+    else:
+        # Sem fork (spawn) o DataFrame é serializado (pickle) para o processo auxiliar
+        if _executor_completo is None:
+            _executor_completo = ProcessPoolExecutor(max_workers=1, initializer=_baixar_prioridade)
+        _completos_pendentes.append(_executor_completo.submit(_gravar_completo, df, caminho, formato))
+    print(f"Arquivo completo sendo gravado em segundo plano: {caminho}")
+
+def aguardar_completos():
+    """Espera os arquivos completos gravados em segundo plano"""
+    global _executor_completo
+    for pendente in _completos_pendentes:
+        try:
+            if isinstance(pendente, tuple):
+                processo, caminho = pendente
+                processo.join()
+                if processo.exitcode != 0:
+                    raise RuntimeError(f"processo de gravação de {caminho} terminou com código {processo.exitcode}")
+                tamanho = os.path.getsize(caminho)
+            else:
+                caminho, tamanho = pendente.result()
+            run_journal.registrar_parte(caminho, tamanho)
+            print(f"Arquivo completo salvo: {caminho} ({tamanho / (1024*1024):.2f} MB)")
+        except Exception as e:
+            print(f"Erro ao gravar arquivo completo em segundo plano: {str(e)}")
+    _completos_pendentes.clear()
+    if _executor_completo is not None:
+        _executor_completo.shutdown()
+        _executor_completo = None
+
+# Regras de preenchimento de valores ausentes por entidade. Quando 'coluna' é
+# uma tupla, usa-se a primeira coluna existente no DataFrame. Tipos de regra:
+#   data_atual    - converte a coluna para data e preenche com a data atual
+#   constante     - preenche com 'valor' (ou com 'valores_por' conforme outra coluna)
+#   copiar_coluna - copia o valor da coluna 'origem' na mesma linha
+#   modelo        - formata 'valor' substituindo {id} pelo Id do registro (ou índice)
+REGRAS_PREENCHIMENTO = {
+    'contatos': [
+        {'coluna': 'Data nascimento', 'tipo': 'data_atual',
+         'mensagem': "Preenchendo {ausentes} datas de nascimento ausentes com a data atual ({hoje})"},
+        {'coluna': 'CNPJ / CPF', 'tipo': 'constante', 'valor': '00000000000',
+         'valores_por': ('Tipo pessoa', {'Jurídica': '00000000000000'}),
+         'mensagem': "Preenchendo {ausentes} CPF/CNPJ ausentes com valor padrão (zeros)"},
+        {'coluna': 'Nome', 'tipo': 'modelo', 'valor': 'Cliente {id}',
+         'mensagem': "Preenchendo {ausentes} nomes ausentes com valor padrão"},
+        {'coluna': 'Endereço', 'tipo': 'constante', 'valor': 'N/A'},
+        {'coluna': 'Bairro', 'tipo': 'constante', 'valor': 'N/A'},
+        {'coluna': 'Cidade', 'tipo': 'constante', 'valor': 'N/A'},
+        {'coluna': 'Situação', 'tipo': 'constante', 'valor': 'N/A'},
+        {'coluna': 'Estado', 'tipo': 'constante', 'valor': 'UF',
+         'mensagem': "Preenchendo {ausentes} estados ausentes com valor padrão (UF)"},
+        {'coluna': 'E-mail', 'tipo': 'modelo', 'valor': 'contato{id}@exemplo.com',
+         'mensagem': "Preenchendo {ausentes} e-mails ausentes com valor padrão"},
+    ],
+    'contas': [
+        {'coluna': ('Data emissao', 'Data Emissao'), 'tipo': 'data_atual',
+         'mensagem': "Preenchendo {ausentes} datas de emissão ausentes com a data atual ({hoje})"},
+        {'coluna': 'Data vencimento', 'tipo': 'copiar_coluna', 'origem': ('Data emissao', 'Data Emissao'),
+         'converter_data': True,
+         'mensagem': "Preenchendo {ausentes} datas de vencimento ausentes com mesmo valor da data de emissão"},
+        {'coluna': ('Cliente', 'Fornecedor'), 'tipo': 'modelo', 'valor': 'Cliente {id}'},
+        {'coluna': 'Valor documento', 'tipo': 'constante', 'valor': 1.00,
+         'mensagem': "Preenchendo {ausentes} valores de documento ausentes com valor padrão (1.00)"},
+        {'coluna': ('Situacao', 'Situação'), 'tipo': 'constante', 'valor': 'Em Aberto',
+         'mensagem': "Preenchendo {ausentes} situações ausentes com valor padrão ('Em Aberto')"},
+    ],
+}
+
+def _resolver_coluna(df, coluna):
+    """Retorna a primeira coluna existente entre as alternativas da regra"""
+    alternativas = coluna if isinstance(coluna, tuple) else (coluna,)
+    for alternativa in alternativas:
+        if alternativa in df.columns:
+            return alternativa
+    return None
+
+def _ids_registros(df):
+    """Id de cada registro como texto, usando o índice quando o Id está ausente"""
+    ids = pd.Series(df.index, index=df.index, dtype=object)
+    if 'Id' in df.columns:
+        ids = df['Id'].astype(object).where(df['Id'].notna(), ids)
+    return ids.astype(str)
+
+def aplicar_regras_preenchimento(df, regras, hoje=None):
+    """
+    Aplica as regras de preenchimento coluna a coluna, de forma vetorizada:
+    cada regra calcula a máscara de ausentes uma única vez e atribui todos os
+    valores padrão de uma só vez.
+    """
+    hoje = hoje or datetime.now()
+    ids = None
+
+    for regra in regras:
+        coluna = _resolver_coluna(df, regra['coluna'])
+        if coluna is None:
+            continue
+
+        tipo = regra['tipo']
+        if tipo == 'data_atual' or regra.get('converter_data'):
+            if not pd.api.types.is_datetime64_any_dtype(df[coluna]):
+                df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+
+        ausentes_mascara = df[coluna].isnull()
+        ausentes = int(ausentes_mascara.sum())
+        if ausentes == 0:
+            continue
+
+        mensagem = regra.get('mensagem', "Preenchendo {ausentes} valores ausentes em '{coluna}' com valor padrão")
+        print(mensagem.format(ausentes=ausentes, coluna=coluna, hoje=hoje.strftime('%d-%m-%Y')))
+
+        if tipo == 'data_atual':
+            valores = hoje
+        elif tipo == 'constante':
+            valores = regra['valor']
+            if 'valores_por' in regra and regra['valores_por'][0] in df.columns:
+                coluna_ref, mapa = regra['valores_por']
+                valores = df[coluna_ref].map(mapa).astype(object).fillna(regra['valor'])
+        elif tipo == 'copiar_coluna':
+            origem = _resolver_coluna(df, regra['origem'])
+            if origem is None:
+                continue
+            valores = df[origem]
+        elif tipo == 'modelo':
+            if ids is None:
+                ids = _ids_registros(df)
+            prefixo, _, sufixo = regra['valor'].partition('{id}')
+            valores = prefixo + ids + sufixo
+        else:
+            raise ValueError(f"Tipo de regra de preenchimento desconhecido: {tipo}")
+
+        financial_schema.preencher_coluna(df, ausentes_mascara, coluna, valores)
+
+    return df
 
 def preencher_valores_ausentes(df, tipo_arquivo):
-    hoje = datetime.now()
-    
     if tipo_arquivo == 'contatos':
-        if 'Data nascimento' in df.columns:
-            data_padrao = hoje
-            df['Data nascimento'] = pd.to_datetime(df['Data nascimento'], errors='coerce')
-            ausentes = df['Data nascimento'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} datas de nascimento ausentes com a data atual ({hoje.strftime('%d-%m-%Y')})")
-                df.loc[df['Data nascimento'].isnull(), 'Data nascimento'] = data_padrao
-        
-        if 'CNPJ/CPF' in df.columns:
-            cpf_padrao = '00000000000'
-            ausentes = df['CNPJ/CPF'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} CPF/CNPJ ausentes com valor padrão (zeros)")
-                df['cpf_temp'] = cpf_padrao
-                if 'Tipo Pessoa' in df.columns:
-                    df.loc[df['Tipo Pessoa'] == 'Jurídica', 'cpf_temp'] = '00000000000000'
-                df.loc[df['CNPJ/CPF'].isnull(), 'CNPJ/CPF'] = df.loc[df['CNPJ/CPF'].isnull(), 'cpf_temp']
-                df.drop('cpf_temp', axis=1, inplace=True)
-        
-        if 'Nome' in df.columns:
-            ausentes = df['Nome'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} nomes ausentes com valor padrão")
-                for idx in df[df['Nome'].isnull()].index:
-                    id_valor = df.loc[idx, 'Id'] if 'Id' in df.columns and not pd.isnull(df.loc[idx, 'Id']) else idx
-                    df.loc[idx, 'Nome'] = f"Cliente {id_valor}"
-        
-        campos_texto = ['Endereço', 'Bairro', 'Cidade', 'Situação']
-        for campo in campos_texto:
-            if campo in df.columns:
-                ausentes = df[campo].isnull().sum()
-                if ausentes > 0:
-                    print(f"Preenchendo {ausentes} valores ausentes em '{campo}' com valor padrão")
-                    df.loc[df[campo].isnull(), campo] = 'N/A'
-        
-        if 'Estado' in df.columns:
-            ausentes = df['Estado'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} estados ausentes com valor padrão (UF)")
-                df.loc[df['Estado'].isnull(), 'Estado'] = 'UF'
-        
-        if 'E-mail' in df.columns:
-            ausentes = df['E-mail'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} e-mails ausentes com valor padrão")
-                for idx in df[df['E-mail'].isnull()].index:
-                    id_valor = df.loc[idx, 'Id'] if 'Id' in df.columns and not pd.isnull(df.loc[idx, 'Id']) else idx
-                    df.loc[idx, 'E-mail'] = f"contato{id_valor}@exemplo.com"
-    
+        return aplicar_regras_preenchimento(df, REGRAS_PREENCHIMENTO['contatos'])
     elif tipo_arquivo in ['contas_pagar', 'contas_receber']:
-        data_emissao = 'Data emissao' if 'Data emissao' in df.columns else 'Data Emissao'
-        if data_emissao in df.columns:
-            data_padrao = hoje
-            df[data_emissao] = pd.to_datetime(df[data_emissao], errors='coerce')
-            ausentes = df[data_emissao].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} datas de emissão ausentes com a data atual ({hoje.strftime('%d-%m-%Y')})")
-                df.loc[df[data_emissao].isnull(), data_emissao] = data_padrao
-        
-        data_vencimento = 'Data vencimento' if 'Data vencimento' in df.columns else None
-        if data_vencimento and data_vencimento in df.columns:
-            df[data_vencimento] = pd.to_datetime(df[data_vencimento], errors='coerce')
-            ausentes = df[data_vencimento].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} datas de vencimento ausentes com mesmo valor da data de emissão")
-                df.loc[df[data_vencimento].isnull(), data_vencimento] = df.loc[df[data_vencimento].isnull(), data_emissao]
-        
-        cliente_col = 'Cliente' if 'Cliente' in df.columns else 'Fornecedor'
-        if cliente_col in df.columns:
-            ausentes = df[cliente_col].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} valores ausentes em '{cliente_col}' com valor padrão")
-                for idx in df[df[cliente_col].isnull()].index:
-                    id_valor = df.loc[idx, 'Id'] if 'Id' in df.columns and not pd.isnull(df.loc[idx, 'Id']) else idx
-                    df.loc[idx, cliente_col] = f"Cliente {id_valor}"
-        
-        if 'Valor documento' in df.columns:
-            ausentes = df['Valor documento'].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} valores de documento ausentes com valor padrão (1.00)")
-                df.loc[df['Valor documento'].isnull(), 'Valor documento'] = 1.00
-        
-        situacao_col = 'Situacao' if 'Situacao' in df.columns else 'Situação'
-        if situacao_col in df.columns:
-            ausentes = df[situacao_col].isnull().sum()
-            if ausentes > 0:
-                print(f"Preenchendo {ausentes} situações ausentes com valor padrão ('Em Aberto')")
-                df.loc[df[situacao_col].isnull(), situacao_col] = 'Em Aberto'
-    
+        return aplicar_regras_preenchimento(df, REGRAS_PREENCHIMENTO['contas'])
     return df
 
 def process_accounts_payable():
     print("Processando Contas a Pagar...")
     
-    file_path = os.path.join(INPUT_DIR, 'contas_a_pagar.xlsx')
+    file_path = os.path.join(INPUT_DIR, output_writers.arquivo_exportacao('contas_pagar'))
     if not os.path.exists(file_path):
         print(f"Erro: Arquivo não encontrado em {file_path}")
         return
+    
+    os.makedirs(SPLIT_OUTPUT_DIR, exist_ok=True)
         
-    df = pd.read_excel(file_path)
+    df = financial_schema.aplicar_esquema(output_writers.ler(file_path))
     
     if len(df) == 0:
         print("Aviso: Arquivo de Contas a Pagar está vazio")
         return
     
     print("Verificando erros de cadastro...")
-    colunas_importantes = ['Data emissao', 'Data vencimento', 'Valor documento', 'Fornecedor', 'Estabelecimento_id']
-    erros = verificar_valores_nulos(df, colunas_importantes)
-    
-    if erros:
-        for erro in erros:
-            coluna = erro['coluna']
-            registros = erro['registros']
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_nulos_contas_pagar_{coluna.replace(" ", "_")}.csv')
-            registros.to_csv(report_filename, index=False, encoding='utf-8-sig')
-            print(f"  Registros com valores nulos em '{coluna}' salvos em: {report_filename}")
-        
-    inconsistencias = verificar_inconsistencias(df, 'contas_pagar')
-    if inconsistencias:
-        for tipo, registros in inconsistencias.items():
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_inconsistencia_contas_pagar_{tipo}.csv')
-            registros.to_csv(report_filename, index=False, encoding='utf-8-sig')
-            print(f"  Registros com inconsistência '{tipo}' salvos em: {report_filename}")
+    validation_engine.validar(df, 'contas_pagar', SPLIT_OUTPUT_DIR)
     
     print("Preenchendo valores ausentes com padrões...")
     df = preencher_valores_ausentes(df, 'contas_pagar')
     
-    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, 'contas_a_pagar_completo.xlsx')
-    df.to_excel(complete_file_path, index=False)
-    complete_size = os.path.getsize(complete_file_path)
-    print(f"Arquivo completo salvo: {complete_file_path} ({complete_size / (1024*1024):.2f} MB)")
+    formato_completo = output_writers.formato_saida('contas_pagar', 'completo')
+    formato_partes = output_writers.formato_saida('contas_pagar', 'partes')
+    extensao_partes = output_writers.extensao(formato_partes)
+    
+    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, output_writers.nome_arquivo('contas_a_pagar_completo', formato_completo))
+    agendar_completo(df, complete_file_path, formato_completo)
 
     try:
         import split_contas_pagar
@@ -443,7 +474,11 @@ def process_accounts_payable():
     except Exception as e:
         print(f"Erro ao usar script personalizado: {str(e)}")
         print("Continuando com método padrão de divisão...")
-
+    
+    # Decisão de dividir pela estimativa de tamanho, sem depender do arquivo completo
+    complete_size = estimate_size(df, formato_completo)
+    print(f"Tamanho estimado do arquivo completo: {complete_size / (1024*1024):.2f} MB")
+    
     if complete_size < MAX_FILE_SIZE:
         print("Arquivo completo é menor que 2MB, não é necessário dividir.")
         return
@@ -458,75 +493,70 @@ def process_accounts_payable():
     
     if date_column:
         print(f"Dividindo Contas a Pagar por períodos (estratégia: 5 anos → 1 ano → mês → semana → dia)")
-        chunks = split_by_date_range(df, date_column, MAX_FILE_SIZE)
+        chunks = split_by_date_range(df, date_column, MAX_FILE_SIZE, formato_partes)
+        if part_packing.EMPACOTAR_PARTICOES:
+            chunks = empacotar_periodos(chunks, MAX_FILE_SIZE)
+            print(f"Períodos pequenos empacotados em {len(chunks)} partes")
+        manifesto = {}
         
         for i, chunk in enumerate(chunks):
-            file_name = f"contas_a_pagar_{chunk['date_label'].replace(' ', '_').replace(':', '')}.xlsx"
+            file_name = f"contas_a_pagar_{chunk['date_label'].replace(' ', '_').replace(':', '')}.{extensao_partes}"
             file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk['data'].to_excel(file_path, index=False)
-            chunk_size = os.path.getsize(file_path)
+            chunk_size = output_writers.gravar(chunk['data'], file_path, formato_partes)
+            manifesto[file_name] = chunk.get('faixas', [{'rotulo': chunk['date_label'], 'linha_inicio': 0, 'linha_fim': len(chunk['data'])}])
             if chunk_size > MAX_FILE_SIZE:
                 print(f"ATENÇÃO: Arquivo {file_path} excede o limite de {MAX_FILE_SIZE/1024:.0f}KB ({chunk_size/1024:.0f}KB). Dividindo novamente...")
-                subchunks = split_by_rows(chunk['data'], MAX_FILE_SIZE * 0.95)
+                subchunks = split_by_rows(chunk['data'], MAX_FILE_SIZE * 0.95, formato_partes)
                 os.remove(file_path)
                 for j, subchunk in enumerate(subchunks):
-                    subfile_name = f"contas_a_pagar_{chunk['date_label'].replace(' ', '_').replace(':', '')}_parte{j+1}.xlsx"
+                    subfile_name = f"contas_a_pagar_{chunk['date_label'].replace(' ', '_').replace(':', '')}_parte{j+1}.{extensao_partes}"
                     subfile_path = os.path.join(SPLIT_OUTPUT_DIR, subfile_name)
-                    subchunk.to_excel(subfile_path, index=False)
-                    subchunk_size = os.path.getsize(subfile_path)
+                    subchunk_size = output_writers.gravar(subchunk, subfile_path, formato_partes)
+                    manifesto[subfile_name] = [{'rotulo': chunk['date_label'], 'linha_inicio': 0, 'linha_fim': len(subchunk)}]
                     print(f"  Subparte {j+1}/{len(subchunks)} salva: {subfile_path} ({subchunk_size / 1024:.0f}KB, {len(subchunk)} linhas)")
+                del manifesto[file_name]
             else:
                 print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk['data'])} linhas)")
+        
+        if part_packing.EMPACOTAR_PARTICOES:
+            print(f"Manifesto das partes salvo: {part_packing.salvar_manifesto(SPLIT_OUTPUT_DIR, 'contas_a_pagar', manifesto)}")
     else:
-        chunks = split_by_rows(df, MAX_FILE_SIZE)
+        chunks = split_by_rows(df, MAX_FILE_SIZE, formato_partes)
         
         for i, chunk in enumerate(chunks):
-            file_name = f"contas_a_pagar_parte_{i+1}.xlsx"
+            file_name = f"contas_a_pagar_parte_{i+1}.{extensao_partes}"
             file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk.to_excel(file_path, index=False)
-            chunk_size = os.path.getsize(file_path)
+            chunk_size = output_writers.gravar(chunk, file_path, formato_partes)
             print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk)} linhas)")
 
 def process_accounts_receivable():
     print("Processando Contas a Receber...")
     
-    file_path = os.path.join(INPUT_DIR, 'contas_a_receber.xlsx')
+    file_path = os.path.join(INPUT_DIR, output_writers.arquivo_exportacao('contas_receber'))
     if not os.path.exists(file_path):
         print(f"Erro: Arquivo não encontrado em {file_path}")
         return
+    
+    os.makedirs(SPLIT_OUTPUT_DIR, exist_ok=True)
         
-    df = pd.read_excel(file_path)
+    df = financial_schema.aplicar_esquema(output_writers.ler(file_path))
     
     if len(df) == 0:
         print("Aviso: Arquivo de Contas a Receber está vazio")
         return
     
     print("Verificando erros de cadastro...")
-    colunas_importantes = ['Data Emissao', 'Data vencimento', 'Valor documento', 'Cliente', 'Estabelecimento_id']
-    erros = verificar_valores_nulos(df, colunas_importantes)
-    
-    if erros:
-        for erro in erros:
-            coluna = erro['coluna']
-            registros = erro['registros']
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_nulos_contas_receber_{coluna.replace(" ", "_")}.xlsx')
-            registros.to_excel(report_filename, index=False)
-            print(f"  Registros com valores nulos em '{coluna}' salvos em: {report_filename}")
-    
-    inconsistencias = verificar_inconsistencias(df, 'contas_receber')
-    if inconsistencias:
-        for tipo, registros in inconsistencias.items():
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_inconsistencia_contas_receber_{tipo}.xlsx')
-            registros.to_excel(report_filename, index=False)
-            print(f"  Registros com inconsistência '{tipo}' salvos em: {report_filename}")
+    validation_engine.validar(df, 'contas_receber', SPLIT_OUTPUT_DIR)
     
     print("Preenchendo valores ausentes com padrões...")
     df = preencher_valores_ausentes(df, 'contas_receber')
     
-    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, 'contas_a_receber_completo.xlsx')
-    df.to_excel(complete_file_path, index=False)
-    complete_size = os.path.getsize(complete_file_path)
-    print(f"Arquivo completo salvo: {complete_file_path} ({complete_size / (1024*1024):.2f} MB)")
+    formato_completo = output_writers.formato_saida('contas_receber', 'completo')
+    formato_partes = output_writers.formato_saida('contas_receber', 'partes')
+    extensao_partes = output_writers.extensao(formato_partes)
+    
+    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, output_writers.nome_arquivo('contas_a_receber_completo', formato_completo))
+    agendar_completo(df, complete_file_path, formato_completo)
     
     try:
         import split_contas_receber
@@ -537,6 +567,10 @@ def process_accounts_receivable():
         print(f"Erro ao usar script personalizado: {str(e)}")
         print("Continuando com método padrão de divisão...")
     
+    # Decisão de dividir pela estimativa de tamanho, sem depender do arquivo completo
+    complete_size = estimate_size(df, formato_completo)
+    print(f"Tamanho estimado do arquivo completo: {complete_size / (1024*1024):.2f} MB")
+    
     if complete_size < MAX_FILE_SIZE:
         print("Arquivo completo é menor que 2MB, não é necessário dividir.")
         return
@@ -551,33 +585,40 @@ def process_accounts_receivable():
     
     if date_column:
         print(f"Dividindo Contas a Receber por períodos (estratégia: 5 anos → 1 ano → mês → semana → dia)")
-        chunks = split_by_date_range(df, date_column, MAX_FILE_SIZE)
+        chunks = split_by_date_range(df, date_column, MAX_FILE_SIZE, formato_partes)
+        if part_packing.EMPACOTAR_PARTICOES:
+            chunks = empacotar_periodos(chunks, MAX_FILE_SIZE)
+            print(f"Períodos pequenos empacotados em {len(chunks)} partes")
+        manifesto = {}
         
         for i, chunk in enumerate(chunks):
-            file_name = f"contas_a_receber_{chunk['date_label'].replace(' ', '_').replace(':', '')}.xlsx"
+            file_name = f"contas_a_receber_{chunk['date_label'].replace(' ', '_').replace(':', '')}.{extensao_partes}"
             file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk['data'].to_excel(file_path, index=False)
-            chunk_size = os.path.getsize(file_path)
+            chunk_size = output_writers.gravar(chunk['data'], file_path, formato_partes)
+            manifesto[file_name] = chunk.get('faixas', [{'rotulo': chunk['date_label'], 'linha_inicio': 0, 'linha_fim': len(chunk['data'])}])
             if chunk_size > MAX_FILE_SIZE:
                 print(f"ATENÇÃO: Arquivo {file_path} excede o limite de {MAX_FILE_SIZE/1024:.0f}KB ({chunk_size/1024:.0f}KB). Dividindo novamente...")
-                subchunks = split_by_rows(chunk['data'], MAX_FILE_SIZE * 0.95)
+                subchunks = split_by_rows(chunk['data'], MAX_FILE_SIZE * 0.95, formato_partes)
                 os.remove(file_path)
                 for j, subchunk in enumerate(subchunks):
-                    subfile_name = f"contas_a_receber_{chunk['date_label'].replace(' ', '_').replace(':', '')}_parte{j+1}.xlsx"
+                    subfile_name = f"contas_a_receber_{chunk['date_label'].replace(' ', '_').replace(':', '')}_parte{j+1}.{extensao_partes}"
                     subfile_path = os.path.join(SPLIT_OUTPUT_DIR, subfile_name)
-                    subchunk.to_excel(subfile_path, index=False)
-                    subchunk_size = os.path.getsize(subfile_path)
+                    subchunk_size = output_writers.gravar(subchunk, subfile_path, formato_partes)
+                    manifesto[subfile_name] = [{'rotulo': chunk['date_label'], 'linha_inicio': 0, 'linha_fim': len(subchunk)}]
                     print(f"  Subparte {j+1}/{len(subchunks)} salva: {subfile_path} ({subchunk_size / 1024:.0f}KB, {len(subchunk)} linhas)")
+                del manifesto[file_name]
             else:
                 print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk['data'])} linhas)")
+        
+        if part_packing.EMPACOTAR_PARTICOES:
+            print(f"Manifesto das partes salvo: {part_packing.salvar_manifesto(SPLIT_OUTPUT_DIR, 'contas_a_receber', manifesto)}")
     else:
-        chunks = split_by_rows(df, MAX_FILE_SIZE)
+        chunks = split_by_rows(df, MAX_FILE_SIZE, formato_partes)
         
         for i, chunk in enumerate(chunks):
-            file_name = f"contas_a_receber_parte_{i+1}.xlsx"
+            file_name = f"contas_a_receber_parte_{i+1}.{extensao_partes}"
             file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk.to_excel(file_path, index=False)
-            chunk_size = os.path.getsize(file_path)
+            chunk_size = output_writers.gravar(chunk, file_path, formato_partes)
             print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk)} linhas)")
 
 def process_contacts():
@@ -587,6 +628,8 @@ def process_contacts():
     if not os.path.exists(file_path):
         print(f"Erro: Arquivo não encontrado em {file_path}")
         return
+    
+    os.makedirs(SPLIT_OUTPUT_DIR, exist_ok=True)
         
     df = pd.read_csv(file_path)
     
@@ -595,71 +638,45 @@ def process_contacts():
         return
     
     print("Verificando erros de cadastro...")
-    colunas_importantes = ['Nome', 'CNPJ/CPF', 'Situação']
-    erros = verificar_valores_nulos(df, colunas_importantes)
-    
-    if erros:
-        for erro in erros:
-            coluna = erro['coluna']
-            registros = erro['registros']
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_nulos_contatos_{coluna.replace(" ", "_").replace("/", "_")}.csv')
-            registros.to_csv(report_filename, index=False, encoding='utf-8-sig')
-            print(f"  Registros com valores nulos em '{coluna}' salvos em: {report_filename}")
-    
-    inconsistencias = verificar_inconsistencias(df, 'contatos')
-    if inconsistencias:
-        for tipo, registros in inconsistencias.items():
-            report_filename = os.path.join(SPLIT_OUTPUT_DIR, f'erros_inconsistencia_contatos_{tipo}.csv')
-            registros.to_csv(report_filename, index=False, encoding='utf-8-sig')
-            print(f"  Registros com inconsistência '{tipo}' salvos em: {report_filename}")
+    validation_engine.validar(df, 'contatos', SPLIT_OUTPUT_DIR)
     
     print("Preenchendo valores ausentes com padrões...")
     df = preencher_valores_ausentes(df, 'contatos')
     
-    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, 'contatos_completo.csv')
-    df.to_csv(complete_file_path, index=False, encoding='utf-8-sig')
-    complete_size = os.path.getsize(complete_file_path)
-    print(f"Arquivo completo salvo: {complete_file_path} ({complete_size / (1024*1024):.2f} MB)")
+    formato_completo = output_writers.formato_saida('contatos', 'completo')
+    formato_partes = output_writers.formato_saida('contatos', 'partes')
+    
+    fatiar_completo = formato_completo == 'csv' and formato_partes == 'csv'
+    
+    complete_file_path = os.path.join(SPLIT_OUTPUT_DIR, output_writers.nome_arquivo('contatos_completo', formato_completo))
+    if fatiar_completo:
+        # O completo é a origem das partes, então é gravado agora
+        complete_size = output_writers.gravar(df, complete_file_path, formato_completo)
+        print(f"Arquivo completo salvo: {complete_file_path} ({complete_size / (1024*1024):.2f} MB)")
+    else:
+        agendar_completo(df, complete_file_path, formato_completo)
+        complete_size = estimate_size(df, formato_partes)
+        print(f"Tamanho estimado dos contatos: {complete_size / (1024*1024):.2f} MB")
     
     if complete_size < MAX_FILE_SIZE:
         print("Arquivo completo é menor que 2MB, não é necessário dividir.")
         return
     
-    date_columns = [col for col in df.columns if 'data' in col.lower()]
-    
-    if date_columns:
-        print(f"Encontradas possíveis colunas de data: {', '.join(date_columns)}")
-        date_column = date_columns[0]
-        print(f"Usando coluna '{date_column}' para dividir por períodos (estratégia: 5 anos → 1 ano → mês → semana → dia)")
-        chunks = split_by_date_range(df, date_column, MAX_FILE_SIZE)
-        
-        for i, chunk in enumerate(chunks):
-            file_name = f"contatos_{chunk['date_label'].replace(' ', '_').replace(':', '')}.csv"
-            file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk['data'].to_csv(file_path, index=False, encoding='utf-8-sig')
-            chunk_size = os.path.getsize(file_path)
-            if chunk_size > MAX_FILE_SIZE:
-                print(f"ATENÇÃO: Arquivo {file_path} excede o limite de {MAX_FILE_SIZE/1024:.0f}KB ({chunk_size/1024:.0f}KB). Dividindo novamente...")
-                subchunks = split_by_rows(chunk['data'], MAX_FILE_SIZE * 0.95)
-                os.remove(file_path)
-                for j, subchunk in enumerate(subchunks):
-                    subfile_name = f"contatos_{chunk['date_label'].replace(' ', '_').replace(':', '')}_parte{j+1}.csv"
-                    subfile_path = os.path.join(SPLIT_OUTPUT_DIR, subfile_name)
-                    subchunk.to_csv(subfile_path, index=False, encoding='utf-8-sig')
-                    subchunk_size = os.path.getsize(subfile_path)
-                    print(f"  Subparte {j+1}/{len(subchunks)} salva: {subfile_path} ({subchunk_size / 1024:.0f}KB, {len(subchunk)} linhas)")
-            else:
-                print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk['data'])} linhas)")
+    if fatiar_completo:
+        # O CSV completo já está no formato final: as partes são fatias de bytes dele,
+        # copiadas pelo kernel, sem serializar os dados novamente. O limite usado é o
+        # da subdivisão adicional, para que nenhuma parte precise ser cortada de novo.
+        print(f"Dividindo Contatos por tamanho a partir de {complete_file_path} (cópia direta de bytes)")
+        partes = csv_chunker.dividir_csv_mmap(complete_file_path, LIMITE_SUBDIVISAO, SPLIT_OUTPUT_DIR, 'contatos')
     else:
-        print("Nenhuma coluna de data encontrada para Contatos. Dividindo por número de linhas.")
-        chunks = split_by_rows(df, MAX_FILE_SIZE)
-        
-        for i, chunk in enumerate(chunks):
-            file_name = f"contatos_parte_{i+1}.csv"
-            file_path = os.path.join(SPLIT_OUTPUT_DIR, file_name)
-            chunk.to_csv(file_path, index=False, encoding='utf-8-sig')
-            chunk_size = os.path.getsize(file_path)
-            print(f"Parte {i+1}/{len(chunks)} salva: {file_path} ({chunk_size / 1024:.0f}KB, {len(chunk)} linhas)")
+        print(f"Dividindo Contatos por tamanho no formato {formato_partes}")
+        partes = []
+        for i, chunk in enumerate(split_by_rows(df, LIMITE_SUBDIVISAO, formato_partes)):
+            caminho_parte = os.path.join(SPLIT_OUTPUT_DIR, output_writers.nome_arquivo(f'contatos_parte_{i+1}', formato_partes))
+            partes.append({'caminho': caminho_parte, 'bytes': output_writers.gravar(chunk, caminho_parte, formato_partes), 'linhas': len(chunk)})
+    
+    for i, parte in enumerate(partes):
+        print(f"Parte {i+1}/{len(partes)} salva: {parte['caminho']} ({parte['bytes'] / 1024:.0f}KB, {parte['linhas']} linhas)")
 
 def adicional_split_large_files():
     print("\nVerificando se há arquivos individuais com mais de 2.000KB para subdividir...")
@@ -672,6 +689,9 @@ def adicional_split_large_files():
     
     padroes_ignorar = ['erros_']
     
+    if not os.path.isdir(SPLIT_OUTPUT_DIR):
+        return
+    
     for arquivo in os.listdir(SPLIT_OUTPUT_DIR):
         if not arquivo.endswith('.csv'):
             continue
@@ -685,113 +705,24 @@ def adicional_split_large_files():
         caminho_arquivo = os.path.join(SPLIT_OUTPUT_DIR, arquivo)
         tamanho = os.path.getsize(caminho_arquivo)
         
-        if tamanho > 1900 * 1024:
+        if tamanho > LIMITE_SUBDIVISAO:
             print(f"Encontrado arquivo grande: {arquivo} ({tamanho/1024:.0f}KB)")
             
-            df = pd.read_csv(caminho_arquivo)
-            
-            max_size_smaller = MAX_FILE_SIZE * 0.4
-            chunks = split_by_rows(df, max_size_smaller)
-            
-            os.remove(caminho_arquivo)
-            
-            base_name = os.path.splitext(arquivo)[0]
+            # Corte direto nos bytes do CSV, em fim de registro, sem reprocessar em pandas
+            caminho_temporario = caminho_arquivo + '.original'
+            os.replace(caminho_arquivo, caminho_temporario)
+            try:
+                partes = csv_chunker.dividir_csv_por_bytes(
+                    caminho_temporario, LIMITE_SUBDIVISAO, SPLIT_OUTPUT_DIR, os.path.splitext(arquivo)[0])
+            except Exception:
+                os.replace(caminho_temporario, caminho_arquivo)
+                raise
+            os.remove(caminho_temporario)
             
-            for i, chunk in enumerate(chunks):
-                new_filename = f"{base_name}_parte_{i+1}.csv"
-                new_filepath = os.path.join(SPLIT_OUTPUT_DIR, new_filename)
-                chunk.to_csv(new_filepath, index=False, encoding='utf-8-sig')
-                new_size = os.path.getsize(new_filepath)
-                print(f"  Subdivisão {i+1}/{len(chunks)}: {new_filename} ({new_size/1024:.0f}KB, {len(chunk)} linhas)")
-                
-                if new_size > 1900 * 1024:
-                    print(f"    Novo arquivo ainda excede o limite, subdividindo novamente...")
-                    sub_df = pd.read_csv(new_filepath)
-                    sub_max_size = MAX_FILE_SIZE * 0.25
-                    sub_chunks = split_by_rows(sub_df, sub_max_size)
-                    os.remove(new_filepath)
-                    for j, sub_chunk in enumerate(sub_chunks):
-                        sub_filename = f"{base_name}_parte_{i+1}_{j+1}.csv"
-                        sub_filepath = os.path.join(SPLIT_OUTPUT_DIR, sub_filename)
-                        sub_chunk.to_csv(sub_filepath, index=False, encoding='utf-8-sig')
-                        sub_size = os.path.getsize(sub_filepath)
-                        print(f"      Sub-subdivisão {j+1}/{len(sub_chunks)}: {sub_filename} ({sub_size/1024:.0f}KB, {len(sub_chunk)} linhas)")
+            for i, parte in enumerate(partes):
+                print(f"  Subdivisão {i+1}/{len(partes)}: {os.path.basename(parte['caminho'])} ({parte['bytes']/1024:.0f}KB, {parte['linhas']} linhas)")
 
-if __name__ == "__main__":
-    print(f"Iniciando processo de divisão de dados às {datetime.now().strftime('%H:%M:%S')}")
-    print(f"Arquivos maiores que {MAX_FILE_SIZE/(1024)} KB serão divididos")
-    print(f"Estratégia: Agrupar por períodos de 5 anos, reduzindo gradualmente até encontrar tamanho adequado")
-    
-    estatisticas = {
-        'contas_pagar': {
-            'nulos': 0,
-            'datas_futuro': 0,
-            'datas_antigas': 0,
-            'inconsistencias': 0
-        },
-        'contas_receber': {
-            'nulos': 0,
-            'datas_futuro': 0,
-            'datas_antigas': 0,
-            'inconsistencias': 0
-        },
-        'contatos': {
-            'nulos': 0,
-            'datas_futuro': 0,
-            'datas_antigas': 0,
-            'inconsistencias': 0
-        }
-    }
-    
-    if not os.path.exists(INPUT_DIR):
-        print(f"Erro: Diretório de entrada {INPUT_DIR} não encontrado")
-    else:
-        process_accounts_payable()
-        process_accounts_receivable()
-        process_contacts()
-        
-        adicional_split_large_files()
-        
-        arquivos_erro = [f for f in os.listdir(SPLIT_OUTPUT_DIR) if f.startswith('erros_')]
-        for arquivo in arquivos_erro:
-            try:
-                caminho = os.path.join(SPLIT_OUTPUT_DIR, arquivo)
-                if os.path.exists(caminho) and os.path.getsize(caminho) > 0:
-                    df_erro = pd.read_csv(caminho)
-                    qtd_erros = len(df_erro)
-                    
-                    if 'contas_pagar' in arquivo:
-                        if 'nulos' in arquivo:
-                            estatisticas['contas_pagar']['nulos'] += qtd_erros
-                        elif 'datas_futuras' in arquivo:
-                            estatisticas['contas_pagar']['datas_futuro'] += qtd_erros
-                        elif 'datas_antigas' in arquivo:
-                            estatisticas['contas_pagar']['datas_antigas'] += qtd_erros
-                        elif 'inconsistencia' in arquivo:
-                            estatisticas['contas_pagar']['inconsistencias'] += qtd_erros
-                    
-                    elif 'contas_receber' in arquivo:
-                        if 'nulos' in arquivo:
-                            estatisticas['contas_receber']['nulos'] += qtd_erros
-                        elif 'datas_futuras' in arquivo:
-                            estatisticas['contas_receber']['datas_futuro'] += qtd_erros
-                        elif 'datas_antigas' in arquivo:
-                            estatisticas['contas_receber']['datas_antigas'] += qtd_erros
-                        elif 'inconsistencia' in arquivo:
-                            estatisticas['contas_receber']['inconsistencias'] += qtd_erros
-                    
-                    elif 'contatos' in arquivo:
-                        if 'nulos' in arquivo:
-                            estatisticas['contatos']['nulos'] += qtd_erros
-                        elif 'datas_futuras' in arquivo:
-                            estatisticas['contatos']['datas_futuro'] += qtd_erros
-                        elif 'datas_antigas' in arquivo:
-                            estatisticas['contatos']['datas_antigas'] += qtd_erros
-                        elif 'inconsistencia' in arquivo:
-                            estatisticas['contatos']['inconsistencias'] += qtd_erros
-            except:
-                pass 
-    
+def imprimir_resumo(estatisticas):
     print(f"\n{'='*40}")
     print(f"RESUMO DE ERROS ENCONTRADOS")
     print(f"{'='*40}")
@@ -813,5 +744,54 @@ if __name__ == "__main__":
     print(f"  - Datas muito antigas: {estatisticas['contatos']['datas_antigas']}")
     print(f"  - Inconsistências: {estatisticas['contatos']['inconsistencias']}")
     print(f"{'='*40}")
+
+def run(modo_completo=None, empacotar=False):
+    """
+    Processa as três entidades de INPUT_DIR para SPLIT_OUTPUT_DIR: validação,
+    preenchimento, divisão e subdivisão. Com empacotar=True, partições pequenas
+    vizinhas dividem o mesmo arquivo. Retorna o resumo de erros por entidade.
+    """
+    global MODO_COMPLETO
+    if modo_completo:
+        MODO_COMPLETO = modo_completo
+    if empacotar:
+        part_packing.EMPACOTAR_PARTICOES = True
+    
+    print(f"Iniciando processo de divisão de dados às {datetime.now().strftime('%H:%M:%S')}")
+    print(f"Arquivos maiores que {MAX_FILE_SIZE/(1024)} KB serão divididos")
+    print(f"Estratégia: Agrupar por períodos de 5 anos, reduzindo gradualmente até encontrar tamanho adequado")
+    
+    if not os.path.exists(INPUT_DIR):
+        print(f"Erro: Diretório de entrada {INPUT_DIR} não encontrado")
+    else:
+        os.makedirs(SPLIT_OUTPUT_DIR, exist_ok=True)
+        
+        # Cada validador regrava a sua entidade; começar do zero evita contagens de execuções anteriores
+        indice_erros = os.path.join(SPLIT_OUTPUT_DIR, validation_engine.ARQUIVO_INDICE_ERROS)
+        if os.path.exists(indice_erros):
+            os.remove(indice_erros)
+        
+        process_accounts_payable()
+        process_accounts_receivable()
+        process_contacts()
+        
+        adicional_split_large_files()
+        aguardar_completos()
+    
+    # Contagens vêm do índice gravado pelos validadores, sem reler os relatórios
+    estatisticas = validation_engine.resumir_indice(
+        validation_engine.carregar_indice_erros(SPLIT_OUTPUT_DIR),
+        ['contas_pagar', 'contas_receber', 'contatos'])
+    imprimir_resumo(estatisticas)
+    
+    print(f"Divisão de dados concluída às {datetime.now().strftime('%H:%M:%S')}")
+    return estatisticas
+
+if __name__ == "__main__":
+    modo_completo = None
+    if '--completo' in sys.argv:
+        modo_completo = 'sempre'
+    elif '--sem-completo' in sys.argv:
+        modo_completo = 'sob_demanda'
     
-    print(f"Divisão de dados concluída às {datetime.now().strftime('%H:%M:%S')}") 
\ No newline at end of file
+    run(modo_completo, empacotar='--empacotar' in sys.argv)
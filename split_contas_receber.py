@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
-import pandas as pd
 import os
 import math
 import re
+import sys
 from datetime import datetime
+import lazy_imports
+import financial_schema
+import dataframe_engines
+import partition_index
+import output_writers
+import part_packing
+import spill_partitioner
+import duckdb_split
+
+pd = lazy_imports.sob_demanda('pandas')
 
 # Configuração de diretórios
 INPUT_DIR = 'exported_data'
 OUTPUT_DIR = 'exported_data_split'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 MAX_FILE_SIZE = 500 * 1024  # 500KB
 
@@ -102,123 +111,218 @@ def obter_mes_vencimento(valor):
     
     return 'sem_data'
 
-def dividir_contas_receber():
+def preparar_contas(df):
+    """Formato do template, tipos do esquema, filtro de estabelecimentos e coluna auxiliar 'mes'"""
+    motor = dataframe_engines.obter_motor()
+    if motor is not None:
+        return motor.preparar_contas(df, COLUNAS_TEMPLATE, ESTABELECIMENTOS_ALVO)
+    df = financial_schema.aplicar_esquema(garantir_formato_template(df))
+    df = df[df['Estabelecimento_id'].isin(ESTABELECIMENTOS_ALVO)].copy()
+    df['mes'] = df['Data vencimento'].apply(obter_mes_vencimento)
+    return df
+
+def chave_particao(df):
+    return [df['Estabelecimento_id'], df['mes']]
+
+def grupos_por_mes(meses, ler_mes):
+    """Um grupo por mês, lido só quando a gravação chega nele"""
+    for mes in sorted(meses, key=spill_partitioner._ordem_chave):
+        df_mes = ler_mes(mes).drop(columns=['mes'])  # Remover coluna auxiliar
+        yield {'rotulo': MESES.get(mes, 'mes_desconhecido'), 'data': df_mes, 'tamanho': len(df_mes)}
+
+def dividir_contas_receber(estabelecimento=None, mes_vencimento=None, em_disco=None):
     """
     Divide a planilha de contas a receber por estabelecimento (apenas IDs 2 e 5),
     depois por mês e, dentro de cada mês, em partes menores de até 500KB.
+    
+    Com estabelecimento e/ou mes_vencimento (1-12 ou 'sem_data') informados,
+    gera apenas essa partição, lendo só as linhas dela pelo índice do arquivo.
+    
+    Com em_disco=True (ou automaticamente, quando o arquivo não cabe no orçamento
+    de memória) a planilha é lida em lotes e distribuída em disco por
+    (estabelecimento, mês), e só um mês fica em memória por vez.
+    
+    Com duckdb_split.USAR_DUCKDB (fora do modo em disco e do empacotamento) a
+    divisão é feita em SQL no DuckDB embutido, que grava CSV/parquet diretamente.
     """
     print(f"Dividindo planilha de contas a receber por estabelecimento, mês e em partes de até {MAX_FILE_SIZE/1024:.0f}KB")
     
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    
     # Verificar se o arquivo de contas a receber existe
-    arquivo_contas = os.path.join(INPUT_DIR, 'contas_a_receber.xlsx')
+    arquivo_contas = os.path.join(INPUT_DIR, output_writers.arquivo_exportacao('contas_receber'))
     if not os.path.exists(arquivo_contas):
         print(f"Erro: Arquivo {arquivo_contas} não encontrado!")
         return
     
-    # Ler a planilha de contas a receber
-    print(f"Lendo arquivo {arquivo_contas}...")
-    df = pd.read_excel(arquivo_contas)
-    total_linhas = len(df)
-    print(f"Total de {total_linhas} registros encontrados")
-    
-    # Garantir que o DataFrame tenha exatamente a mesma estrutura do template
-    print("Ajustando formato para seguir o template...")
-    df = garantir_formato_template(df)
+    if em_disco is None:
+        em_disco = estabelecimento is None and mes_vencimento is None and \
+            not spill_partitioner.cabe_em_memoria(arquivo_contas)
     
-    # Filtrar apenas os estabelecimentos alvo
-    print(f"Filtrando apenas estabelecimentos com IDs {ESTABELECIMENTOS_ALVO}...")
-    df_filtrado = df[df['Estabelecimento_id'].isin(ESTABELECIMENTOS_ALVO)].copy()
+    # Ler a planilha de contas a receber (só a partição pedida, quando houver índice)
+    df = None
+    particionador = None
+    indice = partition_index.carregar_indice(arquivo_contas)
+    if em_disco:
+        print(f"Arquivo maior que o orçamento de memória ({spill_partitioner.ORCAMENTO_MEMORIA / (1024*1024):.0f}MB), dividindo em disco...")
+        particionador, total_linhas = spill_partitioner.particionar_arquivo(arquivo_contas, preparar_contas, chave_particao)
+        total_linhas_filtrado = sum(particionador.linhas.values())
+    else:
+        if estabelecimento is not None or mes_vencimento is not None:
+            df = partition_index.ler_particao(arquivo_contas, estabelecimento, mes_vencimento)
+            if df is None:
+                print("Índice de partições ausente ou desatualizado, lendo o arquivo inteiro...")
+            else:
+                print(f"Lidas {len(df)} linhas da partição (estabelecimento={estabelecimento}, mês={mes_vencimento}) pelo índice")
+        if df is None:
+            print(f"Lendo arquivo {arquivo_contas}...")
+            df = output_writers.ler(arquivo_contas)
+        total_linhas = len(df)
+        print(f"Total de {total_linhas} registros encontrados")
+        
+        # Garantir a estrutura do template, filtrar os estabelecimentos alvo e extrair o mês de vencimento
+        print("Ajustando formato para seguir o template...")
+        print(f"Filtrando apenas estabelecimentos com IDs {ESTABELECIMENTOS_ALVO}...")
+        print("Agrupando por estabelecimento e mês de vencimento...")
+        df_filtrado = preparar_contas(df)
+        total_linhas_filtrado = len(df_filtrado)
+    total_linhas_arquivo = indice['total_linhas'] if indice else total_linhas
     
-    total_linhas_filtrado = len(df_filtrado)
     print(f"Total de {total_linhas_filtrado} registros após filtro de estabelecimentos")
     
     if total_linhas_filtrado == 0:
         print("Nenhum registro encontrado com os IDs de estabelecimento solicitados!")
+        if particionador is not None:
+            particionador.fechar()
         return
     
-    # Extrair o mês da data de vencimento
-    print("Agrupando por estabelecimento e mês de vencimento...")
-    df_filtrado['mes'] = df_filtrado['Data vencimento'].apply(obter_mes_vencimento)
-    
     # Obter tamanho do arquivo
     tamanho_arquivo = os.path.getsize(arquivo_contas)
     tamanho_mb = tamanho_arquivo / (1024 * 1024)
     print(f"Tamanho do arquivo original: {tamanho_mb:.2f}MB")
 
-    # Calcular o número aproximado de bytes por linha
-    bytes_por_linha = tamanho_arquivo / total_linhas
+    # Calcular o número aproximado de bytes por linha no formato de saída das partes
+    formato_partes = output_writers.formato_saida('contas_receber', 'partes')
+    if formato_partes == 'xlsx':
+        bytes_por_linha = tamanho_arquivo / total_linhas_arquivo
+    else:
+        # Em disco, a estimativa usa a primeira partição como amostra
+        amostra = particionador.ler(particionador.chaves()[0]) if particionador is not None else df_filtrado
+        bytes_por_linha = output_writers.estimar_tamanho(amostra.drop(columns=['mes']), formato_partes) / max(1, len(amostra))
     
     # Processar cada estabelecimento separadamente
     arquivos_criados = []
+    manifesto = {}
     
-    for estabelecimento_id in ESTABELECIMENTOS_ALVO:
-        df_estabelecimento = df_filtrado[df_filtrado['Estabelecimento_id'] == estabelecimento_id].copy()
-        
-        if len(df_estabelecimento) == 0:
-            print(f"\nNenhum registro encontrado para estabelecimento ID {estabelecimento_id}")
-            continue
-            
-        print(f"\nProcessando estabelecimento ID {estabelecimento_id} ({len(df_estabelecimento)} registros)")
-        
-        # Agrupar por mês para este estabelecimento
-        meses_unicos = df_estabelecimento['mes'].unique()
-        print(f"Encontrados {len(meses_unicos)} meses distintos para estabelecimento ID {estabelecimento_id}")
-        
-        for mes in sorted(meses_unicos):
-            # Filtrar registros do mês
-            df_mes = df_estabelecimento[df_estabelecimento['mes'] == mes].copy()
-            df_mes = df_mes.drop(columns=['mes'])  # Remover coluna auxiliar
-            
-            total_linhas_mes = len(df_mes)
-            nome_mes = MESES.get(mes, 'mes_desconhecido')
-            
-            print(f"\nProcessando estabelecimento {estabelecimento_id}, mês {nome_mes} ({total_linhas_mes} registros)")
-            
-            # Calcular o número aproximado de linhas por arquivo
-            # para manter cada um com aproximadamente 500KB
-            linhas_por_arquivo = int(MAX_FILE_SIZE * 0.95 / bytes_por_linha)  # 5% de margem de segurança
-            
-            # Garantir um número válido de linhas por arquivo
-            linhas_por_arquivo = max(1, min(linhas_por_arquivo, total_linhas_mes))
+    # Linhas por arquivo para manter cada um com aproximadamente 500KB (5% de margem de segurança)
+    linhas_maximas = max(1, int(MAX_FILE_SIZE * 0.95 / bytes_por_linha))
+    
+    if duckdb_split.USAR_DUCKDB and particionador is None and not part_packing.EMPACOTAR_PARTICOES:
+        # Particionamento, ordem e divisão por linhas no DuckDB; só o xlsx é gravado em Python
+        if estabelecimento is not None:
+            df_filtrado = df_filtrado[df_filtrado['Estabelecimento_id'] == estabelecimento]
+        if mes_vencimento is not None:
+            df_filtrado = df_filtrado[df_filtrado['mes'] == mes_vencimento]
+        print(f"Dividindo pelo DuckDB em partes de até {linhas_maximas} linhas ({formato_partes})...")
+        arquivos_criados = duckdb_split.dividir_particoes(df_filtrado, MESES, 'contas_a_receber', linhas_maximas, formato_partes, OUTPUT_DIR)
+        print(f"\nDivisão concluída. {len(arquivos_criados)} arquivos criados no diretório {OUTPUT_DIR}")
+        return arquivos_criados
+    
+    estabelecimentos = [estabelecimento] if estabelecimento is not None else ESTABELECIMENTOS_ALVO
+    try:
+        for estabelecimento_id in estabelecimentos:
+            if particionador is not None:
+                linhas_por_mes = {mes: linhas for (est, mes), linhas in particionador.linhas.items() if est == estabelecimento_id}
+                ler_mes = lambda mes, est=estabelecimento_id: particionador.ler((est, mes))
+            else:
+                df_estabelecimento = df_filtrado[df_filtrado['Estabelecimento_id'] == estabelecimento_id].copy()
+                linhas_por_mes = df_estabelecimento['mes'].value_counts(sort=False).to_dict()
+                ler_mes = lambda mes, df_est=df_estabelecimento: df_est[df_est['mes'] == mes]
             
-            # Calcular número de arquivos necessários para este mês
-            total_arquivos_mes = math.ceil(total_linhas_mes / linhas_por_arquivo)
+            if not linhas_por_mes:
+                print(f"\nNenhum registro encontrado para estabelecimento ID {estabelecimento_id}")
+                continue
+                
+            print(f"\nProcessando estabelecimento ID {estabelecimento_id} ({sum(linhas_por_mes.values())} registros)")
             
-            if total_arquivos_mes > 1:
-                print(f"Estratégia: Dividir estabelecimento {estabelecimento_id}, mês {nome_mes} em {total_arquivos_mes} partes com aproximadamente {linhas_por_arquivo} linhas cada")
+            # Agrupar por mês para este estabelecimento
+            meses_unicos = list(linhas_por_mes)
+            if mes_vencimento is not None:
+                meses_unicos = [mes for mes in meses_unicos if mes == mes_vencimento]
+            print(f"Encontrados {len(meses_unicos)} meses distintos para estabelecimento ID {estabelecimento_id}")
             
-            # Dividir o DataFrame do mês e salvar cada parte
-            for i in range(total_arquivos_mes):
-                inicio = i * linhas_por_arquivo
-                fim = min((i + 1) * linhas_por_arquivo, total_linhas_mes)
+            # No modo de empacotamento, meses pequenos vizinhos são gravados no mesmo arquivo
+            capacidade = linhas_maximas if part_packing.EMPACOTAR_PARTICOES else 0
+            for grupo in part_packing.empacotar(grupos_por_mes(meses_unicos, ler_mes), capacidade):
+                df_mes = grupo['data']
                 
-                # Extrair parte do DataFrame
-                parte = df_mes.iloc[inicio:fim].copy()
+                total_linhas_mes = len(df_mes)
+                nome_mes = part_packing.rotulo_pacote(grupo['rotulos'])
                 
-                # Salvar a parte como arquivo Excel
-                if total_arquivos_mes > 1:
-                    nome_arquivo = f"contas_a_receber_est_{estabelecimento_id}_{nome_mes}_parte_{i+1:03d}.xlsx"
-                else:
-                    nome_arquivo = f"contas_a_receber_est_{estabelecimento_id}_{nome_mes}.xlsx"
-                    
-                caminho_arquivo = os.path.join(OUTPUT_DIR, nome_arquivo)
-                parte.to_excel(caminho_arquivo, index=False)
+                print(f"\nProcessando estabelecimento {estabelecimento_id}, mês {nome_mes} ({total_linhas_mes} registros)")
                 
-                # Verificar tamanho real do arquivo salvo
-                tamanho_real = os.path.getsize(caminho_arquivo)
-                tamanho_real_kb = tamanho_real / 1024
+                # Garantir um número válido de linhas por arquivo
+                linhas_por_arquivo = min(linhas_maximas, total_linhas_mes)
+                
+                # Calcular número de arquivos necessários para este mês
+                total_arquivos_mes = math.ceil(total_linhas_mes / linhas_por_arquivo)
                 
                 if total_arquivos_mes > 1:
-                    print(f"Parte {i+1}/{total_arquivos_mes}: {nome_arquivo} - {tamanho_real_kb:.0f}KB, {len(parte)} linhas")
-                else:
-                    print(f"{nome_arquivo} - {tamanho_real_kb:.0f}KB, {len(parte)} linhas")
+                    print(f"Estratégia: Dividir estabelecimento {estabelecimento_id}, mês {nome_mes} em {total_arquivos_mes} partes com aproximadamente {linhas_por_arquivo} linhas cada")
+                
+                # Dividir o DataFrame do mês e salvar cada parte
+                for i in range(total_arquivos_mes):
+                    inicio = i * linhas_por_arquivo
+                    fim = min((i + 1) * linhas_por_arquivo, total_linhas_mes)
                     
-                arquivos_criados.append(caminho_arquivo)
+                    # Extrair parte do DataFrame
+                    parte = df_mes.iloc[inicio:fim].copy()
+                    
+                    # Salvar a parte no formato configurado (xlsx por padrão)
+                    if total_arquivos_mes > 1:
+                        nome_arquivo = output_writers.nome_arquivo(f"contas_a_receber_est_{estabelecimento_id}_{nome_mes}_parte_{i+1:03d}", formato_partes)
+                    else:
+                        nome_arquivo = output_writers.nome_arquivo(f"contas_a_receber_est_{estabelecimento_id}_{nome_mes}", formato_partes)
+                        
+                    caminho_arquivo = os.path.join(OUTPUT_DIR, nome_arquivo)
+                    
+                    # Gravar e verificar tamanho real do arquivo salvo
+                    tamanho_real = output_writers.gravar(parte, caminho_arquivo, formato_partes)
+                    tamanho_real_kb = tamanho_real / 1024
+                    
+                    if total_arquivos_mes > 1:
+                        print(f"Parte {i+1}/{total_arquivos_mes}: {nome_arquivo} - {tamanho_real_kb:.0f}KB, {len(parte)} linhas")
+                    else:
+                        print(f"{nome_arquivo} - {tamanho_real_kb:.0f}KB, {len(parte)} linhas")
+                        
+                    arquivos_criados.append(caminho_arquivo)
+                    manifesto[nome_arquivo] = grupo['faixas'] if total_arquivos_mes == 1 else \
+                        [{'rotulo': nome_mes, 'linha_inicio': 0, 'linha_fim': len(parte)}]
+    finally:
+        if particionador is not None:
+            particionador.fechar()
+    
+    if part_packing.EMPACOTAR_PARTICOES:
+        # Execuções filtradas atualizam só as suas entradas do manifesto
+        filtrada = estabelecimento is not None or mes_vencimento is not None
+        caminho_manifesto = part_packing.salvar_manifesto(OUTPUT_DIR, 'contas_a_receber', manifesto, atualizar=filtrada)
+        print(f"Manifesto das partes salvo: {caminho_manifesto}")
     
     print(f"\nDivisão concluída. {len(arquivos_criados)} arquivos criados no diretório {OUTPUT_DIR}")
     return arquivos_criados
 
 if __name__ == "__main__":
     print(f"Iniciando processamento em {datetime.now().strftime('%H:%M:%S')}")
-    dividir_contas_receber()
+    # Uso: python split_contas_receber.py [estabelecimento_id] [mes (1-12 ou sem_data)] [--empacotar] [--em-disco] [--motor=pandas|vetorizado|polars] [--duckdb]
+    part_packing.EMPACOTAR_PARTICOES = '--empacotar' in sys.argv
+    duckdb_split.USAR_DUCKDB = '--duckdb' in sys.argv
+    for argumento in sys.argv[1:]:
+        if argumento.startswith('--motor='):
+            dataframe_engines.MOTOR = argumento.split('=', 1)[1]
+    argumentos = [argumento for argumento in sys.argv[1:] if not argumento.startswith('--')]
+    estabelecimento = int(argumentos[0]) if len(argumentos) > 0 else None
+    mes_vencimento = None
+    if len(argumentos) > 1:
+        mes_vencimento = argumentos[1] if argumentos[1] == 'sem_data' else int(argumentos[1])
+    dividir_contas_receber(estabelecimento, mes_vencimento, em_disco=True if '--em-disco' in sys.argv else None)
     print(f"Processamento concluído em {datetime.now().strftime('%H:%M:%S')}")
\ No newline at end of file
@@ -1,12 +1,14 @@
-import pandas as pd
 import os
 import math
-import re
 from datetime import datetime
+import lazy_imports
+import output_writers
+import document_engine
+
+pd = lazy_imports.sob_demanda('pandas')
 
 INPUT_DIR = 'exported_data'
 OUTPUT_DIR = 'exported_data_split'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 MAX_FILE_SIZE = 500 * 1024  # 500KB
 
@@ -21,11 +23,8 @@ COLUNAS_TEMPLATE = [
     'Código de regime tributário', 'Limite de crédito'
 ]
 
-def limpar_cpf_cnpj(valor):
-    """Remove todos os caracteres não numéricos do CPF/CNPJ"""
-    if pd.isna(valor) or valor == '':
-        return ''
-    return re.sub(r'[^0-9]', '', str(valor))
+# Colunas de documento, normalizadas de uma vez pelo document_engine
+COLUNAS_DOCUMENTO = ['CNPJ / CPF', 'CPF pai', 'CPF mãe']
 
 def formatar_coluna(valor, coluna):
     """Formatar valor de acordo com o tipo de coluna"""
@@ -38,12 +37,6 @@ def formatar_coluna(valor, coluna):
         else:
             return ''
     
-    if coluna == 'CNPJ / CPF':
-        return limpar_cpf_cnpj(valor)
-    
-    if coluna in ['CPF pai', 'CPF mãe']:
-        return limpar_cpf_cnpj(valor)
-    
     if coluna == 'Data nascimento':
         try:
             data = pd.to_datetime(valor, dayfirst=True, errors='coerce')
@@ -78,8 +71,12 @@ def garantir_formato_template(df):
     # Criar DataFrame vazio com as colunas do template
     df_formatado = pd.DataFrame(columns=COLUNAS_TEMPLATE)
     
+    juridica = document_engine.mascara_juridica(df)
     for coluna in COLUNAS_TEMPLATE:
-        if coluna in df.columns:
+        if coluna in COLUNAS_DOCUMENTO and coluna in df.columns:
+            # Só dígitos, com os zeros à esquerda repostos (CPF com 11, CNPJ com 14)
+            df_formatado[coluna] = document_engine.normalizar(df[coluna], juridica if coluna == 'CNPJ / CPF' else None)
+        elif coluna in df.columns:
             df_formatado[coluna] = df[coluna].apply(lambda x: formatar_coluna(x, coluna))
         else:
             if coluna == 'Contribuinte':
@@ -98,14 +95,16 @@ def dividir_contatos():
     """
     print(f"Dividindo planilha de contatos em partes de até {MAX_FILE_SIZE/1024:.0f}KB")
     
-    arquivo_contatos = os.path.join(INPUT_DIR, 'contatos.xlsx')
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    
+    arquivo_contatos = os.path.join(INPUT_DIR, output_writers.arquivo_exportacao('contatos'))
     if not os.path.exists(arquivo_contatos):
         print(f"Erro: Arquivo {arquivo_contatos} não encontrado!")
         return
     
     # Ler a planilha de contatos
     print(f"Lendo arquivo {arquivo_contatos}...")
-    df = pd.read_excel(arquivo_contatos)
+    df = output_writers.ler(arquivo_contatos)
     total_linhas = len(df)
     print(f"Total de {total_linhas} contatos encontrados")
     
@@ -115,7 +114,11 @@ def dividir_contatos():
     tamanho_arquivo = os.path.getsize(arquivo_contatos)
     tamanho_mb = tamanho_arquivo / (1024 * 1024)
     print(f"Tamanho do arquivo: {tamanho_mb:.2f}MB")
-    bytes_por_linha = tamanho_arquivo / total_linhas
+    formato_partes = output_writers.formato_saida('contatos', 'partes_modelo')
+    if formato_partes == 'xlsx':
+        bytes_por_linha = tamanho_arquivo / total_linhas
+    else:
+        bytes_por_linha = output_writers.estimar_tamanho(df, formato_partes) / max(1, total_linhas)
     linhas_por_arquivo = int(MAX_FILE_SIZE * 0.95 / bytes_por_linha) 
     linhas_por_arquivo = max(1, min(linhas_por_arquivo, total_linhas))
     
@@ -130,11 +133,10 @@ def dividir_contatos():
         
         parte = df.iloc[inicio:fim].copy()
         
-        nome_arquivo = f"contatos_parte_{i+1:03d}.xlsx"  
+        nome_arquivo = output_writers.nome_arquivo(f"contatos_parte_{i+1:03d}", formato_partes)
         caminho_arquivo = os.path.join(OUTPUT_DIR, nome_arquivo)
-        parte.to_excel(caminho_arquivo, index=False)
+        tamanho_real = output_writers.gravar(parte, caminho_arquivo, formato_partes)
         
-        tamanho_real = os.path.getsize(caminho_arquivo)
         tamanho_real_kb = tamanho_real / 1024
         
         print(f"Parte {i+1}/{total_arquivos}: {nome_arquivo} - {tamanho_real_kb:.0f}KB, {len(parte)} linhas")
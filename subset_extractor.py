@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import lazy_imports
+import output_writers
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Extração de um subconjunto referencialmente completo do banco, guiada pelo grafo de
+# chaves estrangeiras de database_schema, a partir dos estabelecimentos alvo:
+#   1. sementes     - linhas das tabelas com FK para ESTABELECIMENTO nos estabelecimentos alvo
+#   2. dependentes  - linhas das tabelas que apontam para linhas já selecionadas (ex.: parcelas
+#                     dos documentos), enquanto a tabela não tiver FK própria para ESTABELECIMENTO
+#   3. fechamento   - todas as linhas referenciadas pelas selecionadas (pessoas, municípios, UFs...),
+#                     transitivamente, para que nenhuma FK do subconjunto fique sem a linha pai
+# Cada tabela é gravada em um arquivo, em ordem topológica (pais antes dos filhos).
+DIRETORIO_ESQUEMA = 'database_schema'
+ARQUIVO_RELACIONAMENTOS = os.path.join(DIRETORIO_ESQUEMA, 'relationships.txt')
+ARQUIVO_DUMP = os.path.join(DIRETORIO_ESQUEMA, 'dump.sql')
+
+TABELA_RAIZ = 'ESTABELECIMENTO'
+
+OUTPUT_DIR = os.path.join('exported_data', 'subconjunto')
+FORMATO_SUBCONJUNTO = 'csv'
+ARQUIVO_ORDEM = 'ordem_carga.json'
+
+# Linhas por página na leitura paginada pela chave (keyset)
+LINHAS_POR_PAGINA = 50000
+
+# Chaves por consulta com IN (...) parametrizado; o SQL Server aceita até 2100 parâmetros
+CHAVES_POR_CONSULTA = 1000
+
+# Tabelas de um mesmo nível topológico extraídas ao mesmo tempo, cada uma em sua conexão
+MAX_CONSULTAS_SIMULTANEAS = 3
+
+def carregar_esquema(caminho=None):
+    """Colunas e chave primária de cada tabela do dump.sql: {tabela: {'colunas': [...], 'chave': [...]}}"""
+    esquema = {}
+    tabela = None
+    with open(caminho or ARQUIVO_DUMP, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            inicio = re.match(r'CREATE TABLE \[dbo\]\.\[(\w+)\]', linha)
+            if inicio:
+                tabela = inicio.group(1)
+                esquema[tabela] = {'colunas': [], 'chave': []}
+                continue
+            if tabela is None:
+                continue
+            if linha.startswith(')'):
+                tabela = None
+                continue
+            chave = re.match(r'\s+PRIMARY KEY \((.*)\)', linha)
+            if chave:
+                esquema[tabela]['chave'] = re.findall(r'\[(\w+)\]', chave.group(1))
+                continue
+            coluna = re.match(r'\s+\[(\w+)\]', linha)
+            if coluna:
+                esquema[tabela]['colunas'].append(coluna.group(1))
+    return esquema
+
+def carregar_relacionamentos(caminho=None):
+    """FKs do relationships.txt: lista de {'tabela', 'coluna', 'pai', 'coluna_pai'}"""
+    relacionamentos = []
+    tabela = None
+    with open(caminho or ARQUIVO_RELACIONAMENTOS, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            cabecalho = re.match(r'Table: dbo\.(\w+)', linha)
+            if cabecalho:
+                tabela = cabecalho.group(1)
+                continue
+            fk = re.match(r'\s+(\w+) → dbo\.(\w+)\.(\w+)', linha)
+            if fk and tabela:
+                relacionamentos.append({'tabela': tabela, 'coluna': fk.group(1), 'pai': fk.group(2), 'coluna_pai': fk.group(3)})
+    return relacionamentos
+
+def chave_simples(esquema, tabela):
+    """Coluna da chave primária quando ela é de uma coluna só (necessária para paginar e fechar FKs)"""
+    chave = esquema.get(tabela, {}).get('chave', [])
+    return chave[0] if len(chave) == 1 else None
+
+def montar_selecao(esquema, relacionamentos, estabelecimentos):
+    """
+    Predicado SQL das linhas selecionadas por tabela (sementes e dependentes), montado
+    como semi-joins: cada dependente filtra pela chave das linhas já selecionadas do pai.
+    Retorna {tabela: predicado}, na ordem em que as tabelas entraram na seleção.
+    """
+    lista = ','.join(map(str, estabelecimentos))
+    raiz = chave_simples(esquema, TABELA_RAIZ)
+    selecao = {TABELA_RAIZ: f"[{raiz}] IN ({lista})"}
+
+    # Sementes: FKs diretas para a tabela raiz (uma tabela pode ter mais de uma, ex.: origem/destino)
+    sementes = {}
+    for fk in relacionamentos:
+        if fk['pai'] == TABELA_RAIZ and fk['tabela'] != TABELA_RAIZ:
+            sementes.setdefault(fk['tabela'], []).append(f"[{fk['coluna']}] IN ({lista})")
+    for tabela, condicoes in sementes.items():
+        selecao[tabela] = ' OR '.join(condicoes)
+
+    # Dependentes, em largura: cada nível aponta para tabelas já selecionadas
+    nivel = list(selecao)
+    while nivel:
+        novos = {}
+        for fk in relacionamentos:
+            tabela, pai = fk['tabela'], fk['pai']
+            if tabela in selecao or pai not in nivel or chave_simples(esquema, pai) != fk['coluna_pai']:
+                continue
+            novos.setdefault(tabela, []).append(
+                f"[{fk['coluna']}] IN (SELECT [{fk['coluna_pai']}] FROM [{pai}] WHERE {selecao[pai]})")
+        for tabela, condicoes in novos.items():
+            selecao[tabela] = ' OR '.join(condicoes)
+        nivel = list(novos)
+    return selecao
+
+def _em_blocos(valores, tamanho=None):
+    valores = sorted(valores)
+    tamanho = tamanho or CHAVES_POR_CONSULTA
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+def _valores(cursor, consulta, parametros=()):
+    cursor.execute(consulta, *parametros)
+    return {linha[0] for linha in cursor.fetchall() if linha[0] is not None}
+
+def fechar_referencias(conexao, esquema, relacionamentos, selecao):
+    """
+    Fecha o subconjunto pelas FKs: busca as chaves referenciadas pelas linhas selecionadas
+    (só as colunas de FK, não as linhas) e acrescenta as que faltam nas tabelas pai, até
+    não surgir chave nova. Retorna {tabela: chaves extras} além dos predicados de selecao.
+    """
+    cursor = conexao.cursor()
+    fks_por_tabela = {}
+    for fk in relacionamentos:
+        if chave_simples(esquema, fk['pai']) == fk['coluna_pai']:
+            fks_por_tabela.setdefault(fk['tabela'], []).append(fk)
+
+    chaves_selecionadas = {}
+    def selecionadas(tabela):
+        # Chaves que o predicado da tabela já cobre (lidas uma vez, só a coluna da chave)
+        if tabela not in chaves_selecionadas:
+            chave = chave_simples(esquema, tabela)
+            chaves_selecionadas[tabela] = _valores(cursor, f"SELECT [{chave}] FROM [{tabela}] WHERE {selecao[tabela]}") \
+                if tabela in selecao else set()
+        return chaves_selecionadas[tabela]
+
+    extras = {}
+    pendentes = deque((tabela, None) for tabela in selecao)
+    while pendentes:
+        tabela, chaves_novas = pendentes.popleft()
+        necessarias = {}
+        for fk in fks_por_tabela.get(tabela, []):
+            coluna = fk['coluna']
+            if chaves_novas is None:
+                valores = _valores(cursor, f"SELECT DISTINCT [{coluna}] FROM [{tabela}] WHERE ({selecao[tabela]}) AND [{coluna}] IS NOT NULL")
+            else:
+                chave = chave_simples(esquema, tabela)
+                valores = set()
+                for bloco in _em_blocos(chaves_novas):
+                    marcadores = ','.join('?' * len(bloco))
+                    valores |= _valores(cursor, f"SELECT DISTINCT [{coluna}] FROM [{tabela}] WHERE [{chave}] IN ({marcadores})", bloco)
+            necessarias.setdefault(fk['pai'], set()).update(valores)
+
+        for pai, valores in necessarias.items():
+            faltantes = valores - selecionadas(pai) - extras.get(pai, set())
+            if faltantes:
+                extras.setdefault(pai, set()).update(faltantes)
+                pendentes.append((pai, faltantes))
+    return extras
+
+def _componentes_fortes(pais):
+    """Componentes fortemente conexos do grafo tabela -> pais (Tarjan, sem recursão)"""
+    indice, menor, pilha, na_pilha, componentes = {}, {}, [], set(), []
+    for origem in sorted(pais):
+        if origem in indice:
+            continue
+        caminho = [(origem, iter(sorted(pais[origem])))]
+        indice[origem] = menor[origem] = len(indice)
+        pilha.append(origem)
+        na_pilha.add(origem)
+        while caminho:
+            tabela, vizinhos = caminho[-1]
+            proximo = next(vizinhos, None)
+            if proximo is None:
+                caminho.pop()
+                if caminho:
+                    menor[caminho[-1][0]] = min(menor[caminho[-1][0]], menor[tabela])
+                if menor[tabela] == indice[tabela]:
+                    componente = set()
+                    while True:
+                        membro = pilha.pop()
+                        na_pilha.discard(membro)
+                        componente.add(membro)
+                        if membro == tabela:
+                            break
+                    componentes.append(componente)
+            elif proximo not in indice:
+                indice[proximo] = menor[proximo] = len(indice)
+                pilha.append(proximo)
+                na_pilha.add(proximo)
+                caminho.append((proximo, iter(sorted(pais[proximo]))))
+            elif proximo in na_pilha:
+                menor[tabela] = min(menor[tabela], indice[proximo])
+    return componentes
+
+def ordem_topologica(tabelas, relacionamentos):
+    """
+    Níveis de carga: cada tabela vem depois das tabelas que ela referencia. Tabelas do mesmo
+    nível são independentes entre si. Autorreferências são ignoradas; tabelas em um ciclo
+    de FKs entre tabelas diferentes entram juntas no mesmo nível (a carga delas exige FKs
+    desabilitadas ou em duas etapas).
+    """
+    tabelas = set(tabelas)
+    pais = {tabela: set() for tabela in tabelas}
+    for fk in relacionamentos:
+        if fk['tabela'] in tabelas and fk['pai'] in tabelas and fk['tabela'] != fk['pai']:
+            pais[fk['tabela']].add(fk['pai'])
+
+    componentes = _componentes_fortes(pais)
+    for componente in componentes:
+        if len(componente) > 1:
+            print(f"Aviso: ciclo de FKs entre {', '.join(sorted(componente))}")
+
+    # Um ciclo entra inteiro quando todas as tabelas de fora dele que ele referencia já entraram
+    niveis = []
+    carregadas = set()
+    while len(carregadas) < len(tabelas):
+        nivel = set()
+        for componente in componentes:
+            externos = set().union(*(pais[tabela] for tabela in componente)) - componente
+            if not componente & carregadas and externos <= carregadas:
+                nivel |= componente
+        niveis.append(sorted(nivel))
+        carregadas |= nivel
+    return niveis
+
+def _pagina(linhas, colunas):
+    # object mantém inteiros com NULL como inteiros (sem virar 100.0) e decimais como Decimal
+    return pd.DataFrame([tuple(linha) for linha in linhas], columns=colunas, dtype=object)
+
+def _ler_paginas(cursor, tabela, chave, predicado, parametros=()):
+    """Páginas de até LINHAS_POR_PAGINA linhas; com chave simples, paginação pela chave (keyset)"""
+    if chave is None:
+        cursor.execute(f"SELECT * FROM [{tabela}] WHERE {predicado}", *parametros)
+        colunas = [descricao[0] for descricao in cursor.description]
+        while True:
+            linhas = cursor.fetchmany(LINHAS_POR_PAGINA)
+            if not linhas:
+                break
+            yield _pagina(linhas, colunas)
+        return
+
+    ultima = None
+    while True:
+        continuacao = "" if ultima is None else f" AND [{chave}] > ?"
+        cursor.execute(
+            f"SELECT TOP ({LINHAS_POR_PAGINA}) * FROM [{tabela}] WHERE ({predicado}){continuacao} ORDER BY [{chave}]",
+            *parametros, *(() if ultima is None else (ultima,)))
+        colunas = [descricao[0] for descricao in cursor.description]
+        linhas = cursor.fetchall()
+        if not linhas:
+            break
+        # Valor nativo do driver (não o do DataFrame) para o parâmetro da próxima página
+        ultima = linhas[-1][colunas.index(chave)]
+        yield _pagina(linhas, colunas)
+        if len(linhas) < LINHAS_POR_PAGINA:
+            break
+
+def extrair_tabela(tabela, predicado, extras, esquema, destino, formato):
+    """Grava em destino as linhas do predicado e as chaves extras da tabela, página a página"""
+    import export_spreadsheets
+
+    chave = chave_simples(esquema, tabela)
+    total = 0
+    temporario = destino + '.tmp'
+    saida = output_writers.abrir(temporario, formato)
+    try:
+        with export_spreadsheets.get_connection() as conexao:
+            cursor = conexao.cursor()
+            paginas = []
+            if predicado is not None:
+                paginas.append(_ler_paginas(cursor, tabela, chave, predicado))
+            for bloco in _em_blocos(extras):
+                paginas.append(_ler_paginas(cursor, tabela, chave, f"[{chave}] IN ({','.join('?' * len(bloco))})", bloco))
+            for leitura in paginas:
+                for pagina in leitura:
+                    saida.anexar(pagina)
+                    total += len(pagina)
+        if total == 0:
+            saida.anexar(pd.DataFrame(columns=esquema[tabela]['colunas']))
+    finally:
+        saida.fechar()
+    os.replace(temporario, destino)
+    print(f"{tabela}: {total} linhas")
+    return total
+
+def planejar(estabelecimentos, esquema=None, relacionamentos=None):
+    """Seleção por predicados e ordem de carga, sem consultar o banco"""
+    esquema = esquema or carregar_esquema()
+    relacionamentos = relacionamentos or carregar_relacionamentos()
+    selecao = montar_selecao(esquema, relacionamentos, estabelecimentos)
+    return selecao, ordem_topologica(selecao, relacionamentos)
+
+def extrair_subconjunto(estabelecimentos=None, diretorio=None, formato=None):
+    """
+    Extrai o subconjunto dos estabelecimentos (ESTABELECIMENTOS_ALVO da exportação por
+    padrão) para diretorio, um arquivo por tabela, e grava a ordem de carga em
+    ordem_carga.json. Retorna o caminho desse arquivo.
+    """
+    import export_spreadsheets
+
+    estabelecimentos = estabelecimentos or export_spreadsheets.ESTABELECIMENTOS_ALVO
+    diretorio = diretorio or OUTPUT_DIR
+    formato = formato or FORMATO_SUBCONJUNTO
+    os.makedirs(diretorio, exist_ok=True)
+
+    esquema = carregar_esquema()
+    relacionamentos = carregar_relacionamentos()
+    selecao = montar_selecao(esquema, relacionamentos, estabelecimentos)
+    print(f"{len(selecao)} tabelas selecionadas a partir dos estabelecimentos {estabelecimentos}")
+
+    with export_spreadsheets.get_connection() as conexao:
+        extras = fechar_referencias(conexao, esquema, relacionamentos, selecao)
+    print(f"{len(set(extras) - set(selecao))} tabelas adicionadas pelo fechamento das FKs")
+
+    niveis = ordem_topologica(set(selecao) | set(extras), relacionamentos)
+    ordem = []
+    posicao = 0
+    with ThreadPoolExecutor(max_workers=MAX_CONSULTAS_SIMULTANEAS) as executor:
+        for numero, nivel in enumerate(niveis, 1):
+            print(f"\nNível {numero}/{len(niveis)}: {', '.join(nivel)}")
+            destinos = {}
+            for tabela in nivel:
+                posicao += 1
+                destinos[tabela] = os.path.join(diretorio, output_writers.nome_arquivo(f"{posicao:03d}_{tabela}", formato))
+            futuros = {
+                tabela: executor.submit(extrair_tabela, tabela, selecao.get(tabela), extras.get(tabela, set()),
+                                        esquema, destinos[tabela], formato)
+                for tabela in nivel
+            }
+            for tabela in nivel:
+                ordem.append({'tabela': tabela, 'nivel': numero, 'arquivo': os.path.basename(destinos[tabela]),
+                              'linhas': futuros[tabela].result()})
+
+    caminho = os.path.join(diretorio, ARQUIVO_ORDEM)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump({'estabelecimentos': list(estabelecimentos), 'tabelas': ordem}, arquivo, ensure_ascii=False, indent=1)
+    print(f"\nSubconjunto extraído: {len(ordem)} tabelas, {sum(item['linhas'] for item in ordem)} linhas em {diretorio}")
+    return caminho
+
+if __name__ == "__main__":
+    # Uso: python subset_extractor.py [estabelecimento_id ...] [--plano]
+    estabelecimentos = [int(argumento) for argumento in sys.argv[1:] if not argumento.startswith('--')] or None
+    if '--plano' in sys.argv:
+        selecao, niveis = planejar(estabelecimentos or [2, 5])
+        for numero, nivel in enumerate(niveis, 1):
+            print(f"Nível {numero}: {', '.join(nivel)}")
+        print(f"{len(selecao)} tabelas selecionadas (as referenciadas entram no fechamento das FKs, com o banco)")
+    else:
+        print(f"Iniciando extração do subconjunto em {datetime.now().strftime('%H:%M:%S')}")
+        extrair_subconjunto(estabelecimentos)
+        print(f"Extração concluída em {datetime.now().strftime('%H:%M:%S')}")
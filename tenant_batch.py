@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+# Processos do pool compartilhado entre os clientes
+PROCESSOS_PADRAO = 4
+
+# Clientes exportados ao mesmo tempo a partir de um mesmo servidor de banco
+LIMITE_POR_SERVIDOR = 2
+
+RAIZ_SAIDA_PADRAO = 'tenants'
+
+ARQUIVO_LOG = 'execucao.log'
+
+def carregar_tenants(caminho):
+    """
+    Lê a lista de clientes de um JSON: uma lista de objetos (ou {"tenants": [...]}) com
+    nome, servidor, banco, usuario, senha (ou senha_env), estabelecimentos,
+    saida, concorrencia (consultas simultâneas do cliente; 1 = exportação sequencial),
+    retomar (continua a execução interrompida do cliente), todos_contatos
+    (exporta todo o cadastro de pessoas, não só as que têm contas) e estatisticas
+    (estatísticas e planos das consultas no relatório do cliente, para comparar clientes),
+    baixo_impacto (lê de um snapshot em lotes controlados, para bancos em produção) e
+    linhas_por_segundo (orçamento de leitura do modo de baixo impacto; None = sem limite).
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    tenants = dados['tenants'] if isinstance(dados, dict) else dados
+
+    nomes = set()
+    for tenant in tenants:
+        if 'nome' not in tenant:
+            raise ValueError(f"Cliente sem 'nome' na configuração: {tenant}")
+        if tenant['nome'] in nomes:
+            raise ValueError(f"Cliente duplicado na configuração: {tenant['nome']}")
+        nomes.add(tenant['nome'])
+        tenant.setdefault('saida', os.path.join(RAIZ_SAIDA_PADRAO, tenant['nome']))
+        tenant.setdefault('concorrencia', 1)
+        tenant.setdefault('retomar', False)
+        tenant.setdefault('todos_contatos', False)
+        tenant.setdefault('estatisticas', False)
+        tenant.setdefault('baixo_impacto', False)
+        tenant.setdefault('linhas_por_segundo', None)
+        if 'senha_env' in tenant:
+            tenant['senha'] = os.environ[tenant['senha_env']]
+    return tenants
+
+def _aquecer():
+    """Carrega uma vez por processo as dependências pesadas que todos os clientes usam"""
+    import pandas
+    import openpyxl
+    import export_spreadsheets
+    import export_async
+
+class _SaidaRedirecionada:
+    """Redireciona stdout/stderr (inclusive de processos filhos) para o log do cliente"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def __enter__(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.log = open(self.caminho, 'a', encoding='utf-8')
+        self.originais = (os.dup(1), os.dup(2))
+        os.dup2(self.log.fileno(), 1)
+        os.dup2(self.log.fileno(), 2)
+        return self
+
+    def __exit__(self, *excecao):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(self.originais[0], 1)
+        os.dup2(self.originais[1], 2)
+        os.close(self.originais[0])
+        os.close(self.originais[1])
+        self.log.close()
+
+def exportar_tenant(tenant):
+    """Executado em um processo do pool: exporta um cliente dentro da sua raiz de saída"""
+    import export_spreadsheets
+    import export_async
+
+    inicio = time.time()
+    diretorio_original = os.getcwd()
+    saida = os.path.abspath(tenant['saida'])
+    os.makedirs(saida, exist_ok=True)
+
+    export_spreadsheets.configurar_banco(
+        servidor=tenant.get('servidor'), banco=tenant.get('banco'),
+        usuario=tenant.get('usuario'), senha=tenant.get('senha'),
+        estabelecimentos=tenant.get('estabelecimentos'), todos_contatos=tenant['todos_contatos'])
+
+    import query_stats
+    query_stats.CAPTURAR_ESTATISTICAS = tenant['estatisticas']
+    import low_impact_extraction
+    low_impact_extraction.configurar(MODO_BAIXO_IMPACTO=tenant['baixo_impacto'],
+                                     LINHAS_POR_SEGUNDO=tenant['linhas_por_segundo'])
+
+    # Todos os scripts usam caminhos relativos (exported_data, exported_data_split)
+    os.chdir(saida)
+    try:
+        with _SaidaRedirecionada(ARQUIVO_LOG):
+            print(f"Cliente {tenant['nome']} ({tenant.get('servidor')}/{tenant.get('banco')}) iniciado às {datetime.now().strftime('%H:%M:%S')}")
+            if tenant['concorrencia'] > 1:
+                # Os processos de gravação recebem deste processo o banco, os estabelecimentos e o
+                # diretório do cliente (export_async.configuracao_gravacao); o log é o do cliente
+                export_async.MAX_CONSULTAS_SIMULTANEAS = tenant['concorrencia']
+                export_async.LOG_GRAVACAO = os.path.join(saida, ARQUIVO_LOG)
+                sucesso = export_async.executar(tenant['retomar'])
+            else:
+                sucesso = export_spreadsheets.exportar(tenant['retomar'])
+    finally:
+        os.chdir(diretorio_original)
+
+    return {
+        'nome': tenant['nome'],
+        'sucesso': bool(sucesso),
+        'duracao': time.time() - inicio,
+        'log': os.path.join(saida, ARQUIVO_LOG),
+    }
+
+def executar_lote(tenants, processos=PROCESSOS_PADRAO, limite_por_servidor=LIMITE_POR_SERVIDOR):
+    """
+    Exporta todos os clientes em um pool de processos compartilhado. Os processos
+    são reaproveitados entre clientes (importações já carregadas) e no máximo
+    limite_por_servidor clientes de um mesmo servidor rodam ao mesmo tempo.
+    """
+    pendentes = list(tenants)
+    em_execucao = {}
+    por_servidor = {}
+    resultados = []
+
+    with ProcessPoolExecutor(max_workers=processos, initializer=_aquecer) as executor:
+        while pendentes or em_execucao:
+            # Despacha os clientes cujo servidor ainda tem vaga
+            for tenant in list(pendentes):
+                if len(em_execucao) >= processos:
+                    break
+                servidor = tenant.get('servidor')
+                if por_servidor.get(servidor, 0) >= limite_por_servidor:
+                    continue
+                pendentes.remove(tenant)
+                por_servidor[servidor] = por_servidor.get(servidor, 0) + 1
+                em_execucao[executor.submit(exportar_tenant, tenant)] = tenant
+                print(f"Cliente {tenant['nome']} enviado para exportação")
+
+            concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                tenant = em_execucao.pop(futuro)
+                por_servidor[tenant.get('servidor')] -= 1
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    resultado = {'nome': tenant['nome'], 'sucesso': False, 'duracao': None, 'erro': str(e)}
+                resultados.append(resultado)
+                situacao = 'concluído' if resultado['sucesso'] else 'FALHOU'
+                duracao = f" em {resultado['duracao']:.1f}s" if resultado['duracao'] is not None else ''
+                print(f"Cliente {tenant['nome']} {situacao}{duracao}")
+
+    return resultados
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python tenant_batch.py <tenants.json> [processos] [--resume]")
+        sys.exit(1)
+
+    argumentos = [argumento for argumento in sys.argv[1:] if argumento != '--resume']
+    tenants = carregar_tenants(argumentos[0])
+    processos = int(argumentos[1]) if len(argumentos) > 1 else PROCESSOS_PADRAO
+    if '--resume' in sys.argv:
+        for tenant in tenants:
+            tenant['retomar'] = True
+
+    print(f"Exportando {len(tenants)} clientes com {processos} processos às {datetime.now().strftime('%H:%M:%S')}")
+    resultados = executar_lote(tenants, processos)
+
+    falhas = [r for r in resultados if not r['sucesso']]
+    print(f"\n{'='*40}")
+    print(f"Clientes concluídos: {len(resultados) - len(falhas)}/{len(resultados)}")
+    for resultado in falhas:
+        print(f"  - {resultado['nome']}: {resultado.get('erro') or 'ver ' + resultado.get('log', '')}")
+    print(f"{'='*40}")
+    sys.exit(1 if falhas else 0)
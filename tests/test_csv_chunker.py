@@ -0,0 +1,75 @@
+import os
+import errno
+import pytest
+import csv_chunker
+
+def _recusar(codigo):
+    def chamada(*argumentos):
+        raise OSError(codigo, os.strerror(codigo))
+    return chamada
+
+def _copiar(tmp_path, conteudo, inicio, tamanho):
+    origem = tmp_path / 'origem.bin'
+    origem.write_bytes(conteudo)
+    destino = tmp_path / 'destino.bin'
+    with open(origem, 'rb') as entrada, open(destino, 'wb') as saida:
+        csv_chunker.copiar_intervalo(entrada.fileno(), saida.fileno(), inicio, tamanho)
+    return destino.read_bytes()
+
+@pytest.mark.parametrize('codigo', [errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EPERM])
+def test_copy_file_range_recusado_passa_para_sendfile(monkeypatch, tmp_path, codigo):
+    monkeypatch.setattr(os, 'copy_file_range', _recusar(codigo), raising=False)
+    chamadas = []
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile is None:
+        pytest.skip('sem os.sendfile nesta plataforma')
+    monkeypatch.setattr(os, 'sendfile', lambda *argumentos: chamadas.append(argumentos) or sendfile(*argumentos))
+    conteudo = bytes(range(256)) * 1000
+    assert _copiar(tmp_path, conteudo, 10, 200000) == conteudo[10:200010]
+    assert chamadas
+
+def test_sem_copia_pelo_kernel_usa_leitura_e_escrita(monkeypatch, tmp_path):
+    monkeypatch.setattr(os, 'copy_file_range', _recusar(errno.EXDEV), raising=False)
+    monkeypatch.setattr(os, 'sendfile', _recusar(errno.EINVAL), raising=False)
+    monkeypatch.setattr(csv_chunker, 'TAMANHO_BLOCO', 4096)
+    conteudo = os.urandom(50000)
+    assert _copiar(tmp_path, conteudo, 7, 40000) == conteudo[7:40007]
+
+def test_recusa_no_meio_continua_de_onde_parou(monkeypatch, tmp_path):
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    if copy_file_range is None:
+        pytest.skip('sem os.copy_file_range nesta plataforma')
+    chamadas = []
+
+    def primeiro_bloco_e_recusa(origem, destino, tamanho, inicio):
+        chamadas.append(inicio)
+        if len(chamadas) > 1:
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        return copy_file_range(origem, destino, min(tamanho, 1000), inicio)
+
+    monkeypatch.setattr(os, 'copy_file_range', primeiro_bloco_e_recusa)
+    conteudo = os.urandom(10000)
+    assert _copiar(tmp_path, conteudo, 0, 10000) == conteudo
+
+def test_outros_erros_nao_sao_engolidos(monkeypatch, tmp_path):
+    monkeypatch.setattr(os, 'copy_file_range', _recusar(errno.ENOSPC), raising=False)
+    monkeypatch.setattr(os, 'sendfile', _recusar(errno.ENOSPC), raising=False)
+    with pytest.raises(OSError) as erro:
+        _copiar(tmp_path, b'abc\n' * 10, 0, 40)
+    assert erro.value.errno == errno.ENOSPC
+
+def test_dividir_csv_mmap_com_copy_file_range_recusado(monkeypatch, tmp_path):
+    monkeypatch.setattr(os, 'copy_file_range', _recusar(errno.EXDEV), raising=False)
+    registros = [f'{i},"texto\ncom quebra {i}"\n'.encode() for i in range(500)]
+    caminho = tmp_path / 'contatos.csv'
+    caminho.write_bytes(csv_chunker.BOM_UTF8 + b'id,obs\n' + b''.join(registros))
+
+    partes = csv_chunker.dividir_csv_mmap(str(caminho), 2000)
+
+    assert len(partes) > 1
+    corpo = b''
+    for parte in partes:
+        dados = open(parte['caminho'], 'rb').read()
+        assert dados.startswith(csv_chunker.BOM_UTF8 + b'id,obs\n')
+        corpo += dados[len(csv_chunker.BOM_UTF8 + b'id,obs\n'):]
+    assert corpo == b''.join(registros)
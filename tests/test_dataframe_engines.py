@@ -0,0 +1,33 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('polars')
+
+import dataframe_engines
+import split_contas_pagar
+import split_contas_receber
+
+def _contas(linhas=3000):
+    vencimentos = [f'{1 + i % 28:02d}/{1 + i % 12:02d}/2024' for i in range(linhas)]
+    for i in range(0, linhas, 11):
+        vencimentos[i] = ''
+    for i in range(5, linhas, 13):
+        vencimentos[i] = '2024-03-05'  # ISO: a referência lê com dayfirst=True e troca dia e mês
+    return pd.DataFrame({
+        'Id': range(linhas),
+        'Data Emissao': [f'{1 + i % 28:02d}/01/2024' for i in range(linhas)],
+        'Data vencimento': vencimentos,
+        'Valor documento': [None if i % 17 == 0 else i * 1.5 for i in range(linhas)],
+        'Situacao': ['Liquidado' if i % 3 == 0 else ('LIQUIDADO' if i % 3 == 1 else None) for i in range(linhas)],
+        'Historico': [f'parcela {i}' if i % 7 else '' for i in range(linhas)],
+        'Estabelecimento_id': [2 if i % 4 else (5 if i % 8 else 9) for i in range(linhas)],
+    })
+
+@pytest.mark.parametrize('modulo', [split_contas_pagar, split_contas_receber])
+def test_polars_igual_ao_vetorizado(modulo):
+    df = _contas()
+    esperado = dataframe_engines.obter_motor('vetorizado').preparar_contas(df, modulo.COLUNAS_TEMPLATE, modulo.ESTABELECIMENTOS_ALVO)
+    obtido = dataframe_engines.obter_motor('polars').preparar_contas(df, modulo.COLUNAS_TEMPLATE, modulo.ESTABELECIMENTOS_ALVO)
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert set(obtido['mes']) == set(range(1, 13)) | {'sem_data'}
+    assert set(obtido['Situacao']) == {'paga', ''}
@@ -0,0 +1,43 @@
+import os
+import pytest
+
+duckdb = pytest.importorskip('duckdb')
+pd = pytest.importorskip('pandas')
+
+import duckdb_split
+
+MESES = {1: 'janeiro', 2: 'fevereiro'}
+
+def _contas(linhas=5000):
+    return pd.DataFrame({
+        'Id': range(linhas),
+        'Estabelecimento_id': [2 if i % 3 else 5 for i in range(linhas)],
+        'Historico': [f'parcela {i}' for i in range(linhas)],
+        'mes': [1 + i % 2 for i in range(linhas)],
+    })
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+def test_todas_as_linhas_em_um_arquivo_por_parte_na_ordem_original(tmp_path, formato):
+    df = _contas()
+    criados = duckdb_split.dividir_particoes(df, MESES, 'contas_a_pagar', 300, formato, str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(caminho) for caminho in criados)
+    lidos = []
+    for caminho in criados:
+        parte = duckdb.read_parquet(caminho).df() if formato == 'parquet' else pd.read_csv(caminho, encoding='utf-8-sig')
+        assert 0 < len(parte) <= 300
+        assert parte['Id'].is_monotonic_increasing
+        assert parte['Estabelecimento_id'].nunique() == 1
+        lidos.append(parte)
+
+    todos = pd.concat(lidos)
+    assert sorted(todos['Id']) == list(df['Id'])
+    esperado = df.set_index('Id')['mes'].map(MESES)
+    for caminho, parte in zip(criados, lidos):
+        assert set(esperado[parte['Id']]) == {os.path.basename(caminho).split('_')[5].split('.')[0]}
+
+def test_csv_com_bom(tmp_path):
+    criados = duckdb_split.dividir_particoes(_contas(10), MESES, 'contas_a_pagar', 300, 'csv', str(tmp_path))
+    for caminho in criados:
+        with open(caminho, 'rb') as arquivo:
+            assert arquivo.read(3) == duckdb_split.BOM_UTF8
@@ -0,0 +1,79 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import export_async
+import export_spreadsheets
+import run_journal
+import split_by_date
+
+def _contas_pagar(estabelecimento, linhas=40):
+    return pd.DataFrame({
+        'ID': range(1, linhas + 1),
+        'Fornecedor': [f'Fornecedor {i}' for i in range(linhas)],
+        'Data emissao': pd.Timestamp('2024-01-01'),
+        'Data vencimento': [pd.Timestamp(2024, 1 + i % 3, 10) for i in range(linhas)],
+        'Data Liquidacao': pd.NaT,
+        'Valor documento': 100.0,
+        'Saldo': 100.0,
+        'Situação': 'Em Aberto',
+        'Numero documento': [str(i) for i in range(linhas)],
+        'Categoria': 'Fornecedores',
+        'Historico': 'teste',
+        'Pago': 0,
+        'Competencia': '01/2024',
+        'Forma Pagamento': 'Boleto',
+        'Estabelecimento_id': estabelecimento,
+    })
+
+@pytest.fixture
+def saida(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    export_spreadsheets.garantir_diretorios()
+    yield tmp_path
+    export_spreadsheets.configurar_banco()
+    run_journal.finalizar()
+
+def _contexto():
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+def test_processo_de_gravacao_recebe_as_configuracoes_do_principal(saida, monkeypatch):
+    export_spreadsheets.configurar_banco(estabelecimentos=[7])
+    monkeypatch.setattr(split_by_date, 'MODO_COMPLETO', 'sempre')
+    run_journal.iniciar()
+    df, chaves = export_spreadsheets.preparar_exportacao(
+        _contas_pagar(7), export_spreadsheets.colunas_contas_pagar, 'contas_pagar')
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=_contexto(),
+                             initializer=export_async._iniciar_processo_gravacao,
+                             initargs=(export_async.configuracao_gravacao(),)) as executor:
+        tipo_arquivo, partes = executor.submit(export_async._gravar_e_dividir, df, 'contas_pagar', chaves).result()
+
+    arquivos = os.listdir(saida / 'exported_data_split')
+    assert tipo_arquivo == 'contas_pagar'
+    assert any(arquivo.startswith('contas_a_pagar_est_7_') for arquivo in arquivos)
+    # MODO_COMPLETO='sempre': o completo já existe quando a tarefa termina
+    assert 'contas_a_pagar_completo.xlsx' in arquivos
+    gravadas = {registro['caminho'] for registro in partes}
+    assert os.path.join('exported_data_split', 'contas_a_pagar_completo.xlsx') in gravadas
+    assert any(os.path.basename(caminho).startswith('contas_a_pagar_est_7_') for caminho in gravadas)
+
+    run_journal.incorporar_partes(partes)
+    for caminho in gravadas:
+        assert run_journal.parte_concluida(caminho) is not None
+
+def test_processo_de_gravacao_confere_partes_do_jornal(saida):
+    run_journal.iniciar()
+    caminho = os.path.join('exported_data_split', 'parte.csv')
+    with open(caminho, 'w') as arquivo:
+        arquivo.write('a\n1\n')
+    run_journal.registrar_parte(caminho, os.path.getsize(caminho))
+    estado = run_journal.estado_auxiliar()
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=_contexto(),
+                             initializer=run_journal.iniciar_auxiliar, initargs=(estado,)) as executor:
+        assert executor.submit(run_journal.parte_concluida, caminho).result() == os.path.getsize(caminho)
@@ -0,0 +1,34 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import output_writers
+import partition_index
+
+def _contas(linhas=400):
+    vencimentos = [f'{1 + i % 28:02d}/{1 + i % 12:02d}/2024' if i % 7 else '' for i in range(linhas)]
+    return pd.DataFrame({
+        'Id': range(linhas),
+        'Data emissao': [f'{1 + i % 28:02d}/01/2024' for i in range(linhas)],
+        'Data vencimento': vencimentos,
+        'Estabelecimento_id': [2 if i % 3 else 5 for i in range(linhas)],
+    })
+
+@pytest.mark.parametrize('formato', ['csv', 'xlsx'])
+@pytest.mark.parametrize('estabelecimento, mes', [(2, 3), (5, 'sem_data'), (None, 1), (5, None), (9, None)])
+def test_le_so_as_linhas_das_particoes(tmp_path, formato, estabelecimento, mes):
+    df, chaves = partition_index.ordenar_por_particao(_contas())
+    caminho = str(tmp_path / f'contas_a_pagar.{formato}')
+    output_writers.gravar(df, caminho, formato)
+    partition_index.salvar_indice(caminho, chaves)
+
+    lido = partition_index.ler_particao(caminho, estabelecimento, mes)
+
+    selecionado = pd.Series(True, index=df.index)
+    if estabelecimento is not None:
+        selecionado &= chaves['estabelecimento_id'] == estabelecimento
+    if mes == 'sem_data':
+        selecionado &= chaves['mes'] == 'sem_data'
+    elif mes is not None:
+        selecionado &= chaves['mes'].str[5:] == f'{mes:02d}'
+    assert list(lido['Id']) == list(df.loc[selecionado, 'Id'])
@@ -0,0 +1,38 @@
+import export_spreadsheets
+import result_cache
+
+class ConexaoFalsa:
+    """Conta as consultas de token por tabela"""
+    def __init__(self):
+        self.consultas = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        self.consultas.append(sql.rsplit('[', 1)[1].rstrip(']'))
+
+    def fetchone(self):
+        return (10, 123)
+
+CONSULTAS = [
+    export_spreadsheets.consulta_contas_pagar(),
+    export_spreadsheets.consulta_contas_receber(True),
+    export_spreadsheets.consulta_contatos(),
+]
+
+def test_cada_tabela_lida_uma_vez_por_execucao():
+    conexao = ConexaoFalsa()
+    result_cache.iniciar_execucao()
+    tokens = [result_cache.token_mudanca(conexao, sql, 'servidor/banco') for sql in CONSULTAS]
+
+    tabelas = set().union(*(result_cache.tabelas_da_consulta(sql) for sql in CONSULTAS))
+    assert sorted(conexao.consultas) == sorted(tabelas)
+    assert tokens[0]['DOC_FINANCEIRO'] == tokens[2]['DOC_FINANCEIRO'] == ['10', '123']
+
+    # Outro banco e a próxima execução leem as tabelas de novo
+    result_cache.token_mudanca(conexao, CONSULTAS[0], 'servidor/outro')
+    result_cache.iniciar_execucao()
+    result_cache.token_mudanca(conexao, CONSULTAS[0], 'servidor/banco')
+    assert len(conexao.consultas) == len(tabelas) + 2 * len(result_cache.tabelas_da_consulta(CONSULTAS[0]))
+    result_cache.iniciar_execucao()
@@ -0,0 +1,45 @@
+import os
+import json
+import pytest
+
+import run_journal
+
+@pytest.fixture
+def jornal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_journal, 'DIRETORIO_CHECKPOINT', str(tmp_path / '.checkpoint'))
+    run_journal.iniciar()
+    yield tmp_path
+    run_journal.finalizar()
+
+def _gravar_partes(quantidade):
+    caminhos = []
+    for i in range(quantidade):
+        caminho = f'parte_{i}.csv'
+        with open(caminho, 'w') as arquivo:
+            arquivo.write(f'Id\n{i}\n')
+        run_journal.registrar_parte(caminho, os.path.getsize(caminho))
+        caminhos.append(caminho)
+    return caminhos
+
+def test_partes_acrescentadas_ao_registro_sem_reescrever_o_jornal(jornal):
+    caminhos = _gravar_partes(50)
+
+    with open(jornal / '.checkpoint' / run_journal.ARQUIVO_JORNAL, encoding='utf-8') as arquivo:
+        assert 'partes' not in json.load(arquivo)
+    with open(jornal / '.checkpoint' / run_journal.ARQUIVO_PARTES, encoding='utf-8') as arquivo:
+        assert [json.loads(linha)['caminho'] for linha in arquivo] == caminhos
+
+def test_retomada_le_as_partes_e_ignora_linha_cortada(jornal):
+    caminhos = _gravar_partes(3)
+    # Parte gravada por um processo auxiliar, registrada pelo principal
+    with open('auxiliar.csv', 'w') as arquivo:
+        arquivo.write('Id\n9\n')
+    run_journal.incorporar_partes([run_journal._registro_arquivo('auxiliar.csv')])
+    with open(jornal / '.checkpoint' / run_journal.ARQUIVO_PARTES, 'a', encoding='utf-8') as arquivo:
+        arquivo.write('{"caminho": "parte_')
+
+    run_journal.iniciar(retomar=True)
+
+    assert all(run_journal.parte_concluida(caminho) for caminho in caminhos + ['auxiliar.csv'])
+    assert len(run_journal._jornal['partes']) == 4
@@ -0,0 +1,37 @@
+import os
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import output_writers
+import split_contas_pagar
+import split_contas_receber
+
+DIVISORES = [
+    (split_contas_pagar, split_contas_pagar.dividir_contas_pagar, 'contas_pagar'),
+    (split_contas_receber, split_contas_receber.dividir_contas_receber, 'contas_receber'),
+]
+
+@pytest.fixture
+def diretorios(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('exported_data')
+    return tmp_path
+
+@pytest.mark.parametrize('em_disco', [False, True])
+@pytest.mark.parametrize('modulo, dividir, tipo', DIVISORES)
+def test_meses_e_sem_data_no_mesmo_estabelecimento(diretorios, modulo, dividir, tipo, em_disco):
+    # Vencimentos em branco viram o mês 'sem_data', ordenado depois dos meses numéricos
+    vencimentos = ['10/01/2024', '', '15/02/2024', None, '20/01/2024']
+    df = pd.DataFrame({
+        'Id': range(len(vencimentos)),
+        'Data vencimento': vencimentos,
+        'Estabelecimento_id': [2] * len(vencimentos),
+    })
+    df.to_excel(os.path.join('exported_data', output_writers.arquivo_exportacao(tipo)), index=False)
+
+    dividir(em_disco=em_disco)
+
+    prefixo = os.path.basename(output_writers.arquivo_exportacao(tipo)).split('.')[0]
+    assert sorted(os.listdir(modulo.OUTPUT_DIR)) == sorted(
+        f'{prefixo}_est_2_{mes}.xlsx' for mes in ['jan', 'fev', 'sem_data'])
@@ -0,0 +1,47 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+
+pytest.importorskip('pandas')
+
+import export_async
+import export_spreadsheets
+import tenant_batch
+
+def _estado_do_processo():
+    import split_contas_pagar
+    print('processo de gravação')
+    return list(split_contas_pagar.ESTABELECIMENTOS_ALVO), os.getcwd()
+
+def _executar_em_pool(retomar=False):
+    """Substitui export_async.executar: só cria o pool de gravação e lê o estado de um processo"""
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto,
+                             initializer=export_async._iniciar_processo_gravacao,
+                             initargs=(export_async.configuracao_gravacao(),)) as executor:
+        _executar_em_pool.estados.append(executor.submit(_estado_do_processo).result())
+    return True
+
+def test_clientes_assincronos_levam_a_propria_configuracao_ao_pool(tmp_path, monkeypatch):
+    _executar_em_pool.estados = []
+    monkeypatch.setattr(export_async, 'executar', _executar_em_pool)
+    monkeypatch.setattr(export_async, 'LOG_GRAVACAO', None)
+    tenants = [
+        {'nome': 'a', 'saida': str(tmp_path / 'a'), 'estabelecimentos': [7], 'concorrencia': 2},
+        {'nome': 'b', 'saida': str(tmp_path / 'b'), 'concorrencia': 2},
+    ]
+    for tenant in tenants:
+        tenant.update({'retomar': False, 'todos_contatos': False, 'estatisticas': False,
+                       'baixo_impacto': False, 'linhas_por_segundo': None})
+    try:
+        resultados = [tenant_batch.exportar_tenant(tenant) for tenant in tenants]
+    finally:
+        export_spreadsheets.configurar_banco()
+
+    assert all(resultado['sucesso'] for resultado in resultados)
+    assert _executar_em_pool.estados == [([7], str(tmp_path / 'a')), ([2, 5], str(tmp_path / 'b'))]
+    for nome in ('a', 'b'):
+        with open(tmp_path / nome / tenant_batch.ARQUIVO_LOG, encoding='utf-8') as log:
+            assert 'processo de gravação' in log.read()
@@ -0,0 +1,372 @@
+import os
+import json
+from contextlib import contextmanager
+import lazy_imports
+import financial_schema
+import output_writers
+import document_engine
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Colunas obrigatórias verificadas por entidade (regras de nulos)
+COLUNAS_IMPORTANTES = {
+    'contas_pagar': ['Data emissao', 'Data vencimento', 'Valor documento', 'Fornecedor', 'Estabelecimento_id'],
+    'contas_receber': ['Data Emissao', 'Data vencimento', 'Valor documento', 'Cliente', 'Estabelecimento_id'],
+    'contatos': ['Nome', 'CNPJ / CPF', 'Situação'],
+}
+
+# Coluna de documento dos contatos, como sai da exportação
+COLUNA_DOCUMENTO = 'CNPJ / CPF'
+
+# Índice único de erros (entidade -> regra -> contagem e IDs dos registros)
+ARQUIVO_INDICE_ERROS = 'erros_indice.json'
+
+# Categorias exibidas no resumo final, na ordem de exibição
+CATEGORIAS_RESUMO = ['nulos', 'datas_futuro', 'datas_antigas', 'inconsistencias']
+
+# Limites para datas suspeitas (possíveis erros de digitação)
+ANOS_LIMITE_FUTURO = 10
+ANOS_LIMITE_PASSADO = 20
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def _primeira_coluna(df, alternativas):
+    for coluna in alternativas:
+        if coluna in df.columns:
+            return coluna
+    return None
+
+def coluna_data_principal(df, tipo_arquivo):
+    """Coluna de data usada nas verificações de intervalo de datas"""
+    if tipo_arquivo in ['contas_pagar', 'contas_receber']:
+        return _primeira_coluna(df, ['Data emissao', 'Data Emissao'])
+    colunas_data = [col for col in df.columns if 'data' in col.lower()]
+    return colunas_data[0] if colunas_data else None
+
+def _regra_nulos(coluna):
+    return {
+        'nome': f'nulos_{coluna}',
+        'categoria': 'nulos',
+        'colunas': [coluna],
+        'avaliar': lambda df, ctx: df[coluna].isnull(),
+        'relatorio': f'erros_nulos_{{entidade}}_{coluna.replace(" ", "_").replace("/", "_")}',
+        'mensagem': f"Aviso: Encontrados {{n}} registros com valor nulo na coluna '{coluna}'",
+    }
+
+def _regra_data_anterior(nome, coluna_data, descricao):
+    def avaliar(df, ctx):
+        emissao = df[ctx['data_emissao']]
+        outra = df[coluna_data]
+        return emissao.notnull() & outra.notnull() & (outra < emissao)
+    return {
+        'nome': nome,
+        'categoria': 'inconsistencias',
+        'colunas': [coluna_data],
+        'requer_contexto': ['data_emissao'],
+        'avaliar': avaliar,
+        'relatorio': f'erros_inconsistencia_{{entidade}}_{nome}',
+        'mensagem': f"Aviso: Encontrados {{n}} registros onde a data de {descricao} é anterior à data de emissão",
+    }
+
+def _regra_intervalo_datas(nome, categoria, comparar, descricao):
+    def avaliar(df, ctx):
+        return comparar(df[ctx['data_principal']], ctx)
+    return {
+        'nome': nome,
+        'categoria': categoria,
+        'colunas': [],
+        'requer_contexto': ['data_principal'],
+        'avaliar': avaliar,
+        'relatorio': f'erros_{nome}_{{data_principal}}',
+        'mensagem': f"Aviso: Encontradas {{n}} datas {descricao}. Essas datas podem ser erros de digitação.",
+    }
+
+def _documento_invalido(df, ctx):
+    documentos = ctx['documentos']
+    return pd.Series(documentos['preenchido'] & ~documentos['valido'], index=df.index)
+
+def _documento_repetido(df, ctx):
+    # Índice por hash dos documentos já vistos, mantido entre os lotes do validador
+    marcados = document_engine.marcar_repetidos(document_engine.chaves_indice(ctx['documentos']), ctx['documentos_vistos'])
+    return pd.Series(marcados, index=df.index)
+
+def montar_regras(tipo_arquivo):
+    """Lista de regras de validação de uma entidade, na ordem dos relatórios"""
+    regras = [_regra_nulos(coluna) for coluna in COLUNAS_IMPORTANTES.get(tipo_arquivo, [])]
+
+    if tipo_arquivo in ['contas_pagar', 'contas_receber']:
+        regras.append(_regra_data_anterior('vencimento_anterior_emissao', 'Data vencimento', 'vencimento'))
+        regras.append(_regra_data_anterior('liquidacao_anterior_emissao', 'Data Liquidacao', 'liquidação'))
+        regras.append({
+            'nome': 'valor_documento_invalido',
+            'categoria': 'inconsistencias',
+            'colunas': ['Valor documento'],
+            'avaliar': lambda df, ctx: df['Valor documento'].le(0).fillna(False),
+            'relatorio': 'erros_inconsistencia_{entidade}_valor_documento_invalido',
+            'mensagem': "Aviso: Encontrados {n} registros com valor de documento zero ou negativo",
+        })
+    elif tipo_arquivo == 'contatos':
+        regras.append({
+            'nome': 'cpf_cnpj_invalido',
+            'categoria': 'inconsistencias',
+            'colunas': [COLUNA_DOCUMENTO],
+            'requer_contexto': ['documentos'],
+            'avaliar': _documento_invalido,
+            'relatorio': 'erros_inconsistencia_{entidade}_cpf_cnpj_invalido',
+            'mensagem': "Aviso: Encontrados {n} registros com CPF/CNPJ inválido (tamanho ou dígito verificador)",
+        })
+        regras.append({
+            'nome': 'cpf_cnpj_repetido',
+            'categoria': 'inconsistencias',
+            'colunas': [COLUNA_DOCUMENTO],
+            'requer_contexto': ['documentos'],
+            'avaliar': _documento_repetido,
+            'relatorio': 'erros_inconsistencia_{entidade}_cpf_cnpj_repetido',
+            'mensagem': "Aviso: Encontrados {n} contatos com o mesmo CPF/CNPJ de um contato anterior (possíveis duplicados)",
+        })
+
+    regras.append(_regra_intervalo_datas(
+        'datas_futuras', 'datas_futuro',
+        lambda serie, ctx: serie > ctx['limite_futuro'],
+        f'além de {ANOS_LIMITE_FUTURO} anos no futuro'))
+    regras.append(_regra_intervalo_datas(
+        'datas_antigas', 'datas_antigas',
+        lambda serie, ctx: serie < ctx['limite_passado'],
+        f'anteriores a {ANOS_LIMITE_PASSADO} anos atrás'))
+
+    return regras
+
+def avaliar_regras(df, regras, ctx):
+    """
+    Avalia todas as regras sobre um lote em uma única passada e devolve um
+    DataFrame de máscaras booleanas, uma coluna por regra aplicável.
+    As regras de nulos são avaliadas antes da conversão das datas, para que
+    valores não interpretáveis não sejam contados como nulos.
+    """
+    mascaras = {}
+    aplicaveis = [
+        regra for regra in regras
+        if all(coluna in df.columns for coluna in regra['colunas'])
+        and all(ctx.get(chave) for chave in regra.get('requer_contexto', []))
+    ]
+
+    for regra in aplicaveis:
+        if regra['categoria'] == 'nulos':
+            mascaras[regra['nome']] = regra['avaliar'](df, ctx)
+
+    # As planilhas exportadas trazem as datas como DD/MM/YYYY; fixar dayfirst
+    # evita que cada lote infira um formato diferente a partir da primeira linha
+    for coluna in ctx['colunas_data']:
+        if not pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce', dayfirst=True)
+
+    for regra in aplicaveis:
+        if regra['categoria'] != 'nulos':
+            mascaras[regra['nome']] = regra['avaliar'](df, ctx)
+
+    return pd.DataFrame(mascaras, index=df.index, dtype=bool)
+
+class Validador:
+    """
+    Motor de validação de uma entidade. Pode receber o DataFrame inteiro ou
+    lotes sucessivos (modo streaming): os registros com erro de cada regra são
+    anexados aos relatórios à medida que os lotes chegam, em qualquer formato
+    do registro de escritores (o xlsx também é gravado em streaming).
+    """
+
+    def __init__(self, tipo_arquivo, diretorio_saida, formato=None):
+        self.tipo_arquivo = tipo_arquivo
+        self.diretorio_saida = diretorio_saida
+        self.formato = formato or output_writers.formato_saida(tipo_arquivo, 'relatorios')
+        self.regras = montar_regras(tipo_arquivo)
+        self.contagens = {regra['nome']: 0 for regra in self.regras}
+        self.ids_erros = {regra['nome']: [] for regra in self.regras}
+        self.relatorios = {}
+        self._saidas = {}
+        hoje = pd.Timestamp.now()
+        self.limite_futuro = hoje + pd.DateOffset(years=ANOS_LIMITE_FUTURO)
+        self.limite_passado = hoje - pd.DateOffset(years=ANOS_LIMITE_PASSADO)
+        self.documentos_vistos = set()
+
+    def _contexto(self, df):
+        data_emissao = _primeira_coluna(df, ['Data emissao', 'Data Emissao'])
+        data_principal = coluna_data_principal(df, self.tipo_arquivo)
+        colunas_data = []
+        if self.tipo_arquivo in ['contas_pagar', 'contas_receber']:
+            colunas_data = [c for c in [data_emissao, 'Data vencimento', 'Data Liquidacao'] if c and c in df.columns]
+        if data_principal and data_principal not in colunas_data:
+            colunas_data.append(data_principal)
+        documentos = None
+        if self.tipo_arquivo == 'contatos' and COLUNA_DOCUMENTO in df.columns:
+            documentos = document_engine.analisar(df[COLUNA_DOCUMENTO], document_engine.mascara_juridica(df))
+        return {
+            'documentos': documentos,
+            'documentos_vistos': self.documentos_vistos,
+            'data_emissao': data_emissao,
+            'data_principal': data_principal,
+            'colunas_data': colunas_data,
+            'limite_futuro': self.limite_futuro,
+            'limite_passado': self.limite_passado,
+        }
+
+    def _caminho_relatorio(self, regra, ctx):
+        nome = regra['relatorio'].format(
+            entidade=self.tipo_arquivo,
+            data_principal=(ctx['data_principal'] or '').replace(' ', '_'))
+        return os.path.join(self.diretorio_saida, output_writers.nome_arquivo(nome, self.formato))
+
+    def processar(self, df):
+        """Valida um lote e devolve as máscaras de erro por regra"""
+        ctx = self._contexto(df)
+        mascaras = avaliar_regras(df, self.regras, ctx)
+
+        for regra in self.regras:
+            nome = regra['nome']
+            if nome not in mascaras.columns or not mascaras[nome].any():
+                continue
+            registros = financial_schema.materializar(df[mascaras[nome]])
+            self.contagens[nome] += len(registros)
+            self.ids_erros[nome].extend(_ids_registros(registros))
+            caminho = self._caminho_relatorio(regra, ctx)
+
+            if caminho not in self._saidas:
+                self._saidas[caminho] = output_writers.abrir(caminho, self.formato)
+            self._saidas[caminho].anexar(registros)
+            self.relatorios[caminho] = regra
+
+        return mascaras
+
+    def finalizar(self):
+        """Grava os relatórios pendentes e imprime o resumo das regras violadas"""
+        for saida in self._saidas.values():
+            saida.fechar()
+        self._saidas = {}
+
+        for caminho, regra in self.relatorios.items():
+            n = self.contagens[regra['nome']]
+            print(regra['mensagem'].format(n=n))
+            print(f"  Registros com erro '{regra['nome']}' salvos em: {caminho}")
+
+        self.salvar_indice()
+        return self.contagens
+
+    def salvar_indice(self):
+        """Grava as contagens desta entidade no índice de erros do diretório de saída"""
+        caminho = os.path.join(self.diretorio_saida, ARQUIVO_INDICE_ERROS)
+        with _travar_indice(caminho):
+            self._atualizar_indice(caminho)
+
+    def _atualizar_indice(self, caminho):
+        indice = carregar_indice_erros(self.diretorio_saida)
+        relatorios = {regra['nome']: caminho_rel for caminho_rel, regra in self.relatorios.items()}
+        indice[self.tipo_arquivo] = {
+            regra['nome']: {
+                'categoria': regra['categoria'],
+                'quantidade': self.contagens[regra['nome']],
+                'relatorio': relatorios.get(regra['nome']),
+                'ids': self.ids_erros[regra['nome']],
+            }
+            for regra in self.regras if self.contagens[regra['nome']] > 0
+        }
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(indice, arquivo, ensure_ascii=False, default=str)
+        os.replace(temporario, caminho)
+
+@contextmanager
+def _travar_indice(caminho):
+    """Trava exclusiva do índice de erros, pois entidades podem ser validadas em processos paralelos"""
+    if fcntl is None:
+        yield
+        return
+    with open(caminho + '.lock', 'w') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+def _ids_registros(registros):
+    """IDs dos registros com erro (coluna Id/ID ou, na falta dela, o índice)"""
+    coluna_id = _primeira_coluna(registros, ['Id', 'ID'])
+    ids = registros[coluna_id] if coluna_id else registros.index.to_series()
+    return ids.astype(object).where(ids.notna(), None).tolist()
+
+def carregar_indice_erros(diretorio_saida):
+    """Lê o índice de erros gravado pelos validadores (vazio se ainda não existir)"""
+    caminho = os.path.join(diretorio_saida, ARQUIVO_INDICE_ERROS)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def resumir_indice(indice, entidades):
+    """Totaliza o índice de erros por entidade e categoria do resumo"""
+    resumo = {entidade: {categoria: 0 for categoria in CATEGORIAS_RESUMO} for entidade in entidades}
+    for entidade, regras in indice.items():
+        if entidade not in resumo:
+            continue
+        for info in regras.values():
+            resumo[entidade][info['categoria']] = resumo[entidade].get(info['categoria'], 0) + info['quantidade']
+    return resumo
+
+def validar(df, tipo_arquivo, diretorio_saida, formato=None):
+    """Valida o DataFrame inteiro de uma vez e grava os relatórios de erro"""
+    validador = Validador(tipo_arquivo, diretorio_saida, formato)
+    validador.processar(df)
+    validador.finalizar()
+    return validador
+
+def validar_arquivo_em_lotes(caminho, tipo_arquivo, diretorio_saida, tamanho_lote=50000, formato=None):
+    """Valida um arquivo CSV ou xlsx em lotes, sem carregá-lo inteiro em memória"""
+    validador = Validador(tipo_arquivo, diretorio_saida, formato)
+    for lote in ler_em_lotes(caminho, tamanho_lote):
+        if tipo_arquivo in ['contas_pagar', 'contas_receber']:
+            lote = financial_schema.aplicar_esquema(lote)
+        validador.processar(lote)
+    validador.finalizar()
+    return validador
+
+def ler_em_lotes(caminho, tamanho_lote):
+    """Lê um CSV ou xlsx em DataFrames de até tamanho_lote linhas"""
+    if caminho.endswith('.csv'):
+        yield from pd.read_csv(caminho, chunksize=tamanho_lote)
+        return
+
+    from openpyxl import load_workbook
+    planilha = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = planilha.active.iter_rows(values_only=True)
+        cabecalho = list(next(linhas, []))
+        lote = []
+        inicio = 0
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                yield pd.DataFrame(lote, columns=cabecalho, index=range(inicio, inicio + len(lote)))
+                inicio += len(lote)
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=cabecalho, index=range(inicio, inicio + len(lote)))
+    finally:
+        planilha.close()
+
+if __name__ == "__main__":
+    import sys
+    from datetime import datetime
+
+    if len(sys.argv) < 3:
+        print("Uso: python validation_engine.py <contas_pagar|contas_receber|contatos> <arquivo> [tamanho_lote]")
+        sys.exit(1)
+
+    tipo_arquivo, arquivo = sys.argv[1], sys.argv[2]
+    tamanho_lote = int(sys.argv[3]) if len(sys.argv) > 3 else 50000
+    diretorio_saida = 'exported_data_split'
+    os.makedirs(diretorio_saida, exist_ok=True)
+
+    print(f"Iniciando validação em lotes de {tamanho_lote} linhas às {datetime.now().strftime('%H:%M:%S')}")
+    validador = validar_arquivo_em_lotes(arquivo, tipo_arquivo, diretorio_saida, tamanho_lote)
+    print(f"Validação concluída às {datetime.now().strftime('%H:%M:%S')}: {sum(validador.contagens.values())} erros encontrados")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import os
+import sys
+import glob
+import shutil
+import tempfile
+from datetime import datetime
+import pandas as pd
+import dataframe_engines
+import duckdb_split
+import split_contas_pagar
+import split_contas_receber
+
+DIVISORES = {
+    'pagar': (split_contas_pagar, split_contas_pagar.dividir_contas_pagar),
+    'receber': (split_contas_receber, split_contas_receber.dividir_contas_receber),
+}
+
+def dividir_com_motor(tipo_conta, motor, diretorio_saida):
+    """
+    Executa o divisor de contas com o motor informado, gravando as partes em diretorio_saida.
+    'duckdb' usa o motor vetorizado na preparação e a divisão em SQL do duckdb_split.
+    """
+    modulo, dividir = DIVISORES[tipo_conta]
+    motor_anterior, saida_anterior, duckdb_anterior = dataframe_engines.MOTOR, modulo.OUTPUT_DIR, duckdb_split.USAR_DUCKDB
+    dataframe_engines.MOTOR = 'vetorizado' if motor == 'duckdb' else motor
+    duckdb_split.USAR_DUCKDB = motor == 'duckdb'
+    modulo.OUTPUT_DIR = diretorio_saida
+    try:
+        dividir()
+    finally:
+        dataframe_engines.MOTOR = motor_anterior
+        duckdb_split.USAR_DUCKDB = duckdb_anterior
+        modulo.OUTPUT_DIR = saida_anterior
+
+def ler_parte(caminho):
+    return pd.read_excel(caminho) if caminho.endswith('.xlsx') else pd.read_csv(caminho)
+
+def comparar_partes(diretorio_referencia, diretorio_motor):
+    """Compara nomes e conteúdo das partes geradas pelos dois motores; retorna a lista de diferenças"""
+    referencia = {os.path.basename(caminho) for caminho in glob.glob(os.path.join(diretorio_referencia, '*'))}
+    motor = {os.path.basename(caminho) for caminho in glob.glob(os.path.join(diretorio_motor, '*'))}
+    diferencas = [f"Parte só na referência: {nome}" for nome in sorted(referencia - motor)]
+    diferencas += [f"Parte só no motor: {nome}" for nome in sorted(motor - referencia)]
+
+    for nome in sorted(referencia & motor):
+        if nome.endswith('.json'):
+            continue
+        try:
+            pd.testing.assert_frame_equal(
+                ler_parte(os.path.join(diretorio_referencia, nome)),
+                ler_parte(os.path.join(diretorio_motor, nome)),
+                check_dtype=False)
+        except AssertionError as e:
+            diferencas.append(f"Conteúdo diferente em {nome}: {str(e).splitlines()[0]}")
+    return diferencas, len(referencia & motor)
+
+def verificar_equivalencia(tipo_conta, motor):
+    print(f"\n{'=' * 50}")
+    print(f"Comparando contas a {tipo_conta}: pandas (referência) x {motor}")
+    print(f"{'=' * 50}\n")
+
+    temporario = tempfile.mkdtemp(prefix='equivalencia_')
+    try:
+        diretorio_referencia = os.path.join(temporario, 'pandas')
+        diretorio_motor = os.path.join(temporario, motor)
+        dividir_com_motor(tipo_conta, 'pandas', diretorio_referencia)
+        dividir_com_motor(tipo_conta, motor, diretorio_motor)
+
+        diferencas, comparadas = comparar_partes(diretorio_referencia, diretorio_motor)
+        for diferenca in diferencas:
+            print(f"  - {diferenca}")
+        print(f"{comparadas} partes comparadas, {len(diferencas)} diferenças")
+        return not diferencas
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+def main():
+    # Uso: python verify_engine_equivalence.py [vetorizado|polars|duckdb] [pagar|receber]
+    motor = sys.argv[1] if len(sys.argv) > 1 else 'vetorizado'
+    tipos = [sys.argv[2]] if len(sys.argv) > 2 else ['pagar', 'receber']
+
+    print(f"Iniciando verificação de equivalência do motor {motor} em {datetime.now().strftime('%H:%M:%S')}")
+    resultados = {tipo: verificar_equivalencia(tipo, motor) for tipo in tipos}
+
+    print(f"\n{'=' * 50}")
+    print("Resumo da verificação de equivalência:")
+    for tipo, sucesso in resultados.items():
+        print(f"Contas a {tipo}: {'SUCESSO' if sucesso else 'FALHA'}")
+    print(f"{'=' * 50}")
+    return 0 if all(resultados.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,17 +4,52 @@ import os
 import glob
 import sys
 from datetime import datetime
+import financial_schema
+import output_writers
+import partition_index
+import split_contas_pagar
+import split_contas_receber
 
 # Configuração de diretórios
 INPUT_DIR = 'exported_data'
 OUTPUT_DIR = 'exported_data_split'
 
-def verificar_integridade(tipo_conta):
+EXTENSOES_PARTES = ('.xlsx', '.csv', '.csv.gz', '.parquet')
+
+DIVISORES = {'pagar': ('contas_pagar', split_contas_pagar), 'receber': ('contas_receber', split_contas_receber)}
+
+def particao_original(tipo_conta, estabelecimento, mes):
+    """
+    Caminho do arquivo exportado e linhas de um estabelecimento e mês de vencimento,
+    lidas pelo índice de partições; sem índice válido, lê o arquivo inteiro e filtra.
+    """
+    entidade, divisor = DIVISORES[tipo_conta]
+    arquivo_original = os.path.join(INPUT_DIR, output_writers.arquivo_exportacao(entidade))
+    if not os.path.exists(arquivo_original):
+        return arquivo_original, None
+    df = partition_index.ler_particao(arquivo_original, estabelecimento, mes)
+    if df is None:
+        print("Índice de partições ausente ou desatualizado, lendo o arquivo inteiro...")
+        df = output_writers.ler(arquivo_original)
+        df = df[(pd.to_numeric(df['Estabelecimento_id'], errors='coerce') == estabelecimento) &
+                (df['Data vencimento'].apply(divisor.obter_mes_vencimento) == mes)]
+    return arquivo_original, df
+
+def partes_da_particao(tipo_conta, estabelecimento, mes):
+    """Padrão e arquivos das partes do estabelecimento e mês gravadas pelo divisor (sem empacotamento)"""
+    entidade, divisor = DIVISORES[tipo_conta]
+    nome_mes = divisor.MESES.get(mes, 'mes_desconhecido')
+    padrao = os.path.join(OUTPUT_DIR, f"{output_writers.NOMES_EXPORTACAO[entidade]}_est_{estabelecimento}_{nome_mes}[._]*")
+    return padrao, sorted(caminho for caminho in glob.glob(padrao) if caminho.endswith(EXTENSOES_PARTES))
+
+def verificar_integridade(tipo_conta, estabelecimento=None, mes=None):
     """
     Verifica se todos os dados da planilha original estão presentes nas partes divididas.
     
     Parâmetros:
     - tipo_conta: string 'receber' ou 'pagar'
+    - estabelecimento, mes: quando informados juntos, verifica só essa partição
+      (mes 1-12 ou 'sem_data'), lendo do original apenas as linhas dela pelo índice
     
     Retorna:
     - True se a verificação foi bem-sucedida, False caso contrário
@@ -33,19 +68,35 @@ def verificar_integridade(tipo_conta):
         padrao_partes = os.path.join(OUTPUT_DIR, 'contas_pagar_parte_*.xlsx')
         coluna_id = 'ID'  # Nome da coluna de ID nas contas a pagar
     
+    coluna_id_partes = coluna_id
+    
+    particao = estabelecimento is not None and mes is not None
+    if particao:
+        # Partes seguem o template dos divisores (coluna 'Id') e os nomes por estabelecimento e mês
+        print(f"Partição: estabelecimento {estabelecimento}, mês {mes}")
+        arquivo_original, df_original = particao_original(tipo_conta, estabelecimento, mes)
+        padrao_partes, arquivos_partes = partes_da_particao(tipo_conta, estabelecimento, mes)
+        coluna_id_partes = 'Id'
+    
     # Verificar se o arquivo original existe
     if not os.path.exists(arquivo_original):
         print(f"Erro: Arquivo original {arquivo_original} não encontrado!")
         return False
     
     print(f"Lendo arquivo original: {arquivo_original}")
-    df_original = pd.read_excel(arquivo_original)
+    if not particao:
+        df_original = pd.read_excel(arquivo_original)
+    df_original = financial_schema.aplicar_esquema(df_original)
     total_registros_original = len(df_original)
     print(f"Total de registros no arquivo original: {total_registros_original}")
     
     # Listar todos os arquivos divididos
-    arquivos_partes = sorted(glob.glob(padrao_partes))
+    if not particao:
+        arquivos_partes = sorted(glob.glob(padrao_partes))
     
+    if not arquivos_partes and particao and total_registros_original == 0:
+        print("Partição sem registros no original nem partes geradas")
+        return True
     if not arquivos_partes:
         print(f"Erro: Nenhum arquivo dividido encontrado com o padrão {padrao_partes}")
         return False
@@ -58,7 +109,7 @@ def verificar_integridade(tipo_conta):
     
     for arquivo in arquivos_partes:
         print(f"Lendo arquivo: {arquivo}")
-        df_parte = pd.read_excel(arquivo)
+        df_parte = financial_schema.aplicar_esquema(output_writers.ler(arquivo) if particao else pd.read_excel(arquivo))
         total_registros_partes += len(df_parte)
         dfs_partes.append(df_parte)
     
@@ -75,43 +126,47 @@ def verificar_integridade(tipo_conta):
     else:
         print(f"Número de registros corresponde: {total_registros_original}")
     
-    # Verificar IDs únicos
-    ids_original = set(df_original[coluna_id].astype(str))
-    ids_combinado = set(df_combinado[coluna_id].astype(str))
-    
-    # Mostrar total de IDs únicos
-    print(f"IDs únicos no original: {len(ids_original)}")
-    print(f"IDs únicos nas partes combinadas: {len(ids_combinado)}")
-    
-    # Verificar IDs ausentes
-    ids_ausentes = ids_original - ids_combinado
-    if ids_ausentes:
-        print(f"ERRO: Encontrados {len(ids_ausentes)} IDs no arquivo original que não estão nos arquivos divididos")
-        if len(ids_ausentes) <= 10:
-            print(f"IDs ausentes: {', '.join(str(id) for id in ids_ausentes)}")
-        return False
-    
-    # Verificar IDs extras
-    ids_extras = ids_combinado - ids_original
-    if ids_extras:
-        print(f"ERRO: Encontrados {len(ids_extras)} IDs nos arquivos divididos que não estão no arquivo original")
-        if len(ids_extras) <= 10:
-            print(f"IDs extras: {', '.join(str(id) for id in ids_extras)}")
-        return False
+    # As partes de contas a pagar não trazem o ID de origem (o template dos divisores usa 'Id',
+    # a exportação 'ID'); sem IDs nas partes, valem só a contagem e as somas
+    if not df_combinado[coluna_id_partes].notna().any():
+        print("Partes sem IDs preenchidos, comparando apenas contagem e somas")
+    else:
+        # Verificar IDs únicos
+        ids_original = set(df_original[coluna_id].astype(str))
+        ids_combinado = set(df_combinado[coluna_id_partes].astype(str))
+    
+        # Mostrar total de IDs únicos
+        print(f"IDs únicos no original: {len(ids_original)}")
+        print(f"IDs únicos nas partes combinadas: {len(ids_combinado)}")
+    
+        # Verificar IDs ausentes
+        ids_ausentes = ids_original - ids_combinado
+        if ids_ausentes:
+            print(f"ERRO: Encontrados {len(ids_ausentes)} IDs no arquivo original que não estão nos arquivos divididos")
+            if len(ids_ausentes) <= 10:
+                print(f"IDs ausentes: {', '.join(str(id) for id in ids_ausentes)}")
+            return False
+    
+        # Verificar IDs extras
+        ids_extras = ids_combinado - ids_original
+        if ids_extras:
+            print(f"ERRO: Encontrados {len(ids_extras)} IDs nos arquivos divididos que não estão no arquivo original")
+            if len(ids_extras) <= 10:
+                print(f"IDs extras: {', '.join(str(id) for id in ids_extras)}")
+            return False
     
     # Verificar integridade dos dados financeiros específicos
     colunas_numericas = ['Valor documento', 'Saldo']
     if tipo_conta == 'receber':
         colunas_numericas.append('Taxas')
     
-    # Somar valores para verificar se batem
+    # Somar valores para verificar se batem (ponto fixo, comparação exata)
     for coluna in colunas_numericas:
         if coluna in df_original.columns and coluna in df_combinado.columns:
-            soma_original = pd.to_numeric(df_original[coluna], errors='coerce').sum()
-            soma_combinado = pd.to_numeric(df_combinado[coluna], errors='coerce').sum()
+            soma_original = financial_schema.somar_exato(df_original[coluna])
+            soma_combinado = financial_schema.somar_exato(df_combinado[coluna])
             
-            # Verificar se as somas são iguais (com uma pequena margem de erro para arredondamentos)
-            if abs(soma_original - soma_combinado) > 0.01:
+            if soma_original != soma_combinado:
                 print(f"ERRO: Soma da coluna '{coluna}' não corresponde!")
                 print(f"  Original: {soma_original}")
                 print(f"  Partes combinadas: {soma_combinado}")
@@ -131,27 +186,33 @@ def main():
     verificar_receber = True
     verificar_pagar = True
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--receber':
+    opcoes = [argumento for argumento in sys.argv[1:] if argumento.startswith('--')]
+    posicionais = [argumento for argumento in sys.argv[1:] if not argumento.startswith('--')]
+    if opcoes:
+        if opcoes[0] == '--receber':
             verificar_pagar = False
-        elif sys.argv[1] == '--pagar':
+        elif opcoes[0] == '--pagar':
             verificar_receber = False
-        elif sys.argv[1] == '--help':
-            print("Uso: python verify_financeiro_integrity.py [opção]")
+        elif opcoes[0] == '--help':
+            print("Uso: python verify_financeiro_integrity.py [opção] [estabelecimento_id mes]")
             print("\nOpções:")
             print("  --receber    Verifica apenas contas a receber")
             print("  --pagar      Verifica apenas contas a pagar")
             print("  --help       Mostra esta ajuda")
+            print("\nCom estabelecimento_id e mes (1-12 ou sem_data), verifica só essa partição")
             return
     
+    estabelecimento = int(posicionais[0]) if len(posicionais) > 1 else None
+    mes = (posicionais[1] if posicionais[1] == 'sem_data' else int(posicionais[1])) if len(posicionais) > 1 else None
+    
     # Realizar verificações
     resultados = []
     
     if verificar_receber:
-        resultados.append(verificar_integridade('receber'))
+        resultados.append(verificar_integridade('receber', estabelecimento, mes))
     
     if verificar_pagar:
-        resultados.append(verificar_integridade('pagar'))
+        resultados.append(verificar_integridade('pagar', estabelecimento, mes))
     
     # Resumo final
     print(f"\n{'=' * 50}")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+import os
+import sys
+import glob
+import lazy_imports
+
+pd = lazy_imports.sob_demanda('pandas')
+
+# Reconciliação de ponta a ponta: agregados por estabelecimento e mês de vencimento
+# calculados no banco de origem (uma consulta agrupada por entidade) contra os mesmos
+# agregados das partes geradas, sem passar pela planilha intermediária de exported_data.
+OUTPUT_DIR = 'exported_data_split'
+
+ENTIDADES = {
+    'contas_pagar': {'prefixo': 'contas_a_pagar', 'tipo_documento': 2},
+    'contas_receber': {'prefixo': 'contas_a_receber', 'tipo_documento': 1},
+}
+
+# Só as colunas usadas nos agregados são lidas das partes
+COLUNAS_PARTES = ['Id', 'Data vencimento', 'Valor documento', 'Estabelecimento_id']
+
+# Diferença aceita na soma dos valores de um grupo (arredondamento dos arquivos)
+TOLERANCIA_VALOR = 0.01
+
+EXTENSOES_PARTES = ('.xlsx', '.csv', '.csv.gz', '.parquet')
+
+def consulta_agregados(tipo_documento, estabelecimentos):
+    """Linhas, soma de VL_DFINP_PARC e menor/maior parcela por estabelecimento e mês, direto das tabelas"""
+    estabelecimentos_lista = ','.join(map(str, estabelecimentos))
+    return f"""
+    SELECT
+        df.ESTABELECIMENTO_ID AS estabelecimento,
+        MONTH(dfp.DT_DFINP_VENC) AS mes,
+        COUNT_BIG(*) AS linhas,
+        SUM(dfp.VL_DFINP_PARC) AS valor,
+        MIN(dfp.DOC_FINANCEIRO_PARCELA_ID) AS id_min,
+        MAX(dfp.DOC_FINANCEIRO_PARCELA_ID) AS id_max
+    FROM
+        DOC_FINANCEIRO_PARCELA dfp
+    JOIN
+        DOC_FINANCEIRO df ON dfp.DOC_FINANCEIRO_ID = df.DOC_FINANCEIRO_ID
+    WHERE
+        df.NO_DFIN_TIPO = {tipo_documento}
+        AND df.ESTABELECIMENTO_ID IN ({estabelecimentos_lista})
+    GROUP BY
+        df.ESTABELECIMENTO_ID, MONTH(dfp.DT_DFINP_VENC)
+    """
+
+def _normalizar(agregados):
+    agregados = agregados.copy()
+    agregados['estabelecimento'] = agregados['estabelecimento'].astype('int64')
+    meses = pd.to_numeric(agregados['mes'], errors='coerce')
+    agregados['mes'] = meses.map(lambda mes: 'sem_data' if pd.isna(mes) else str(int(mes)))
+    agregados['linhas'] = agregados['linhas'].astype('int64')
+    agregados['valor'] = pd.to_numeric(agregados['valor'], errors='coerce').astype('float64').fillna(0.0)
+    for coluna in ('id_min', 'id_max'):
+        agregados[coluna] = pd.to_numeric(agregados[coluna], errors='coerce')
+    return agregados.set_index(['estabelecimento', 'mes']).sort_index()
+
+def agregados_origem(entidade, estabelecimentos=None):
+    import export_spreadsheets
+    estabelecimentos = estabelecimentos or export_spreadsheets.ESTABELECIMENTOS_ALVO
+    consulta = consulta_agregados(ENTIDADES[entidade]['tipo_documento'], estabelecimentos)
+    return _normalizar(export_spreadsheets.query_to_df(consulta))
+
+def arquivos_partes(prefixo, diretorio=None):
+    padrao = os.path.join(diretorio or OUTPUT_DIR, f"{prefixo}_est_*")
+    return sorted(caminho for caminho in glob.glob(padrao) if caminho.endswith(EXTENSOES_PARTES))
+
+def _ler_colunas(caminho):
+    if caminho.endswith('.parquet'):
+        df = pd.read_parquet(caminho)
+        return df[[coluna for coluna in COLUNAS_PARTES if coluna in df.columns]]
+    if caminho.endswith('.xlsx'):
+        return pd.read_excel(caminho, usecols=lambda coluna: coluna in COLUNAS_PARTES, dtype={'Data vencimento': str})
+    return pd.read_csv(caminho, usecols=lambda coluna: coluna in COLUNAS_PARTES, dtype={'Data vencimento': str}, encoding='utf-8-sig')
+
+def agregados_partes(prefixo, diretorio=None):
+    """Os mesmos agregados da origem, somados arquivo a arquivo sobre as partes geradas"""
+    parciais = []
+    for caminho in arquivos_partes(prefixo, diretorio):
+        df = _ler_colunas(caminho)
+        if df.empty:
+            continue
+        vencimento = pd.to_datetime(df['Data vencimento'], format='%d/%m/%Y', errors='coerce')
+        ids = pd.to_numeric(df['Id'], errors='coerce') if 'Id' in df.columns else pd.Series(float('nan'), index=df.index)
+        grupos = pd.DataFrame({
+            'estabelecimento': df['Estabelecimento_id'],
+            'mes': vencimento.dt.month,
+            'valor': pd.to_numeric(df['Valor documento'], errors='coerce').fillna(0.0),
+            'id': ids,
+        }).groupby(['estabelecimento', 'mes'], dropna=False)
+        parciais.append(pd.DataFrame({
+            'linhas': grupos.size(), 'valor': grupos['valor'].sum(),
+            'id_min': grupos['id'].min(), 'id_max': grupos['id'].max(),
+            'ids_vazios': grupos['id'].apply(lambda serie: serie.isna().sum()),
+        }).reset_index())
+    if not parciais:
+        vazio = pd.DataFrame(columns=['estabelecimento', 'mes', 'linhas', 'valor', 'id_min', 'id_max', 'ids_vazios'])
+        return _normalizar(vazio)
+    agregados = _normalizar(pd.concat(parciais, ignore_index=True))
+    return agregados.groupby(level=['estabelecimento', 'mes']).agg(
+        {'linhas': 'sum', 'valor': 'sum', 'id_min': 'min', 'id_max': 'max', 'ids_vazios': 'sum'})
+
+def comparar(origem, partes):
+    """Divergências por (estabelecimento, mês): dicts com o grupo, o campo e os dois valores"""
+    divergencias = []
+    for chave in origem.index.union(partes.index):
+        if chave not in partes.index:
+            divergencias.append({'grupo': chave, 'campo': 'linhas', 'origem': int(origem.loc[chave, 'linhas']), 'partes': 0})
+            continue
+        if chave not in origem.index:
+            divergencias.append({'grupo': chave, 'campo': 'linhas', 'origem': 0, 'partes': int(partes.loc[chave, 'linhas'])})
+            continue
+        esperado, obtido = origem.loc[chave], partes.loc[chave]
+        if esperado['linhas'] != obtido['linhas']:
+            divergencias.append({'grupo': chave, 'campo': 'linhas', 'origem': int(esperado['linhas']), 'partes': int(obtido['linhas'])})
+        if abs(esperado['valor'] - obtido['valor']) > TOLERANCIA_VALOR:
+            divergencias.append({'grupo': chave, 'campo': 'valor', 'origem': round(esperado['valor'], 2), 'partes': round(obtido['valor'], 2)})
+        if obtido['ids_vazios']:
+            divergencias.append({'grupo': chave, 'campo': 'ids_vazios', 'origem': 0, 'partes': int(obtido['ids_vazios'])})
+        for campo in ('id_min', 'id_max'):
+            if not pd.isna(obtido[campo]) and esperado[campo] != obtido[campo]:
+                divergencias.append({'grupo': chave, 'campo': campo, 'origem': int(esperado[campo]), 'partes': int(obtido[campo])})
+    return divergencias
+
+def reconciliar(entidade, diretorio=None, estabelecimentos=None):
+    """
+    Compara as partes da entidade ('contas_pagar' ou 'contas_receber') com o banco de
+    origem; retorna a lista de divergências (vazia quando tudo confere).
+    """
+    import split_contas_pagar
+    prefixo = ENTIDADES[entidade]['prefixo']
+    print(f"\nReconciliando {prefixo} com o banco de origem...")
+    origem = agregados_origem(entidade, estabelecimentos)
+    partes = agregados_partes(prefixo, diretorio)
+    print(f"Origem: {origem['linhas'].sum()} linhas em {len(origem)} grupos; "
+          f"partes: {partes['linhas'].sum()} linhas em {len(partes)} grupos")
+
+    divergencias = comparar(origem, partes)
+    for divergencia in divergencias:
+        estabelecimento, mes = divergencia['grupo']
+        nome_mes = split_contas_pagar.MESES.get(int(mes) if mes.isdigit() else mes, mes)
+        print(f"✗ Estabelecimento {estabelecimento}, mês {nome_mes}: {divergencia['campo']} "
+              f"origem={divergencia['origem']} partes={divergencia['partes']}")
+    if not divergencias:
+        print(f"✓ Linhas, valores e intervalos de IDs conferem com a origem em todos os grupos")
+    return divergencias
+
+if __name__ == "__main__":
+    # Uso: python verify_source_reconciliation.py [contas_pagar|contas_receber] [diretorio_partes]
+    entidades = [sys.argv[1]] if len(sys.argv) > 1 else list(ENTIDADES)
+    diretorio = sys.argv[2] if len(sys.argv) > 2 else None
+    total = sum(len(reconciliar(entidade, diretorio)) for entidade in entidades)
+    sys.exit(1 if total else 0)